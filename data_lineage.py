@@ -1,8 +1,45 @@
+#!/usr/bin/env python3
+"""
+data_lineage.py
+
+Table/column reference graph of a SQL script, with headless export.
+
+Builds a networkx DiGraph (table -> query result, edges carrying the
+column pairs) from the SELECT statements of one or more scripts and writes
+it as GraphML, GEXF and/or the viewer's data.json (nodes with columns,
+column-level links), or renders it with matplotlib.
+
+Node positions come from a layered (Sugiyama-style) layout instead of a
+force-directed one: nodes are placed in layers by their longest path from
+a source (cycles are collapsed into one layer) and ordered within a layer
+by a few barycenter sweeps, which is linear in the size of the graph.
+Layouts are cached on disk keyed by a hash of the graph, so re-exporting
+or re-rendering an unchanged graph skips the layout entirely. Positions
+are written to every export (x/y attributes, GEXF viz positions, data.json
+x/y).
+
+Usage:
+    python data_lineage.py script.sql --graphml lineage.graphml --gexf lineage.gexf --json data.json
+    python data_lineage.py sql/*.sql --png lineage.png
+    python data_lineage.py script.sql --show
+
+Dependencies:
+    pip install sqlparse networkx
+    pip install matplotlib    (only for --png / --show)
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+
 import sqlparse
-from sqlparse.sql import IdentifierList, Identifier
-from sqlparse.tokens import Keyword, DML
+from sqlparse.sql import IdentifierList, Identifier, Function
+from sqlparse.tokens import Keyword, DML, Name, String, Wildcard
 import networkx as nx
-import matplotlib.pyplot as plt
+
+from lineage_cache import LineageCache
 
 def read_sql_file(file_path):
     with open(file_path, 'r') as file:
@@ -13,7 +50,7 @@ def parse_sql(sql_script):
     return sqlparse.parse(sql_script)
 
 def is_subselect(parsed):
-    if not parsed.is_group():
+    if not parsed.is_group:
         return False
     for item in parsed.tokens:
         if item.ttype is DML and item.value.upper() == 'SELECT':
@@ -28,7 +65,9 @@ def extract_from_part(parsed):
                 for x in extract_from_part(item):
                     yield x
             elif item.ttype is Keyword:
-                return
+                # Joined tables are part of the FROM clause too
+                if not (item.normalized.endswith('JOIN') or item.normalized in ('ON', 'USING')):
+                    return
             elif item.ttype is None:
                 yield item
         elif item.ttype is Keyword and item.value.upper() == 'FROM':
@@ -44,50 +83,348 @@ def extract_table_identifiers(token_stream):
             identifiers.append(item.get_real_name())
     return identifiers
 
+def extract_table_aliases(token_stream):
+    """
+    alias (and name) -> table name of the FROM / JOIN tables, the name
+    qualified with its schema when it has one.
+    """
+    aliases = {}
+    for item in token_stream:
+        identifiers = item.get_identifiers() if isinstance(item, IdentifierList) else [item]
+        for identifier in identifiers:
+            if not isinstance(identifier, Identifier) or identifier.get_real_name() is None:
+                continue
+            name = identifier.get_real_name()
+            parent = identifier.get_parent_name()
+            table = f"{parent}.{name}" if parent else name
+            for key in (table, name, identifier.get_alias()):
+                if key:
+                    aliases.setdefault(key, table)
+    return aliases
+
+def extract_select_items(statement):
+    """
+    The select-list items of a statement: the identifiers between SELECT
+    and FROM (never the FROM / JOIN tables).
+    """
+    items = []
+    for token in statement.tokens:
+        if token.ttype is Keyword and token.value.upper() == 'FROM':
+            break
+        if isinstance(token, IdentifierList):
+            items.extend(t for t in token.get_identifiers() if t.is_group)
+        elif isinstance(token, (Identifier, Function)):
+            items.append(token)
+    return items
+
+def extract_column_refs(token):
+    """
+    (qualifier, column) of every column referenced by a select-list item,
+    skipping its alias, function names and wildcards.
+    """
+    if isinstance(token, Identifier) and not token.token_first().is_group:
+        first = token.token_first()
+        if first.ttype in (Name, String.Symbol) and not any(t.ttype is Wildcard for t in token.flatten()):
+            yield token.get_parent_name(), token.get_real_name()
+        return
+    children = list(token.tokens) if token.is_group else []
+    if isinstance(token, Function):
+        children = children[1:]
+    elif isinstance(token, Identifier) and token.has_alias():
+        last = max(i for i, t in enumerate(children) if not t.is_whitespace)
+        children = children[:last]
+    for child in children:
+        if child.is_group:
+            yield from extract_column_refs(child)
+
+def extract_select_lineage(parsed_sql, name="query"):
+    """
+    Column lineage of every SELECT statement into its result set, named
+    <name>_query_<n>: (source_table, source_column, target, target_column)
+    rows. Output columns whose table is unknown (literals, unqualified
+    columns of a multi-table query) get source_table / source_column None.
+    """
+    rows = []
+    n = 0
+    for statement in parsed_sql:
+        if statement.get_type() != 'SELECT':
+            continue
+        n += 1
+        target = f"{name}_query_{n}"
+        aliases = extract_table_aliases(extract_from_part(statement))
+        tables = set(aliases.values())
+        for item in extract_select_items(statement):
+            target_column = item.get_name()
+            sources = []
+            for qualifier, column in extract_column_refs(item):
+                if qualifier is not None:
+                    table = aliases.get(qualifier)
+                elif len(tables) == 1:
+                    table = next(iter(tables))
+                else:
+                    table = None
+                if table is not None:
+                    sources.append((table, column))
+            for table, column in sources or [(None, None)]:
+                rows.append((table, column, target, target_column))
+    return rows
+
 def extract_table_column_references(parsed_sql):
     table_references = {}
-    for statement in parsed_sql:
-        if statement.get_type() == 'SELECT':
-            tables = extract_table_identifiers(extract_from_part(statement))
-            columns = []
-            for token in statement.tokens:
-                if isinstance(token, IdentifierList):
-                    for identifier in token.get_identifiers():
-                        columns.append(identifier.get_real_name())
-                elif isinstance(token, Identifier):
-                    columns.append(token.get_real_name())
-            for table in tables:
-                if table not in table_references:
-                    table_references[table] = set()
-                table_references[table].update(columns)
+    for table, column, _target, _target_column in extract_select_lineage(parsed_sql):
+        if table is not None:
+            table_references.setdefault(table, set()).add(column)
     return table_references
 
-def build_lineage_graph(table_references):
+# Bump when the layout algorithm changes, to invalidate cached layouts
+LAYOUT_VERSION = "1"
+# Graphs larger than this are drawn without labels
+LABEL_LIMIT = 200
+
+
+def build_lineage_graph(lineage):
+    """
+    Table -> query graph of extract_select_lineage rows: table nodes carry
+    the columns read from them, query nodes their output columns, and each
+    edge the (source_column, target_column) pairs it carries.
+    """
     G = nx.DiGraph()
-    for table, columns in table_references.items():
-        for column in columns:
-            G.add_edge(column, table)
+    for table, column, target, target_column in lineage:
+        if target not in G:
+            G.add_node(target, kind="query", columns=[])
+        if target_column not in G.nodes[target]["columns"]:
+            G.nodes[target]["columns"].append(target_column)
+        if table is None or table == target:
+            continue
+        if table not in G:
+            G.add_node(table, kind="table", columns=set())
+        G.nodes[table]["columns"].add(column)
+        if not G.has_edge(table, target):
+            G.add_edge(table, target, columns=[])
+        pair = [column, target_column]
+        if pair not in G.edges[table, target]["columns"]:
+            G.edges[table, target]["columns"].append(pair)
+    for node, data in G.nodes(data=True):
+        if data["kind"] == "table":
+            data["columns"] = sorted(data["columns"])
     return G
 
-def visualize_graph(G):
-    plt.figure(figsize=(10, 8))
-    pos = nx.spring_layout(G)
-    nx.draw(G, pos, with_labels=True, node_size=3000, node_color="skyblue", font_size=15, font_weight="bold")
+
+def graph_hash(G, sweeps: int = 4) -> str:
+    """
+    SHA-256 of the graph's nodes and edges (and the layout settings): the
+    key of its cached layout.
+    """
+    h = hashlib.sha256(f"{LAYOUT_VERSION}\0{sweeps}\0".encode("utf-8"))
+    for node in sorted(map(str, G.nodes)):
+        h.update(node.encode("utf-8"))
+        h.update(b"\0")
+    h.update(b"\1")
+    for u, v in sorted((str(u), str(v)) for u, v in G.edges):
+        h.update(f"{u}\0{v}\0".encode("utf-8"))
+    return h.hexdigest()
+
+
+def layered_layout(G, sweeps: int = 4):
+    """
+    Hierarchical layout for lineage DAGs: x is the node's layer (longest
+    path from a source, strongly connected nodes sharing one layer), y its
+    slot in the layer, ordered by barycenter sweeps to cut edge crossings.
+
+    :param sweeps: alternating down / up ordering passes
+    :return: node -> (x, y)
+    """
+    if len(G) == 0:
+        return {}
+    condensed = nx.condensation(G)
+    layers = [sorted((n for c in generation for n in condensed.nodes[c]["members"]), key=str)
+              for generation in nx.topological_generations(condensed)]
+
+    # Relative position in its layer, comparable between layers of any size
+    rank = {}
+
+    def assign(layer):
+        for i, node in enumerate(layer):
+            rank[node] = (i + 0.5) / len(layer)
+
+    def barycenter(node, neighbors):
+        adjacent = [rank[n] for n in neighbors(node)]
+        return sum(adjacent) / len(adjacent) if adjacent else rank[node]
+
+    for layer in layers:
+        assign(layer)
+    for sweep in range(sweeps):
+        if sweep % 2 == 0:
+            ordered, neighbors = layers[1:], G.predecessors
+        else:
+            ordered, neighbors = layers[-2::-1], G.successors
+        for layer in ordered:
+            layer.sort(key=lambda node: barycenter(node, neighbors))
+            assign(layer)
+
+    height = max(len(layer) for layer in layers)
+    pos = {}
+    for x, layer in enumerate(layers):
+        offset = (height - len(layer)) / 2
+        for y, node in enumerate(layer):
+            pos[node] = (float(x), offset + y)
+    return pos
+
+
+def cached_layout(G, cache_dir: str = ".layout_cache", sweeps: int = 4):
+    """
+    layered_layout(G), read from / stored in the on-disk cache.
+
+    :param cache_dir: cache directory, or None to always compute
+    """
+    if cache_dir is None:
+        return layered_layout(G, sweeps)
+    cache = LineageCache(cache_dir)
+    key = graph_hash(G, sweeps)
+    pos = cache.get(key)
+    if pos is None:
+        pos = layered_layout(G, sweeps)
+        cache.put(key, pos)
+    return pos
+
+
+def _export_graph(G, pos=None):
+    """
+    Copy of G with only scalar attributes (lists as JSON) plus x / y.
+    """
+    H = nx.DiGraph()
+    for node, data in G.nodes(data=True):
+        attrs = {k: json.dumps(value) if isinstance(value, (list, tuple, set)) else value
+                 for k, value in data.items()}
+        if pos is not None:
+            attrs["x"], attrs["y"] = pos[node]
+        H.add_node(node, **attrs)
+    for u, v, data in G.edges(data=True):
+        H.add_edge(u, v, **{k: json.dumps(value) if isinstance(value, (list, tuple, set)) else value
+                            for k, value in data.items() if value is not None})
+    return H
+
+
+def write_graphml(G, path: str, pos=None):
+    nx.write_graphml(_export_graph(G, pos), path)
+
+
+def write_gexf(G, path: str, pos=None, spacing: float = 100.0):
+    H = _export_graph(G, pos)
+    if pos is not None:
+        for node, (x, y) in pos.items():
+            H.nodes[node]["viz"] = {"position": {"x": x * spacing, "y": -y * spacing, "z": 0.0}}
+    nx.write_gexf(H, path)
+
+
+def to_viewer_json(G, pos=None) -> dict:
+    """
+    The graph in the data.json shape read by script2.js: nodes with their
+    columns (expanded when they have any), one link per column pair of an
+    edge. Self-links are never written (the viewer's level calculation
+    follows links from source to target).
+    """
+    nodes = sorted(G.nodes, key=lambda n: pos[n]) if pos is not None else list(G.nodes)
+    ids = {node: i for i, node in enumerate(nodes, 1)}
+    result = {"nodes": [], "links": []}
+    for node in nodes:
+        columns = list(G.nodes[node].get("columns", []))
+        entry = {"id": ids[node], "title": str(node), "columns": columns, "expanded": bool(columns)}
+        if pos is not None:
+            entry["x"], entry["y"] = pos[node]
+        result["nodes"].append(entry)
+    for u, v, data in G.edges(data=True):
+        if u == v:
+            continue
+        for source_column, target_column in data.get("columns", []):
+            result["links"].append({"source": {"node": ids[u], "column": source_column},
+                                    "target": {"node": ids[v], "column": target_column}})
+    return result
+
+
+def write_viewer_json(G, path: str, pos=None):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(to_viewer_json(G, pos), f, separators=(",", ":"))
+
+
+def visualize_graph(G, pos=None, output: str = None, show: bool = True):
+    """
+    Draw G with matplotlib; save it to output and/or show it.
+    """
+    import matplotlib
+    if not show:
+        matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    if pos is None:
+        pos = cached_layout(G)
+    layers = max((x for x, _ in pos.values()), default=0) + 1
+    height = max((y for _, y in pos.values()), default=0) + 1
+    plt.figure(figsize=(min(max(10, layers * 3), 200), min(max(8, height * 0.4), 200)))
+    small = len(G) <= LABEL_LIMIT
+    nx.draw(G, pos, with_labels=small, node_size=3000 if small else 20, node_color="skyblue",
+            font_size=15 if small else 6, font_weight="bold", arrows=small)
     plt.title("Data Lineage Graph")
-    plt.show()
+    if output:
+        plt.savefig(output, bbox_inches="tight")
+    if show:
+        plt.show()
+    plt.close()
 
-# Example usage:
-file_path = 'path_to_your_sql_file.sql'
-sql_script = read_sql_file(file_path)
-parsed_sql = parse_sql(sql_script)
-table_references = extract_table_column_references(parsed_sql)
-lineage_graph = build_lineage_graph(table_references)
-visualize_graph(lineage_graph)
 
+def main():
+    parser = argparse.ArgumentParser(
+        description="Export the table/column reference graph of SQL scripts"
+    )
+    parser.add_argument("sql_files", nargs="+",
+                        help="SQL scripts to read.")
+    parser.add_argument("--graphml", default=None,
+                        help="Write the graph (with layout positions) as GraphML.")
+    parser.add_argument("--gexf", default=None,
+                        help="Write the graph (with layout positions) as GEXF.")
+    parser.add_argument("--json", default=None,
+                        help="Write the graph in the viewer's data.json format.")
+    parser.add_argument("--png", default=None,
+                        help="Render the graph to an image (needs matplotlib).")
+    parser.add_argument("--show", action="store_true",
+                        help="Show the graph in a window (default when no output is given).")
+    parser.add_argument("--layout-cache", default=".layout_cache",
+                        help="Directory caching layouts by graph hash (default: .layout_cache).")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Always compute the layout.")
+    args = parser.parse_args()
 
-***************
+    lineage = []
+    for file_path in args.sql_files:
+        try:
+            sql_script = read_sql_file(file_path)
+        except (OSError, UnicodeDecodeError) as e:
+            print(f"ERROR reading {file_path}: {e}", file=sys.stderr)
+            sys.exit(1)
+        name = os.path.splitext(os.path.basename(file_path))[0]
+        lineage.extend(extract_select_lineage(parse_sql(sql_script), name))
 
-import sqlparse
+    lineage_graph = build_lineage_graph(lineage)
+    pos = cached_layout(lineage_graph, None if args.no_cache else args.layout_cache)
+    print(f"{lineage_graph.number_of_nodes()} nodes, {lineage_graph.number_of_edges()} edges")
+
+    if args.graphml:
+        write_graphml(lineage_graph, args.graphml, pos)
+        print(f"GraphML written to {args.graphml}")
+    if args.gexf:
+        write_gexf(lineage_graph, args.gexf, pos)
+        print(f"GEXF written to {args.gexf}")
+    if args.json:
+        write_viewer_json(lineage_graph, args.json, pos)
+        print(f"Viewer JSON written to {args.json}")
+    show = args.show or not (args.graphml or args.gexf or args.json or args.png)
+    if args.png or show:
+        visualize_graph(lineage_graph, pos, args.png, show)
+        if args.png:
+            print(f"Image written to {args.png}")
+
+
+# ***************
 
 def extract_column_lineage(sql_query):
     parsed = sqlparse.parse(sql_query)
@@ -110,7 +447,11 @@ def extract_column_lineage(sql_query):
 
     return column_lineage
 
-sql_query = "SELECT a.col1, b.col2 FROM table1 a JOIN table2 b ON a.id = b.id"
-lineage = extract_column_lineage(sql_query)
-print(lineage)
+# Example:
+#     sql_query = "SELECT a.col1, b.col2 FROM table1 a JOIN table2 b ON a.id = b.id"
+#     lineage = extract_column_lineage(sql_query)
+#     print(lineage)
+
 
+if __name__ == "__main__":
+    main()
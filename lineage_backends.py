@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""
+lineage_backends.py
+
+One entry point over the three lineage implementations in sql_lineage.py:
+
+  sqlglot       SQLLineageExtractor (single-pass sqlglot visitor)
+  sql_metadata  get_column_lineage (sql_metadata token parser)
+  sqllineage    extract_column_lineage_with_transforms (sqllineage/sqlfluff)
+
+For every statement the backends are tried cheapest first. The cost of a
+backend is its running average of milliseconds per KB of SQL, seeded with
+measured defaults (see lineage_benchmarks.py) and updated after every
+attempt, so the order adapts to the workload; a failed attempt is charged
+a penalty instead of its (often tiny) time, so a backend that fails fast
+does not look cheap. A heavier backend is only
+tried when the previous ones failed, ran out of time, or left columns
+unresolved (a source column without a source table). A statement without
+a target table (a plain SELECT) or without source columns (literals only)
+is not incomplete.
+
+Each statement has a wall-clock budget shared by its attempts; a backend
+whose expected cost exceeds what is left is skipped, and one that runs
+over is interrupted (SIGALRM, main thread on Unix). Every lineage row
+records the backend that produced it and how long that backend took, and
+every attempt is reported in an "Attempts" sheet.
+
+Usage:
+    python lineage_backends.py --sql-file deploy.sql --dialect oracle --budget 10
+    python lineage_backends.py --sql-file deploy.sql --backends sqlglot sqllineage --format jsonl
+
+Dependencies:
+    pip install sqlglot pandas openpyxl sqllineage sql_metadata
+"""
+
+import argparse
+import sys
+import time
+
+import pandas as pd
+from sqlglot import parse_one
+
+from lineage_cache import LineageCache
+from lineage_supervisor import time_limit
+from lineage_writers import WRITERS, open_writer
+from schema_catalog import SchemaCatalog
+from sql_lineage import (LINEAGE_COLUMNS, SQLLineageExtractor, _error_message, _target_from_tree,
+                         extract_column_lineage_with_transforms, get_column_lineage)
+from sql_statements import iter_statements
+
+# Initial cost estimates in ms per KB of SQL, measured with lineage_benchmarks.py
+DEFAULT_COSTS = {
+    "sqlglot": 8.0,
+    "sql_metadata": 40.0,
+    "sqllineage": 2500.0,
+}
+
+BACKEND_COLUMNS = ["backend", "backend_ms"]
+ATTEMPT_COLUMNS = ["backend", "status", "ms", "rows", "error"]
+
+# Weight of the newest observation in a backend's running cost average
+COST_SMOOTHING = 0.2
+
+# A failed attempt is observed as this multiple of the backend's current cost
+FAILURE_PENALTY = 2.0
+
+class BackendTimeout(Exception):
+    pass
+
+
+class LineageDispatcher:
+    def __init__(self,
+                 dialect: str = None,
+                 backends=None,
+                 budget: float = 30.0,
+                 adaptive: bool = True,
+                 cache: LineageCache = None,
+                 catalog: SchemaCatalog = None):
+        """
+        :param dialect:  SQL dialect for parsing (sqlglot name; None: generic)
+        :param backends: backends to use (default: all of DEFAULT_COSTS)
+        :param budget:   wall-clock seconds allowed per statement, over all attempts
+        :param adaptive: order backends by their observed cost; False keeps
+                         the order of backends as given
+        :param cache:    optional LineageCache for the sqlglot backend
+        :param catalog:  optional SchemaCatalog for the sqlglot backend
+        """
+        self.dialect = dialect
+        self.backends = list(backends or DEFAULT_COSTS)
+        unknown = [b for b in self.backends if b not in DEFAULT_COSTS]
+        if unknown:
+            raise ValueError(f"Unknown backend(s) {', '.join(unknown)} "
+                             f"(expected: {', '.join(DEFAULT_COSTS)})")
+        self.budget = budget
+        self.adaptive = adaptive
+        self.costs = {b: DEFAULT_COSTS[b] for b in self.backends}
+        self._sqlglot = SQLLineageExtractor(dialect=dialect, cache=cache, catalog=catalog)
+
+    def order(self):
+        """
+        Backends in the order they will be tried.
+        """
+        if not self.adaptive:
+            return list(self.backends)
+        return sorted(self.backends, key=self.costs.get)
+
+    def extract(self, sql: str, default_target: str = None):
+        """
+        Lineage of one statement from the cheapest backend that resolves it.
+
+        Returns (lineage_df, attempts): lineage_df has LINEAGE_COLUMNS plus
+        backend / backend_ms (empty if every backend failed), attempts
+        lists every backend considered with its status ("ok",
+        "incomplete", "failed", "timeout" or "skipped"), time and rows.
+        When no backend resolves the statement completely, the result with
+        the fewest unresolved rows is kept.
+        """
+        kb = max(len(sql.encode("utf-8")) / 1024, 0.1)
+        deadline = time.perf_counter() + self.budget if self.budget else None
+        attempts = []
+        best = None  # (unresolved rows, rows, backend, ms)
+
+        for backend in self.order():
+            remaining = deadline - time.perf_counter() if deadline else None
+            if remaining is not None and self.costs[backend] * kb / 1000 > remaining:
+                attempts.append({"backend": backend, "status": "skipped", "ms": 0.0, "rows": None,
+                                 "error": f"expected {self.costs[backend] * kb:.0f} ms, "
+                                          f"{remaining * 1000:.0f} ms left"})
+                continue
+
+            start = time.perf_counter()
+            error = None
+            rows = None
+            try:
+                with time_limit(remaining, BackendTimeout):
+                    rows = self._run(backend, sql, default_target)
+                status = "ok"
+            except BackendTimeout as e:
+                status, error = "timeout", str(e)
+            except Exception as e:
+                status, error = "failed", _error_message(e)
+            ms = (time.perf_counter() - start) * 1000
+            self._observe(backend, self.costs[backend] * FAILURE_PENALTY if status == "failed" else ms / kb)
+
+            unresolved = None
+            if rows is not None:
+                unresolved = sum(1 for r in rows if not _blank(r["source_column"]) and _blank(r["source_table"]))
+                # No rows at all is only complete if no earlier backend found columns
+                if unresolved or (not rows and best is not None and best[1]):
+                    status = "incomplete"
+                if best is None or (bool(rows), -unresolved) > (bool(best[1]), -best[0]):
+                    best = (unresolved, rows, backend, ms)
+            attempts.append({"backend": backend, "status": status, "ms": round(ms, 1),
+                             "rows": None if rows is None else len(rows), "error": error})
+            if status == "ok":
+                break
+
+        records = []
+        if best is not None:
+            _, rows, backend, ms = best
+            records = [dict(r, backend=backend, backend_ms=round(ms, 1)) for r in rows]
+        return pd.DataFrame(records, columns=LINEAGE_COLUMNS + BACKEND_COLUMNS), attempts
+
+    def write_script(self, lines, writer, default_target: str = None, leading: dict = None):
+        """
+        Split a script into statements and stream each one's lineage into
+        a lineage_writers writer ("Lineage" and "Attempts" sheets, with
+        leading statement_no / statement_line columns). Statements no
+        backend could process (no rows, and at least one backend failed or
+        timed out) go to "Errors". Returns their number.
+        """
+        failed = 0
+        for statement_no, start_line, text in iter_statements(lines, self.dialect):
+            values = dict(leading or {}, statement_no=statement_no, statement_line=start_line)
+            lineage_df, attempts = self.extract(text, default_target)
+            writer.write("Attempts", pd.DataFrame([dict(values, **a) for a in attempts],
+                                                  columns=list(values) + ATTEMPT_COLUMNS))
+            if not lineage_df.empty:
+                df = lineage_df.copy()
+                for position, (column, value) in enumerate(values.items()):
+                    df.insert(position, column, value)
+                writer.write("Lineage", df)
+            elif (not any(a["status"] == "ok" for a in attempts)
+                  and any(a["status"] in ("failed", "timeout") for a in attempts)):
+                failed += 1
+                errors = "; ".join(f"{a['backend']}: {a['error']}" for a in attempts)
+                writer.write("Errors", pd.DataFrame([dict(values, error=errors)]))
+        return failed
+
+    def _observe(self, backend: str, ms_per_kb: float):
+        self.costs[backend] += COST_SMOOTHING * (ms_per_kb - self.costs[backend])
+
+    def _run(self, backend: str, sql: str, default_target: str):
+        """
+        Run one backend; returns rows in LINEAGE_COLUMNS shape.
+        """
+        if backend == "sqlglot":
+            lineage_df = self._sqlglot.extract(sql, default_target=default_target)[0]
+            return lineage_df.to_dict("records")
+
+        if backend == "sqllineage":
+            df = extract_column_lineage_with_transforms(sql, default_target, self.dialect)
+            target_is_default = int(default_target is not None and
+                                    _target_from_tree(parse_one(sql, read=self.dialect), None) is None)
+            return [{
+                "source_table": r["source_table"],
+                "source_column": r["source_column"],
+                "transformation_steps": [r["transformation"]],
+                "target_table": r["target_table"],
+                "target_column": r["target_column"],
+                "target_is_default": target_is_default,
+            } for r in df.to_dict("records")]
+
+        lineage = get_column_lineage(sql)
+        if lineage is None:
+            raise ValueError("sql_metadata could not parse the statement")
+        return [{
+            "source_table": r["source_table"],
+            "source_column": r["source_column"],
+            "transformation_steps": [r["transformation_logic"]],
+            # get_column_lineage only knows the anonymous "result_set"
+            "target_table": default_target if r["target_table"] == "result_set" else r["target_table"],
+            "target_column": r["target_column"],
+            "target_is_default": int(default_target is not None and r["target_table"] == "result_set"),
+        } for r in lineage]
+
+
+def _blank(value) -> bool:
+    # None, NaN or ""
+    return value is None or value != value or value == ""
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Extract SQL lineage with the cheapest backend that resolves each statement"
+    )
+    parser.add_argument("--sql-file", required=True,
+                        help="Path to a .sql file (one or more statements).")
+    parser.add_argument("--dialect", default=None,
+                        help="SQL dialect for parsing (default: generic).")
+    parser.add_argument("--default-target", default=None,
+                        help="If no INSERT, use this as target (e.g. filename or table name).")
+    parser.add_argument("--backends", nargs="+", choices=list(DEFAULT_COSTS), default=None,
+                        help="Backends to try, in this order (default: all, cheapest first).")
+    parser.add_argument("--budget", type=float, default=30.0,
+                        help="Seconds allowed per statement across all backends (default: 30).")
+    parser.add_argument("--catalog", default=None,
+                        help="Schema catalog for the sqlglot backend (see schema_catalog.py).")
+    parser.add_argument("--format", choices=list(WRITERS), default="xlsx",
+                        help="Output format (default: xlsx).")
+    parser.add_argument("--output", default=None,
+                        help="Output path (default: lineage_backends.xlsx / lineage_backends_output).")
+    args = parser.parse_args()
+
+    output = args.output or ("lineage_backends.xlsx" if args.format == "xlsx" else "lineage_backends_output")
+    dispatcher = LineageDispatcher(dialect=args.dialect,
+                                   backends=args.backends,
+                                   budget=args.budget,
+                                   adaptive=args.backends is None,
+                                   catalog=SchemaCatalog.load(args.catalog) if args.catalog else None)
+    try:
+        sql_file = open(args.sql_file, "r", encoding="utf-8")
+    except OSError as e:
+        print(f"ERROR reading SQL file: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    with sql_file, open_writer(args.format, output) as writer:
+        failed = dispatcher.write_script(sql_file, writer, default_target=args.default_target)
+
+    costs = ", ".join(f"{b} {c:.1f}" for b, c in dispatcher.costs.items())
+    print(f"Lineage written to {output} ({failed} statements unresolved; ms/KB: {costs})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,425 @@
+#!/usr/bin/env python3
+"""
+lineage_benchmarks.py
+
+Synthetic benchmark suite for the lineage extractors in this repo:
+
+  sqlglot      sql_lineage.SQLLineageExtractor.extract
+  multipass    the multi-pass extraction SQLLineageExtractor replaced (one
+               find_all per Select/Where/Join plus a walk and a find_all
+               per projection, rendering SQL for every nested function),
+               frozen here as the baseline of the single-pass visitor
+  sqllineage   sql_lineage.extract_column_lineage_with_transforms
+  subqueries   sqlglot_with_subquries.extract_elements (the final version)
+
+make_workload() generates an INSERT ... SELECT whose shape is controlled
+by a few knobs: CTE chain depth, subquery nesting depth, projection width,
+join count, window functions and Oracle-specific syntax (NVL, DECODE,
+TO_CHAR, (+) outer joins, ROWNUM). The suite sweeps one knob at a time
+from a small base shape and times every extractor on every workload.
+
+Each measurement runs in a fresh worker process with a time limit, so a
+pathological case (or a crash) is reported instead of stalling the run,
+and peak memory (tracemalloc, in a separate untimed run) is not skewed by
+earlier cases. Everything is generated locally; no network is needed.
+
+Usage:
+    python lineage_benchmarks.py                                  # full sweep
+    python lineage_benchmarks.py --knob nesting --values 1 10 50 --extractors sqlglot subqueries
+    python lineage_benchmarks.py --repeat 5 --timeout 60 --csv bench.csv
+    python lineage_benchmarks.py --knob columns --values 100 500 2500 --extractors sqlglot multipass
+
+Dependencies:
+    pip install sqlglot pandas
+    pip install sqllineage    (only for the sqllineage extractor)
+"""
+
+import argparse
+import ast
+import multiprocessing
+import os
+import sys
+import time
+import tracemalloc
+
+import pandas as pd
+from sqlglot import exp, parse_one
+
+from sql_lineage import FILTER_COLUMNS, JOIN_COLUMNS, LINEAGE_COLUMNS
+
+# Base shape; every sweep varies one knob from here
+BASE_SHAPE = {
+    "cte_depth": 1,
+    "nesting": 1,
+    "columns": 20,
+    "joins": 2,
+    "windows": 1,
+    "oracle": False,
+}
+
+EXTRACTORS = ("sqlglot", "multipass", "sqllineage", "subqueries")
+
+# Default sweep values per knob
+SWEEPS = {
+    "cte_depth": [1, 5, 20],
+    "nesting": [1, 10, 25, 50],
+    "columns": [20, 200, 1000],
+    "joins": [2, 10, 30],
+    "windows": [1, 10, 50],
+    "oracle": [False, True],
+}
+
+
+class MultiPassExtractor:
+    """
+    The pre-visitor extraction logic, frozen as the benchmark baseline.
+
+    A standalone copy: it shares no code with SQLLineageExtractor, so later
+    optimizations there (CTE index, memoized helpers, deferred rendering)
+    never leak into the baseline. It mutates the tree it is given.
+    """
+
+    def __init__(self, dialect: str = None):
+        self.dialect = dialect
+        self.ctes = {}
+
+    def _extract_tree(self, tree: exp.Expression, default_target: str = None):
+        self.ctes = {}
+        with_expr = tree.find(exp.With)
+        if with_expr:
+            for cte in with_expr.expressions:
+                self.ctes[cte.alias_or_name] = cte.this
+            with_expr.pop()
+
+        target_table, _ = self._find_target(tree, default_target)
+
+        lineage_records = []
+        for select in tree.find_all(exp.Select):
+            for proj in select.expressions:
+                tgt_col = proj.alias_or_name
+                transform_steps = self._extract_transform_steps(proj)
+                for src_table, src_col in self._find_source_columns(proj):
+                    lineage_records.append({
+                        "source_table": src_table,
+                        "source_column": src_col,
+                        "transformation_steps": transform_steps,
+                        "target_table": target_table,
+                        "target_column": tgt_col
+                    })
+
+        filters = [{"predicate": w.this.sql(dialect=self.dialect)}
+                   for w in tree.find_all(exp.Where)]
+
+        joins = []
+        for join in tree.find_all(exp.Join):
+            on = join.args.get("on")
+            joins.append({
+                "join_type": " ".join(p for p in (join.side, join.kind) if p) or "JOIN",
+                "condition": on.sql(dialect=self.dialect) if on is not None else None
+            })
+
+        return (pd.DataFrame(lineage_records, columns=LINEAGE_COLUMNS),
+                pd.DataFrame(filters, columns=FILTER_COLUMNS),
+                pd.DataFrame(joins, columns=JOIN_COLUMNS))
+
+    def _find_target(self, tree: exp.Expression, default: str):
+        insert = tree.find(exp.Insert)
+        if insert:
+            target = insert.this
+            if isinstance(target, exp.Schema):
+                return target.this.name, [c.name for c in target.expressions]
+            return target.name, []
+        return default, []
+
+    def _extract_transform_steps(self, expr: exp.Expression):
+        # Renders every nested node again, once per enclosing node
+        steps = []
+        for node in expr.walk():
+            if isinstance(node, (exp.Func, exp.Cast, exp.Case, exp.If)):
+                steps.append(node.sql(dialect=self.dialect))
+        return steps or ["IDENTITY"]
+
+    def _find_source_columns(self, expr: exp.Expression):
+        results = []
+        for col in expr.find_all(exp.Column):
+            tbl = col.table
+            if tbl and tbl in self.ctes:
+                results.extend(self._extract_from_cte(tbl, col.name))
+            else:
+                results.append((tbl, col.name))
+        return results
+
+    def _extract_from_cte(self, cte_name: str, cte_column: str):
+        cte_select = self.ctes.get(cte_name)
+        if not isinstance(cte_select, exp.Select):
+            return []
+        for proj in cte_select.expressions:
+            if proj.alias_or_name == cte_column:
+                return self._find_source_columns(proj)
+        return []
+
+
+def make_workload(cte_depth: int = 1,
+                  nesting: int = 1,
+                  columns: int = 20,
+                  joins: int = 2,
+                  windows: int = 1,
+                  oracle: bool = False) -> str:
+    """
+    Generate one INSERT ... SELECT statement.
+
+    :param cte_depth: length of the WITH chain (cte_2 reads cte_1, ...); 0 = no WITH
+    :param nesting:   derived tables wrapped around the final SELECT
+    :param columns:   projection width at every level
+    :param joins:     base tables joined to t0 in the innermost query
+    :param windows:   window-function projections added at the top level
+    :param oracle:    use Oracle syntax (NVL, DECODE, TO_CHAR, (+) joins, ROWNUM)
+    """
+    tables = [f"t{i}" for i in range(joins + 1)]
+    cols = [f"c{i}" for i in range(columns)]
+    outermost = "base" if not cte_depth and not nesting else ("cte" if not nesting else "nested")
+
+    def window_projections(ref):
+        """
+        Window functions over the outermost level's columns.
+        """
+        extra = []
+        for w in range(windows):
+            part = ref(w % len(cols))
+            order = ref((w + 1) % len(cols))
+            func = "ROW_NUMBER()" if w % 2 == 0 else f"SUM({ref((w + 2) % len(cols))})"
+            extra.append(f"{func} OVER (PARTITION BY {part} ORDER BY {order}) AS w{w}")
+        return extra
+
+    def base_projection(i):
+        a = tables[i % len(tables)]
+        b = tables[(i + 1) % len(tables)]
+        if i % 4 == 0:
+            return f"{a}.col_{i}"
+        if i % 4 == 1:
+            if oracle:
+                return f"NVL(TRIM({a}.col_{i}), {b}.col_{i})"
+            return f"COALESCE(TRIM({a}.col_{i}), {b}.col_{i})"
+        if i % 4 == 2:
+            if oracle:
+                return f"DECODE({a}.flag_{i}, 'Y', {b}.amt_{i}, 0)"
+            return f"CASE WHEN {a}.flag_{i} = 'Y' THEN {b}.amt_{i} ELSE 0 END"
+        if oracle:
+            return f"TO_CHAR({a}.dt_{i}, 'YYYY-MM')"
+        return f"CAST({a}.amt_{i} AS DECIMAL(18, 2))"
+
+    # Innermost query over the joined base tables
+    projections = [f"{base_projection(i)} AS {c}" for i, c in enumerate(cols)]
+    if outermost == "base":
+        projections += window_projections(base_projection)
+    select = ",\n    ".join(projections)
+    if oracle:
+        source = ", ".join(tables)
+        where = [f"t0.id = {t}.id(+)" for t in tables[1:]]
+        where += ["t0.load_dt >= SYSDATE - 30", "ROWNUM <= 1000000"]
+        query = f"SELECT\n    {select}\nFROM {source}\nWHERE " + "\n  AND ".join(where)
+    else:
+        source = tables[0] + "".join(
+            f"\nLEFT JOIN {t} ON t0.id = {t}.id" for t in tables[1:])
+        query = f"SELECT\n    {select}\nFROM {source}\nWHERE t0.load_dt >= DATE '2024-01-01'"
+
+    # WITH chain: each CTE transforms every other column of the previous one
+    ctes = []
+    if cte_depth:
+        ctes.append(f"cte_1 AS (\n{query}\n)")
+        for d in range(2, cte_depth + 1):
+            proj = ", ".join(
+                f"UPPER(cte_{d - 1}.{c}) AS {c}" if i % 2 else f"cte_{d - 1}.{c}"
+                for i, c in enumerate(cols))
+            ctes.append(f"cte_{d} AS (\nSELECT {proj}\nFROM cte_{d - 1}\n)")
+        proj = [f"cte_{cte_depth}.{c}" for c in cols]
+        if outermost == "cte":
+            proj += window_projections(lambda i: f"cte_{cte_depth}.{cols[i]}")
+        query = f"SELECT {', '.join(proj)}\nFROM cte_{cte_depth}"
+
+    # Derived tables nested around it
+    for d in range(1, nesting + 1):
+        proj = [f"sq_{d}.{c}" for c in cols]
+        if d == nesting:
+            proj += window_projections(lambda i: f"sq_{d}.{cols[i]}")
+        query = f"SELECT {', '.join(proj)}\nFROM (\n{query}\n) sq_{d}"
+
+    targets = cols + [f"w{w}" for w in range(windows)]
+    with_clause = "WITH " + ",\n".join(ctes) + "\n" if ctes else ""
+    return f"INSERT INTO target_bench ({', '.join(targets)})\n{with_clause}{query}"
+
+
+def _load_extract_elements():
+    """
+    Compile the final extract_elements from sqlglot_with_subquries.py
+    without running the file, which is a series of example scripts.
+    """
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sqlglot_with_subquries.py")
+    with open(path, "r", encoding="utf-8") as f:
+        module = ast.parse(f.read())
+    definition = [n for n in module.body
+                  if isinstance(n, ast.FunctionDef) and n.name == "extract_elements"][-1]
+    namespace = {}
+    module.body = ast.parse("import sqlglot").body + [definition]
+    exec(compile(module, path, "exec"), namespace)
+    return namespace["extract_elements"]
+
+
+def _make_extractor(name: str, dialect: str):
+    """
+    Return a callable sql -> number of lineage rows for an extractor name.
+    """
+    if name == "sqlglot":
+        from sql_lineage import SQLLineageExtractor
+        extractor = SQLLineageExtractor(dialect=dialect)
+        return lambda sql: len(extractor.extract(sql, default_target="target_bench")[0])
+    if name == "multipass":
+        extractor = MultiPassExtractor(dialect=dialect)
+        return lambda sql: len(extractor._extract_tree(parse_one(sql, read=dialect), "target_bench")[0])
+    if name == "sqllineage":
+        from sql_lineage import extract_column_lineage_with_transforms
+        return lambda sql: len(extract_column_lineage_with_transforms(
+            sql, default_target="target_bench", dialect=dialect))
+    if name == "subqueries":
+        import sqlglot
+        extract_elements = _load_extract_elements()
+        return lambda sql: len(extract_elements(sqlglot.parse_one(sql, read=dialect))[0])
+    raise ValueError(f"Unknown extractor '{name}' (expected one of: {', '.join(EXTRACTORS)})")
+
+
+def _measure(task):
+    """
+    Worker: time one extractor on one statement (best of repeat), then
+    measure its peak traced memory in one more run.
+    """
+    name, sql, dialect, repeat = task
+    run = _make_extractor(name, dialect)
+    best = None
+    rows = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        rows = run(sql)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    tracemalloc.start()
+    try:
+        run(sql)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return best, rows, peak
+
+
+def measure(name: str, sql: str, dialect: str = "oracle", repeat: int = 3, timeout: float = 120):
+    """
+    Run _measure in a fresh process. Returns (seconds, rows, peak_bytes,
+    status); status is "ok", "timeout" or the error's type and message.
+    """
+    pool = multiprocessing.Pool(processes=1)
+    try:
+        result = pool.apply_async(_measure, ((name, sql, dialect, repeat),))
+        seconds, rows, peak = result.get(timeout)
+        return seconds, rows, peak, "ok"
+    except multiprocessing.TimeoutError:
+        return None, None, None, "timeout"
+    except Exception as e:
+        message = (str(e).strip().splitlines() or [""])[0][:80]
+        return None, None, None, f"{type(e).__name__}: {message}"
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def run(sweeps: dict, extractors=EXTRACTORS, dialect: str = "oracle",
+        repeat: int = 3, timeout: float = 120, progress=None):
+    """
+    Benchmark every extractor on every workload of the sweeps
+    (knob -> values, each varied from BASE_SHAPE).
+    Returns a DataFrame with one row per (knob, value, extractor).
+    """
+    rows = []
+    for knob, values in sweeps.items():
+        for value in values:
+            shape = dict(BASE_SHAPE, **{knob: value})
+            if shape["oracle"] and dialect != "oracle":
+                continue
+            sql = make_workload(**shape)
+            size = len(sql.encode("utf-8"))
+            for name in extractors:
+                seconds, n_rows, peak, status = measure(name, sql, dialect, repeat, timeout)
+                row = {
+                    "knob": knob,
+                    "value": value,
+                    "extractor": name,
+                    "sql_kb": round(size / 1024, 1),
+                    "ms": round(seconds * 1000, 1) if seconds is not None else None,
+                    "stmts_per_s": round(1 / seconds, 1) if seconds else None,
+                    "kb_per_s": round(size / 1024 / seconds, 1) if seconds else None,
+                    # Roughly constant across a sweep when the extractor scales linearly
+                    "ms_per_kb": round(seconds * 1000 / (size / 1024), 2) if seconds else None,
+                    "peak_mb": round(peak / 1e6, 1) if peak is not None else None,
+                    "rows": n_rows,
+                    "status": status,
+                }
+                rows.append(row)
+                if progress is not None:
+                    progress(row)
+    return pd.DataFrame(rows)
+
+
+def _parse_value(knob: str, text: str):
+    if knob == "oracle":
+        return text.lower() in ("1", "true", "yes", "y")
+    return int(text)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the lineage extractors on generated SQL"
+    )
+    parser.add_argument("--knob", choices=list(SWEEPS),
+                        help="Sweep only this knob (default: sweep every knob).")
+    parser.add_argument("--values", nargs="+",
+                        help="Values for --knob (default: the built-in sweep).")
+    parser.add_argument("--extractors", nargs="+", choices=EXTRACTORS, default=list(EXTRACTORS),
+                        help="Extractors to run (default: all).")
+    parser.add_argument("--dialect", default="oracle",
+                        help="sqlglot dialect (default: oracle; the Oracle-syntax workloads need it).")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="Timed runs per case; the best is reported.")
+    parser.add_argument("--timeout", type=float, default=120,
+                        help="Seconds allowed per case before it is reported as a timeout.")
+    parser.add_argument("--csv", default=None,
+                        help="Also write the results table to this CSV file.")
+    parser.add_argument("--show-sql", action="store_true",
+                        help="Print the generated statement for each workload instead of running.")
+    args = parser.parse_args()
+
+    if args.values and not args.knob:
+        parser.error("--values requires --knob")
+    if args.knob:
+        values = [_parse_value(args.knob, v) for v in args.values] if args.values else SWEEPS[args.knob]
+        sweeps = {args.knob: values}
+    else:
+        sweeps = SWEEPS
+
+    if args.show_sql:
+        for knob, values in sweeps.items():
+            for value in values:
+                print(f"-- {knob} = {value}")
+                print(make_workload(**dict(BASE_SHAPE, **{knob: value})) + ";\n")
+        return
+
+    def progress(row):
+        result = f"{row['ms']} ms" if row["status"] == "ok" else row["status"]
+        print(f"{row['knob']}={row['value']} {row['extractor']}: {result}", file=sys.stderr)
+
+    df = run(sweeps, args.extractors, args.dialect, args.repeat, args.timeout, progress)
+    print(df.to_string(index=False))
+    if args.csv:
+        df.to_csv(args.csv, index=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+lineage_cache.py
+
+Content-addressed on-disk cache for SQL lineage results.
+
+Entries are keyed by a SHA-256 of the normalized SQL text, the dialect,
+the extractor version and the default target, so unchanged files cost a
+hash and a single read. Each entry is one pickle file; the cache directory
+is kept under a size limit by evicting the least recently used entries.
+
+Safe to share between the worker processes of a batch run: writes go to a
+temp file and are moved into place atomically.
+
+Dependencies:
+    (standard library only)
+"""
+
+import hashlib
+import os
+import pickle
+import re
+import tempfile
+
+# Comments and quoted strings are kept verbatim (comments are matched first,
+# so an apostrophe in one does not open a string); any other run of whitespace
+# becomes one space, or one line break if it holds one (it ends a -- comment)
+_NORMALIZE_RE = re.compile(r"(--[^\n]*|/\*.*?\*/|'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\")|\s+", re.DOTALL)
+
+
+def _normalize_match(m) -> str:
+    if m.group(1):
+        return m.group(1)
+    return "\n" if "\n" in m.group(0) or "\r" in m.group(0) else " "
+
+
+def normalize_sql(sql: str) -> str:
+    r"""
+    Collapse whitespace outside comments, string literals and quoted
+    identifiers, so that re-indenting a file does not invalidate its cache
+    entry. Line breaks are kept, since they end -- comments:
+
+    >>> normalize_sql("SELECT a -- note\n   , b   FROM t") == normalize_sql("SELECT a -- note , b FROM t")
+    False
+    >>> normalize_sql("SELECT a,\n\t  b\r\n  FROM   t ")
+    'SELECT a,\nb\nFROM t'
+    >>> normalize_sql("SELECT 1 -- don't\nFROM t WHERE x = 'a  b'")
+    "SELECT 1 -- don't\nFROM t WHERE x = 'a  b'"
+    """
+    return _NORMALIZE_RE.sub(_normalize_match, sql).strip()
+
+
+class LineageCache:
+    def __init__(self, cache_dir: str = ".sql_lineage_cache", max_bytes: int = 512 * 1024 * 1024):
+        """
+        :param cache_dir: directory holding the cache entries (created if missing)
+        :param max_bytes: size limit for the whole directory; LRU entries are evicted above it
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+        self._size = None  # lazily computed total size of all entries
+
+    @staticmethod
+    def make_key(sql: str, dialect: str, version: str, default_target: str = None) -> str:
+        """
+        Hash of everything that determines an extraction result.
+        """
+        h = hashlib.sha256()
+        for part in (version, dialect or "", default_target or "", normalize_sql(sql)):
+            h.update(part.encode("utf-8"))
+            h.update(b"\0")
+        return h.hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], key + ".pkl")
+
+    def get(self, key: str):
+        """
+        Return the cached value for key, or None on a miss.
+        """
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                value = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except (pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+            # Corrupt or written by an incompatible version: treat as a miss
+            self._remove(path)
+            return None
+        # Bump mtime so eviction sees this entry as recently used
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return value
+
+    def put(self, key: str, value):
+        """
+        Store value under key, then evict old entries if over the size limit.
+        """
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+        except BaseException:
+            self._remove(tmp_path)
+            raise
+
+        if self._size is None:
+            self._size = sum(size for _, size, _ in self._entries())
+        else:
+            self._size += os.path.getsize(path)
+        if self._size > self.max_bytes:
+            self.evict()
+
+    def evict(self, target_bytes: int = None):
+        """
+        Delete least recently used entries until the cache is below
+        target_bytes (default: 90% of max_bytes).
+        """
+        if target_bytes is None:
+            target_bytes = int(self.max_bytes * 0.9)
+        entries = sorted(self._entries(), key=lambda e: e[2])
+        total = sum(size for _, size, _ in entries)
+        for path, size, _ in entries:
+            if total <= target_bytes:
+                break
+            self._remove(path)
+            total -= size
+        self._size = total
+
+    def clear(self):
+        for path, _, _ in self._entries():
+            self._remove(path)
+        self._size = 0
+
+    def _entries(self):
+        """
+        Yield (path, size, mtime) for every entry on disk.
+        """
+        for shard in os.scandir(self.cache_dir):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.name.endswith(".pkl"):
+                    try:
+                        st = entry.stat()
+                    except FileNotFoundError:
+                        continue  # evicted concurrently by another worker
+                    yield entry.path, st.st_size, st.st_mtime
+
+    @staticmethod
+    def _remove(path: str):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
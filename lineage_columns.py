@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+lineage_columns.py
+
+Columnar, dictionary-encoded accumulation of lineage results.
+
+Collecting a large run as DataFrames (FrameCollector) keeps one Python
+object per cell: the same table and column names are stored millions of
+times, and concatenating the chunks copies everything once more. A
+ColumnarBuffer keeps every column as a compact array instead:
+
+  names                 table / column names, predicates, file names, ...:
+                        int32 codes into one NameDictionary shared by every
+                        buffer of a collector (each distinct string is
+                        stored once for the whole run)
+  statement_no / _line  int64 values plus a null mask
+  transformation_steps  int32 codes into the buffer's distinct step lists
+                        (rows of one projection share their steps)
+
+Appending a chunk only encodes it; nothing is kept per row but the codes.
+to_pandas() and to_arrow() hand the code arrays over without re-encoding:
+names become pandas Categoricals / Arrow dictionary arrays over the
+shared dictionary, integers are wrapped in place. Because the results are
+views, a buffer cannot grow (BufferError) while a frame or table made from
+it is still alive: convert once everything has been collected.
+
+ColumnarCollector is the LineageWriter that fills one buffer per sheet;
+SQLLineageExtractor.extract_script(..., columnar=True) and
+extract_batch(..., columnar=True) return its buffers.
+
+Dependencies:
+    pip install numpy pandas
+    pip install pyarrow    (only for to_arrow)
+"""
+
+from array import array
+
+import numpy as np
+import pandas as pd
+
+from lineage_writers import INT_COLUMNS, LineageWriter, _is_missing
+
+# Columns holding per-row lists (or TransformTrees) rather than names
+OBJECT_COLUMNS = {"transformation_steps"}
+
+
+class NameDictionary:
+    """
+    Distinct strings <-> int32 codes; None / NaN encode as -1.
+    """
+
+    def __init__(self):
+        self.names = []
+        self._codes = {}
+
+    def __len__(self):
+        return len(self.names)
+
+    def encode(self, values):
+        """
+        Codes of values (any iterable), adding unseen strings.
+        """
+        codes = self._codes
+        names = self.names
+        out = array("i")
+        for value in values:
+            if _is_missing(value):
+                out.append(-1)
+                continue
+            code = codes.get(value)
+            if code is None:
+                value = str(value)
+                code = codes.get(value)
+                if code is None:
+                    code = codes[value] = len(names)
+                    names.append(value)
+            out.append(code)
+        return out
+
+    def index(self) -> pd.Index:
+        return pd.Index(self.names, dtype=object)
+
+
+def _object_key(value):
+    # Lists are compared by content; other objects (TransformTrees) by identity
+    return tuple(value) if isinstance(value, list) else ("id", id(value))
+
+
+class ColumnarBuffer:
+    def __init__(self, columns, dictionary: NameDictionary = None):
+        """
+        :param columns:    column names, in order
+        :param dictionary: NameDictionary shared with other buffers
+        """
+        self.columns = list(columns)
+        self.dictionary = dictionary or NameDictionary()
+        self.num_rows = 0
+        self._data = {}
+        for column in self.columns:
+            if column in INT_COLUMNS:
+                self._data[column] = (array("q"), bytearray())
+            elif column in OBJECT_COLUMNS:
+                self._data[column] = (array("i"), [], {})
+            else:
+                self._data[column] = array("i")
+
+    def __len__(self):
+        return self.num_rows
+
+    def append_frame(self, df: pd.DataFrame):
+        """
+        Encode and append a chunk; columns missing from it are null.
+        """
+        n = len(df)
+        for column in self.columns:
+            values = df[column].tolist() if column in df.columns else [None] * n
+            data = self._data[column]
+            if column in INT_COLUMNS:
+                ints, mask = data
+                for value in values:
+                    missing = _is_missing(value)
+                    ints.append(0 if missing else int(value))
+                    mask.append(missing)
+            elif column in OBJECT_COLUMNS:
+                codes, objects, seen = data
+                for value in values:
+                    if _is_missing(value):
+                        codes.append(-1)
+                        continue
+                    key = _object_key(value)
+                    code = seen.get(key)
+                    if code is None:
+                        code = seen[key] = len(objects)
+                        objects.append(value)
+                    codes.append(code)
+            else:
+                data.extend(self.dictionary.encode(values))
+        self.num_rows += n
+
+    @property
+    def nbytes(self) -> int:
+        """
+        Size of the code / value arrays (the shared dictionary excluded).
+        """
+        total = 0
+        for column in self.columns:
+            data = self._data[column]
+            if column in INT_COLUMNS:
+                total += data[0].itemsize * len(data[0]) + len(data[1])
+            elif column in OBJECT_COLUMNS:
+                total += data[0].itemsize * len(data[0])
+            else:
+                total += data.itemsize * len(data)
+        return total
+
+    def codes(self, column: str) -> np.ndarray:
+        """
+        int32 codes of a name or steps column (a view, not a copy).
+        """
+        data = self._data[column]
+        return np.frombuffer(data[0] if column in OBJECT_COLUMNS else data, dtype=np.int32)
+
+    def to_pandas(self) -> pd.DataFrame:
+        """
+        DataFrame over the buffers: name columns as Categoricals (codes
+        reused as they are), int columns as nullable Int64.
+        """
+        categories = self.dictionary.index()
+        frame = {}
+        for column in self.columns:
+            data = self._data[column]
+            if column in INT_COLUMNS:
+                values = np.frombuffer(data[0], dtype=np.int64)
+                mask = np.frombuffer(data[1], dtype=np.bool_)
+                frame[column] = pd.arrays.IntegerArray(values, mask)
+            elif column in OBJECT_COLUMNS:
+                codes = self.codes(column)
+                objects = np.empty(len(data[1]) + 1, dtype=object)
+                for i, value in enumerate(data[1]):
+                    objects[i] = value
+                # -1 picks the trailing None
+                frame[column] = objects[codes]
+            else:
+                frame[column] = pd.Categorical.from_codes(self.codes(column), categories=categories,
+                                                          validate=False)
+        return pd.DataFrame(frame, columns=self.columns, copy=False)
+
+    def to_arrow(self):
+        """
+        pyarrow Table over the buffers: name columns as dictionary arrays,
+        transformation steps as list<string>.
+        """
+        import pyarrow as pa
+
+        dictionary = pa.array(self.dictionary.names, type=pa.string())
+        arrays = []
+        for column in self.columns:
+            data = self._data[column]
+            if column in INT_COLUMNS:
+                mask = np.frombuffer(data[1], dtype=np.bool_)
+                arrays.append(pa.array(np.frombuffer(data[0], dtype=np.int64), mask=mask))
+            elif column in OBJECT_COLUMNS:
+                steps = pa.array([[str(s) for s in v] for v in data[1]], type=pa.list_(pa.string()))
+                codes = self.codes(column)
+                arrays.append(steps.take(pa.array(codes, mask=codes < 0)))
+            else:
+                codes = self.codes(column)
+                arrays.append(pa.DictionaryArray.from_arrays(
+                    pa.array(codes, mask=codes < 0), dictionary))
+        return pa.Table.from_arrays(arrays, names=self.columns)
+
+
+class ColumnarCollector(LineageWriter):
+    """
+    Keep every chunk encoded in a ColumnarBuffer per sheet, with one
+    NameDictionary for all sheets.
+    """
+
+    def __init__(self, columns: dict = None):
+        """
+        :param columns: sheet -> column list used for sheets that received no rows
+        """
+        self.columns = columns or {}
+        self.dictionary = NameDictionary()
+        self._buffers = {}
+
+    def write(self, sheet: str, df: pd.DataFrame):
+        buffer = self._buffers.get(sheet)
+        if buffer is None:
+            buffer = self._buffers[sheet] = ColumnarBuffer(df.columns, self.dictionary)
+        buffer.append_frame(df)
+
+    def buffer(self, sheet: str) -> ColumnarBuffer:
+        buffer = self._buffers.get(sheet)
+        if buffer is None:
+            buffer = self._buffers[sheet] = ColumnarBuffer(self.columns.get(sheet, []), self.dictionary)
+        return buffer
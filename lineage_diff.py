@@ -0,0 +1,416 @@
+#!/usr/bin/env python3
+"""
+lineage_diff.py
+
+Column-lineage diff between two revisions of a SQL tree, for code review.
+
+Each side is a git revision (of --repo, under --sql-dir) or a directory.
+Every file is fingerprinted by its git blob hash (computed the same way
+for directories), so files with the same content on both sides are never
+read: their lineage cannot differ. Only added, removed and modified
+files are extracted, on each side where they exist:
+
+  * a file version's lineage is looked up in the on-disk cache by its
+    blob hash (plus dialect, extractor version, catalog and default
+    target), so a revision that was diffed before costs no extraction
+  * misses are extracted (git blobs via a temp checkout of just those
+    files) with the batch machinery of sql_lineage.py, which also serves
+    unchanged statements of a modified file from the statement cache
+  * every file version's lineage gets a fingerprint (a hash of its edge
+    set); files whose fingerprints match changed only in ways that do
+    not affect lineage (comments, formatting, ...)
+
+An edge is (source_table, source_column) -> (target_table, target_column)
+within a file, compared case-insensitively; its transformations are the
+distinct transformation_steps chains that produce it. The output lists
+the Added, Removed and Changed (same endpoints, different
+transformations) edges per file, a Files sheet with each changed file's
+status, hashes, fingerprints and edge counts, and an Errors sheet. A
+file with statements that failed to extract on either side is not
+diffed: its status is "error" (see the Errors sheet).
+
+Usage:
+    python lineage_diff.py --base main --head HEAD --sql-dir sql --dialect oracle
+    python lineage_diff.py --base old_sql/ --head new_sql/ --format jsonl --output review_diff
+
+Dependencies:
+    pip install sqlglot pandas
+    pip install pyarrow    (only for --format parquet)
+"""
+
+import argparse
+import fnmatch
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+import pandas as pd
+
+from lineage_cache import LineageCache
+from lineage_writers import WRITERS, open_writer
+from schema_catalog import SchemaCatalog
+from sql_lineage import (SQLLineageExtractor, _extract_batch_file, _init_batch_worker,
+                         find_sql_files, iter_batch_lineage)
+
+FILE_COLUMNS = ["path", "status", "base_hash", "head_hash", "base_fingerprint", "head_fingerprint",
+                "added", "removed", "changed", "cached"]
+EDGE_COLUMNS = ["path", "source_table", "source_column", "target_table", "target_column",
+                "transformations"]
+CHANGED_COLUMNS = ["path", "source_table", "source_column", "target_table", "target_column",
+                   "base_transformations", "head_transformations"]
+ERROR_COLUMNS = ["side", "path", "statement_no", "statement_line", "error"]
+
+# Up to this many files are extracted in-process (no pool start-up)
+LOCAL_BATCH = 8
+
+
+def git_blob_hash(path: str) -> str:
+    """
+    The hash git gives the file's content (sha1 of "blob <size>\\0" + bytes).
+    """
+    h = hashlib.sha1(f"blob {os.path.getsize(path)}\0".encode("ascii"))
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _git(repo: str, *args, input: bytes = None) -> bytes:
+    return subprocess.run(["git", "-C", repo, *args], input=input, check=True, capture_output=True).stdout
+
+
+def _matches(path: str, pattern: str) -> bool:
+    # glob's "**/" also matches no directory at all
+    return fnmatch.fnmatch(path, pattern) or (pattern.startswith("**/") and fnmatch.fnmatch(path, pattern[3:]))
+
+
+class DirectoryTree:
+    def __init__(self, root: str, pattern: str = "**/*.sql"):
+        """
+        :param root:    directory of SQL files
+        :param pattern: glob of the files to compare, relative to root
+        """
+        self.root = root
+        self.pattern = pattern
+        self.label = root
+
+    def files(self):
+        """
+        relative path -> blob hash of every matching file.
+        """
+        return {os.path.relpath(path, self.root).replace(os.sep, "/"): git_blob_hash(path)
+                for path in find_sql_files(self.root, self.pattern)}
+
+    def materialize(self, relpaths, work_dir: str):
+        """
+        relative path -> a file on disk holding that version.
+        """
+        return {relpath: os.path.join(self.root, relpath) for relpath in relpaths}
+
+
+class GitTree:
+    def __init__(self, repo: str, revision: str, sql_dir: str = "", pattern: str = "**/*.sql"):
+        """
+        :param repo:     git working tree or repository
+        :param revision: any commit-ish (branch, tag, sha, HEAD~3, ...)
+        :param sql_dir:  directory of the SQL files inside the repository
+        :param pattern:  glob of the files to compare, relative to sql_dir
+        """
+        self.repo = repo
+        self.revision = _git(repo, "rev-parse", "--verify", f"{revision}^{{commit}}").decode().strip()
+        self.sql_dir = sql_dir.strip("/")
+        self.pattern = pattern
+        self.label = f"{revision} ({self.revision[:10]})"
+        self._blobs = None
+
+    def files(self):
+        """
+        relative path -> blob hash of every matching file (from the tree
+        object, nothing is read).
+        """
+        if self._blobs is None:
+            listing = _git(self.repo, "ls-tree", "-r", "-z", "--full-tree", self.revision, "--",
+                           self.sql_dir or ".")
+            prefix = self.sql_dir + "/" if self.sql_dir else ""
+            self._blobs = {}
+            for entry in listing.decode("utf-8", "surrogateescape").split("\0"):
+                if not entry:
+                    continue
+                info, path = entry.split("\t", 1)
+                _, kind, blob = info.split()
+                relpath = path[len(prefix):]
+                if kind == "blob" and path.startswith(prefix) and _matches(relpath, self.pattern):
+                    self._blobs[relpath] = blob
+        return self._blobs
+
+    def materialize(self, relpaths, work_dir: str):
+        """
+        Write the given files of the revision under work_dir (one git
+        cat-file for all of them). Returns relative path -> written file.
+        """
+        relpaths = list(relpaths)
+        if not relpaths:
+            return {}
+        blobs = self.files()
+        request = "".join(blobs[relpath] + "\n" for relpath in relpaths).encode("ascii")
+        output = _git(self.repo, "cat-file", "--batch", input=request)
+        paths = {}
+        position = 0
+        for relpath in relpaths:
+            header_end = output.index(b"\n", position)
+            size = int(output[position:header_end].split()[2])
+            content = output[header_end + 1:header_end + 1 + size]
+            position = header_end + 1 + size + 1
+            path = os.path.join(work_dir, *relpath.split("/"))
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "wb") as f:
+                f.write(content)
+            paths[relpath] = path
+        return paths
+
+
+def open_tree(spec: str, repo: str = ".", sql_dir: str = "", pattern: str = "**/*.sql"):
+    """
+    A DirectoryTree if spec is a directory, else a GitTree of revision spec.
+    """
+    if os.path.isdir(spec):
+        return DirectoryTree(spec, pattern)
+    return GitTree(repo, spec, sql_dir, pattern)
+
+
+def lineage_edges(lineage_df: pd.DataFrame) -> dict:
+    """
+    (source_table, source_column, target_table, target_column), lower-cased
+    -> [display names, sorted distinct transformation chains].
+    """
+    edges = {}
+    if lineage_df is None or lineage_df.empty:
+        return edges
+    columns = ["source_table", "source_column", "target_table", "target_column", "transformation_steps"]
+    for *names, steps in lineage_df[columns].itertuples(index=False, name=None):
+        names = tuple(None if pd.isna(n) else str(n) for n in names)
+        key = tuple(n.lower() if n is not None else None for n in names)
+        entry = edges.setdefault(key, [names, set()])
+        entry[1].add(json.dumps([str(s) for s in steps]) if steps is not None else None)
+    for entry in edges.values():
+        entry[1] = sorted(entry[1], key=lambda t: t or "")
+    return edges
+
+
+def lineage_fingerprint(edges: dict) -> str:
+    """
+    Hash of a file version's edge set and transformations.
+    """
+    h = hashlib.sha256()
+    for key in sorted(edges, key=lambda k: tuple(p or "" for p in k)):
+        h.update(json.dumps([key, edges[key][1]]).encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()[:16]
+
+
+def diff_edges(base: dict, head: dict):
+    """
+    (added, removed, changed) between two lineage_edges results: lists of
+    head entries, base entries and (base, head) entry pairs.
+    """
+    added = [head[k] for k in head if k not in base]
+    removed = [base[k] for k in base if k not in head]
+    changed = [(base[k], head[k]) for k in head if k in base and base[k][1] != head[k][1]]
+    return added, removed, changed
+
+
+class LineageDiff:
+    def __init__(self, base, head, dialect: str = None, workers: int = None,
+                 cache_dir: str = None, cache_bytes: int = None, catalog_path: str = None):
+        """
+        :param base:         DirectoryTree / GitTree before the change
+        :param head:         DirectoryTree / GitTree after the change
+        :param dialect:      SQL dialect for parsing (None: generic)
+        :param workers:      worker processes for extraction (default: CPU count)
+        :param cache_dir:    on-disk cache for per-file and per-statement results
+        :param cache_bytes:  size limit of the cache directory
+        :param catalog_path: schema catalog (see schema_catalog.py)
+        """
+        self.base = base
+        self.head = head
+        self.dialect = dialect
+        self.workers = workers
+        self.cache_dir = cache_dir
+        self.cache_bytes = cache_bytes or 512 * 1024 * 1024
+        self.catalog_path = catalog_path
+        self.cache = LineageCache(cache_dir, self.cache_bytes) if cache_dir else None
+        version = SQLLineageExtractor.VERSION
+        if catalog_path:
+            version = f"{version}+{SchemaCatalog.load(catalog_path).fingerprint}"
+        self._version = version
+        self.errors = []
+        self.cached = 0
+        self.extracted = 0
+
+    def _file_key(self, blob: str, default_target: str) -> str:
+        h = hashlib.sha256()
+        for part in ("lineage_diff", self._version, self.dialect or "", default_target, blob):
+            h.update(part.encode("utf-8"))
+            h.update(b"\0")
+        return h.hexdigest()
+
+    def _lineage(self, side: str, tree, relpaths, work_dir: str):
+        """
+        relative path -> (lineage_edges, fingerprint, from_cache, failed) of
+        the given files of one side; failed is set when any statement of
+        the file could not be extracted.
+        """
+        blobs = tree.files()
+        results = {}
+        missing = []
+        for relpath in relpaths:
+            default_target = os.path.splitext(os.path.basename(relpath))[0]
+            cached = self.cache.get(self._file_key(blobs[relpath], default_target)) if self.cache else None
+            if cached is None:
+                missing.append(relpath)
+                continue
+            edges, errors = cached
+            self.errors.extend({"side": side, "path": relpath, **e} for e in errors)
+            results[relpath] = (edges, lineage_fingerprint(edges), True, bool(errors))
+        self.cached += len(results)
+
+        on_disk = tree.materialize(missing, os.path.join(work_dir, side))
+        relpath_of = {path: relpath for relpath, path in on_disk.items()}
+        for path, frames, file_errors in self._extract(list(on_disk.values())):
+            relpath = relpath_of[path]
+            edges = lineage_edges(frames[0] if frames is not None else None)
+            self.errors.extend({"side": side, "path": relpath, **e} for e in file_errors)
+            # A version that only produced errors is not cached: the cause
+            # (dialect, catalog, a sqlglot bug) is likely to be fixed
+            if self.cache is not None and frames is not None and (edges or not file_errors):
+                default_target = os.path.splitext(os.path.basename(relpath))[0]
+                self.cache.put(self._file_key(blobs[relpath], default_target), (edges, file_errors))
+            results[relpath] = (edges, lineage_fingerprint(edges), False, bool(file_errors))
+        self.extracted += len(on_disk)
+        return results
+
+    def _extract(self, paths):
+        if len(paths) <= LOCAL_BATCH:
+            if paths:
+                _init_batch_worker(self.dialect, self.cache_dir, self.cache_bytes, None, self.catalog_path)
+            for path in paths:
+                yield _extract_batch_file((path, os.path.splitext(os.path.basename(path))[0]))[:3]
+            return
+        yield from iter_batch_lineage(paths, self.dialect, workers=self.workers,
+                                      cache_dir=self.cache_dir, cache_bytes=self.cache_bytes,
+                                      catalog_path=self.catalog_path)
+
+    def run(self):
+        """
+        Compare the two trees. Returns (files, added, removed, changed)
+        DataFrames.
+        """
+        base_files, head_files = self.base.files(), self.head.files()
+        changed_paths = sorted(p for p in set(base_files) | set(head_files)
+                               if base_files.get(p) != head_files.get(p))
+        with tempfile.TemporaryDirectory(prefix="lineage_diff_") as work_dir:
+            base = self._lineage("base", self.base, [p for p in changed_paths if p in base_files], work_dir)
+            head = self._lineage("head", self.head, [p for p in changed_paths if p in head_files], work_dir)
+
+        files, added_rows, removed_rows, changed_rows = [], [], [], []
+        for path in changed_paths:
+            base_edges, base_fp, base_cached, base_failed = base.get(path, ({}, None, True, False))
+            head_edges, head_fp, head_cached, head_failed = head.get(path, ({}, None, True, False))
+            if base_failed or head_failed:
+                # Partial lineage would show up as bogus added / removed
+                # edges (or hide real ones): see the Errors sheet instead
+                status = "error"
+            elif path not in base_files:
+                status = "added"
+            elif path not in head_files:
+                status = "removed"
+            else:
+                status = "modified" if base_fp != head_fp else "lineage unchanged"
+            if status == "error" or base_fp == head_fp:
+                added, removed, changed = [], [], []
+            else:
+                added, removed, changed = diff_edges(base_edges, head_edges)
+            added_rows.extend([path, *names, transforms] for names, transforms in added)
+            removed_rows.extend([path, *names, transforms] for names, transforms in removed)
+            changed_rows.extend([path, *head_entry[0], base_entry[1], head_entry[1]]
+                                for base_entry, head_entry in changed)
+            files.append([path, status, base_files.get(path), head_files.get(path), base_fp, head_fp,
+                          len(added), len(removed), len(changed), base_cached and head_cached])
+
+        return (pd.DataFrame(files, columns=FILE_COLUMNS),
+                pd.DataFrame(added_rows, columns=EDGE_COLUMNS),
+                pd.DataFrame(removed_rows, columns=EDGE_COLUMNS),
+                pd.DataFrame(changed_rows, columns=CHANGED_COLUMNS))
+
+    def write(self, writer, result=None):
+        """
+        Write the Files, Added, Removed, Changed and Errors sheets.
+        """
+        files, added, removed, changed = result if result is not None else self.run()
+        writer.write("Files", files)
+        writer.write("Added", added)
+        writer.write("Removed", removed)
+        writer.write("Changed", changed)
+        writer.write("Errors", pd.DataFrame(self.errors, columns=ERROR_COLUMNS))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Diff column-level lineage between two git revisions or directories of SQL"
+    )
+    parser.add_argument("--base", required=True,
+                        help="Revision (commit-ish) or directory before the change.")
+    parser.add_argument("--head", default="HEAD",
+                        help="Revision or directory after the change (default: HEAD).")
+    parser.add_argument("--repo", default=".",
+                        help="Git repository for revisions (default: current directory).")
+    parser.add_argument("--sql-dir", default="",
+                        help="Directory of the SQL files inside the repository (default: its root).")
+    parser.add_argument("--pattern", default="**/*.sql",
+                        help="Glob of the files to compare (default: **/*.sql).")
+    parser.add_argument("--dialect", default=None,
+                        help="SQL dialect for parsing (default: generic).")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Worker processes for extraction (default: CPU count).")
+    parser.add_argument("--catalog", default=None,
+                        help="Schema catalog for unqualified columns and * expansion (see schema_catalog.py).")
+    parser.add_argument("--format", choices=list(WRITERS), default="xlsx",
+                        help="Output format (default: xlsx).")
+    parser.add_argument("--output", default=None,
+                        help="Output path (default: lineage_diff.xlsx / lineage_diff_output).")
+    parser.add_argument("--cache-dir", default=".sql_lineage_cache",
+                        help="Directory for the on-disk lineage cache (default: .sql_lineage_cache).")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Always re-parse; neither read nor write the cache.")
+    args = parser.parse_args()
+
+    try:
+        base = open_tree(args.base, args.repo, args.sql_dir, args.pattern)
+        head = open_tree(args.head, args.repo, args.sql_dir, args.pattern)
+    except (subprocess.CalledProcessError, OSError) as e:
+        detail = e.stderr.decode(errors="replace").strip() if getattr(e, "stderr", None) else e
+        print(f"ERROR opening revision: {detail}", file=sys.stderr)
+        sys.exit(1)
+
+    differ = LineageDiff(base, head, args.dialect, args.workers,
+                         cache_dir=None if args.no_cache else args.cache_dir,
+                         catalog_path=args.catalog)
+    result = differ.run()
+    files, added, removed, changed = result
+
+    output = args.output or ("lineage_diff.xlsx" if args.format == "xlsx" else "lineage_diff_output")
+    with open_writer(args.format, output) as writer:
+        differ.write(writer, result)
+
+    print(f"{base.label} -> {head.label}: {len(files)} changed file(s) "
+          f"({differ.extracted} extracted, {differ.cached} from cache)")
+    print(f"  {len(added)} edges added, {len(removed)} removed, {len(changed)} changed; "
+          f"{len(differ.errors)} errors in {(files['status'] == 'error').sum()} file(s)")
+    print(f"Lineage diff written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+"""
+lineage_graph.py
+
+Transitive upstream / downstream impact queries over column lineage.
+
+All edges (e.g. from the lineage_store.py SQLite store) are compiled once
+into a compact on-disk graph:
+
+  names.bin / name_offsets.npy   sorted, de-duplicated "table.column" names;
+                                 a node's integer id is its rank
+  fwd_indptr.npy / fwd_indices.npy   CSR adjacency, source -> targets
+  rev_indptr.npy / rev_indices.npy   CSR adjacency, target -> sources
+
+Every array is memory-mapped when the graph is opened, so opening is
+instant and queries only touch the pages they need. A closure query is a
+breadth-first search that expands the whole frontier at once with numpy,
+so upstream/downstream closures on million-edge graphs take milliseconds.
+Queries accept a depth limit and keep one parent per reached node, so
+the path from the queried column can be rebuilt.
+
+Usage:
+    python lineage_graph.py build --db lineage.db --graph-dir lineage_graph
+    python lineage_graph.py upstream FINAL_REPORT.SALES_FIGURE --graph-dir lineage_graph --depth 5 --paths
+    python lineage_graph.py downstream SALES.AMOUNT --graph-dir lineage_graph
+
+Dependencies:
+    pip install numpy
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+from lineage_store import LineageStore, split_column_ref
+
+
+def column_key(table: str, column: str) -> str:
+    """
+    Canonical node name: lower-cased "table.column" (matching the store's
+    case-insensitive collation).
+    """
+    return f"{table or ''}.{column or ''}".lower()
+
+
+class Closure:
+    """
+    Result of a closure query: every reached node with its BFS depth and the
+    node it was first reached from.
+    """
+
+    def __init__(self, graph, root: int, nodes, depths, parents):
+        self.graph = graph
+        self.root = root
+        self.nodes = nodes       # int32 node ids, in BFS order (root excluded)
+        self.depths = depths     # int32 hop count per node
+        self._parents = parents  # dense node id -> parent id (-1 = not reached)
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def names(self):
+        return [self.graph.node_name(i) for i in self.nodes]
+
+    def path(self, node: int):
+        """
+        Node ids from the queried column to node, following BFS parents
+        (a shortest path). Empty if node was not reached.
+        """
+        if node != self.root and self._parents[node] < 0:
+            return []
+        path = [node]
+        while node != self.root:
+            node = int(self._parents[node])
+            path.append(node)
+        return path[::-1]
+
+    def to_records(self, with_paths: bool = False):
+        records = []
+        for node, depth in zip(self.nodes.tolist(), self.depths.tolist()):
+            record = {"column": self.graph.node_name(node), "depth": depth}
+            if with_paths:
+                record["path"] = [self.graph.node_name(i) for i in self.path(node)]
+            records.append(record)
+        return records
+
+
+class LineageGraph:
+    def __init__(self, graph_dir: str):
+        """
+        Open a graph compiled by LineageGraph.build (memory-mapped, read-only).
+        """
+        self.graph_dir = graph_dir
+
+        def load(name):
+            return np.load(os.path.join(graph_dir, name + ".npy"), mmap_mode="r")
+
+        self._name_offsets = load("name_offsets")
+        self._names = np.memmap(os.path.join(graph_dir, "names.bin"), dtype=np.uint8, mode="r") \
+            if os.path.getsize(os.path.join(graph_dir, "names.bin")) else np.zeros(0, np.uint8)
+        self._fwd = (load("fwd_indptr"), load("fwd_indices"))
+        self._rev = (load("rev_indptr"), load("rev_indices"))
+        self.num_nodes = len(self._name_offsets) - 1
+        self.num_edges = len(self._fwd[1])
+
+    @classmethod
+    def build(cls, edges, graph_dir: str):
+        """
+        Compile an iterable of (source_table, source_column, target_table,
+        target_column) tuples into graph_dir and return the opened graph.
+        Duplicate edges and self-loops are dropped.
+        """
+        ids = {}
+        src, dst = [], []
+        for s_table, s_column, t_table, t_column in edges:
+            s = ids.setdefault(column_key(s_table, s_column), len(ids))
+            t = ids.setdefault(column_key(t_table, t_column), len(ids))
+            if s != t:
+                src.append(s)
+                dst.append(t)
+
+        # Renumber nodes in name order, so a name lookup is a binary search
+        names = sorted(ids)
+        rank = np.empty(len(names), dtype=np.int32)
+        rank[[ids[n] for n in names]] = np.arange(len(names), dtype=np.int32)
+        src = rank[np.asarray(src, dtype=np.int64)]
+        dst = rank[np.asarray(dst, dtype=np.int64)]
+
+        # De-duplicate edges
+        if len(src):
+            pairs = np.unique(src.astype(np.int64) * len(names) + dst)
+            src = (pairs // len(names)).astype(np.int32)
+            dst = (pairs % len(names)).astype(np.int32)
+
+        os.makedirs(graph_dir, exist_ok=True)
+        encoded = [n.encode("utf-8") for n in names]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(b) for b in encoded], out=offsets[1:])
+        with open(os.path.join(graph_dir, "names.bin"), "wb") as f:
+            f.write(b"".join(encoded))
+        np.save(os.path.join(graph_dir, "name_offsets.npy"), offsets)
+
+        for prefix, frm, to in (("fwd", src, dst), ("rev", dst, src)):
+            order = np.argsort(frm, kind="stable")
+            indptr = np.zeros(len(names) + 1, dtype=np.int64)
+            np.cumsum(np.bincount(frm, minlength=len(names)), out=indptr[1:])
+            np.save(os.path.join(graph_dir, f"{prefix}_indptr.npy"), indptr)
+            np.save(os.path.join(graph_dir, f"{prefix}_indices.npy"), to[order].astype(np.int32))
+
+        return cls(graph_dir)
+
+    def node_name(self, node: int) -> str:
+        start, end = self._name_offsets[node], self._name_offsets[node + 1]
+        return bytes(self._names[start:end]).decode("utf-8")
+
+    def node_id(self, table: str, column: str):
+        """
+        Integer id of table.column, or None if it is not in the graph.
+        """
+        key = column_key(table, column)
+        lo, hi = 0, self.num_nodes
+        while lo < hi:
+            mid = (lo + hi) // 2
+            name = self.node_name(mid)
+            if name < key:
+                lo = mid + 1
+            elif name > key:
+                hi = mid
+            else:
+                return mid
+        return None
+
+    def upstream(self, table: str, column: str, max_depth: int = None):
+        """
+        Every column that table.column is (transitively) derived from.
+        """
+        return self._closure(table, column, self._rev, max_depth)
+
+    def downstream(self, table: str, column: str, max_depth: int = None):
+        """
+        Every column (transitively) derived from table.column.
+        """
+        return self._closure(table, column, self._fwd, max_depth)
+
+    def _closure(self, table: str, column: str, adjacency, max_depth: int):
+        root = self.node_id(table, column)
+        if root is None:
+            raise KeyError(f"{table}.{column} is not in the lineage graph")
+        indptr, indices = adjacency
+
+        parents = np.full(self.num_nodes, -1, dtype=np.int32)
+        visited = np.zeros(self.num_nodes, dtype=bool)
+        visited[root] = True
+        frontier = np.array([root], dtype=np.int32)
+        reached, reached_depths = [], []
+        depth = 0
+        while len(frontier) and (max_depth is None or depth < max_depth):
+            depth += 1
+            # Gather all out-edges of the frontier in one go
+            starts = indptr[frontier]
+            lengths = indptr[frontier + 1] - starts
+            total = int(lengths.sum())
+            if total == 0:
+                break
+            offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+            neighbours = indices[offsets + np.arange(total)]
+            via = np.repeat(frontier, lengths)
+
+            fresh = ~visited[neighbours]
+            # First occurrence wins as the BFS parent
+            frontier, first = np.unique(neighbours[fresh], return_index=True)
+            frontier = frontier.astype(np.int32)
+            visited[frontier] = True
+            parents[frontier] = via[fresh][first]
+            reached.append(frontier)
+            reached_depths.append(np.full(len(frontier), depth, dtype=np.int32))
+
+        nodes = np.concatenate(reached) if reached else np.zeros(0, dtype=np.int32)
+        depths = np.concatenate(reached_depths) if reached_depths else np.zeros(0, dtype=np.int32)
+        return Closure(self, root, nodes, depths, parents)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compile and query the transitive column-lineage graph"
+    )
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    build = sub.add_parser("build", help="Compile the graph from a lineage store.")
+    build.add_argument("--db", default="lineage.db",
+                       help="SQLite lineage store written by sql_lineage.py --store.")
+    build.add_argument("--graph-dir", default="lineage_graph",
+                       help="Output directory for the compiled graph.")
+
+    for name, help_text in (("upstream", "Columns a column is derived from."),
+                            ("downstream", "Columns derived from a column.")):
+        query = sub.add_parser(name, help=help_text)
+        query.add_argument("column", metavar="TABLE.COLUMN")
+        query.add_argument("--graph-dir", default="lineage_graph",
+                           help="Directory of a graph compiled with 'build'.")
+        query.add_argument("--depth", type=int, default=None,
+                           help="Maximum number of hops (default: unlimited).")
+        query.add_argument("--paths", action="store_true",
+                           help="Print the path from the queried column to each result.")
+
+    args = parser.parse_args()
+
+    if args.command == "build":
+        start = time.perf_counter()
+        with LineageStore(args.db) as store:
+            graph = LineageGraph.build(store.iter_edges(), args.graph_dir)
+        print(f"Compiled {graph.num_nodes} columns / {graph.num_edges} edges into "
+              f"{args.graph_dir} in {time.perf_counter() - start:.2f}s")
+        return
+
+    graph = LineageGraph(args.graph_dir)
+    table, column = split_column_ref(args.column)
+    start = time.perf_counter()
+    try:
+        closure = getattr(graph, args.command)(table, column, max_depth=args.depth)
+    except KeyError as e:
+        print(f"ERROR: {e.args[0]}", file=sys.stderr)
+        sys.exit(1)
+    elapsed = time.perf_counter() - start
+
+    for record in closure.to_records(with_paths=args.paths):
+        line = f"{record['depth']:>3}  {record['column']}"
+        if args.paths:
+            line += "  via " + " -> ".join(record["path"])
+        print(line)
+    print(f"{len(closure)} columns {args.command} of {args.column} ({elapsed * 1000:.1f} ms)",
+          file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
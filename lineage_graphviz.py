@@ -0,0 +1,425 @@
+#!/usr/bin/env python3
+"""
+lineage_graphviz.py
+
+Level-of-detail graphviz rendering of column lineage, one graph per
+target table.
+
+Drawing a whole warehouse as one graphviz node per column makes dot run
+for hours or crash. Instead, every target table gets its own small graph
+of its upstream tables (up to --depth hops), in two levels of detail:
+
+  tables   one node per table, one edge per table pair labelled with the
+           number of column edges behind it; always rendered
+  columns  tables as clusters holding their column nodes, one edge per
+           column edge; only rendered when it fits the node budget, and
+           shown collapsed on the index page until opened
+
+The node budget (--max-nodes) bounds every graph handed to dot: a table
+view with more upstream tables than the budget keeps the nearest ones
+and folds the rest of each hop into a single "+N more tables" node; a
+column view over budget is skipped (the index says so).
+
+DOT source is written directly (no graphviz Python package needed) and
+each target's graphs are rendered with the dot binary in a pool of worker
+processes, with a per-graph timeout. Without dot, the .dot files are still
+written. index.html in the output directory links every target's views.
+
+Usage:
+    python lineage_graphviz.py --lineage lineage_output --output-dir lineage_graphs
+    python lineage_graphviz.py --db lineage.db --target FINAL_REPORT.SALES --depth 3 --max-nodes 200 --format png
+
+Dependencies:
+    pip install pandas
+    graphviz (the dot binary) for rendering
+"""
+
+import argparse
+import hashlib
+import html
+import multiprocessing
+import os
+import re
+import shutil
+import subprocess
+import sys
+
+from lineage_pipeline import read_lineage_output
+from lineage_store import LineageStore
+
+EDGE_COLUMNS = ["source_table", "source_column", "target_table", "target_column"]
+RENDER_FORMATS = ["svg", "png", "pdf"]
+
+# Colours of the data.json viewer (style of index.html)
+TARGET_COLOR = "#f4a460"
+TABLE_COLOR = "#add8e6"
+MORE_COLOR = "#eeeeee"
+
+
+class TargetSubgraph:
+    def __init__(self, target: str, tables: dict, column_edges: list, hidden: dict):
+        """
+        :param target:       the target table
+        :param tables:       table -> hops upstream of target (target: 0), kept tables only
+        :param column_edges: (source_table, source_column, target_table, target_column)
+                             between kept tables
+        :param hidden:       hops -> number of tables folded away at that distance
+        """
+        self.target = target
+        self.tables = tables
+        self.column_edges = column_edges
+        self.hidden = hidden
+
+    @property
+    def column_nodes(self):
+        """
+        Distinct (table, column) ends of the column edges.
+        """
+        nodes = {}
+        for source_table, source_column, target_table, target_column in self.column_edges:
+            nodes.setdefault((source_table, source_column), None)
+            nodes.setdefault((target_table, target_column), None)
+        return list(nodes)
+
+    def table_dot(self) -> str:
+        """
+        DOT source of the table-level view.
+        """
+        lines = _dot_header(self.target)
+        ids = {table: f"t{i}" for i, table in enumerate(self.tables)}
+        for table, hops in self.tables.items():
+            color = TARGET_COLOR if hops == 0 else TABLE_COLOR
+            lines.append(f"  {ids[table]} [label={_quote(table)}, fillcolor=\"{color}\"];")
+        for hops, count in sorted(self.hidden.items()):
+            lines.append(f"  more{hops} [label=\"+{count} more tables\\n({hops} hops)\", "
+                         f"fillcolor=\"{MORE_COLOR}\", style=\"rounded,filled,dashed\"];")
+            lines.append(f"  more{hops} -> {ids[self.target]} [style=dashed];")
+        counts = {}
+        for source_table, _, target_table, _ in self.column_edges:
+            key = (source_table, target_table)
+            counts[key] = counts.get(key, 0) + 1
+        for (source_table, target_table), count in counts.items():
+            lines.append(f"  {ids[source_table]} -> {ids[target_table]} "
+                         f"[label=\"{count}\", penwidth={min(1 + count / 10, 5):.1f}];")
+        lines.append("}")
+        return "\n".join(lines) + "\n"
+
+    def column_dot(self) -> str:
+        """
+        DOT source of the column-level view: one cluster per table.
+        """
+        lines = _dot_header(self.target)
+        columns = {}
+        for table, column in self.column_nodes:
+            columns.setdefault(table, []).append(column)
+        ids = {}
+        for i, table in enumerate(t for t in self.tables if t in columns):
+            color = TARGET_COLOR if self.tables[table] == 0 else TABLE_COLOR
+            lines.append(f"  subgraph cluster_{i} {{")
+            lines.append(f"    label={_quote(table)}; style=\"rounded,filled\"; fillcolor=\"{color}\";")
+            for column in sorted(columns[table], key=lambda c: (c is None, c or "")):
+                node_id = ids[(table, column)] = f"c{len(ids)}"
+                lines.append(f"    {node_id} [label={_quote(column or '*')}, fillcolor=\"white\"];")
+            lines.append("  }")
+        for source_table, source_column, target_table, target_column in self.column_edges:
+            lines.append(f"  {ids[(source_table, source_column)]} -> {ids[(target_table, target_column)]};")
+        lines.append("}")
+        return "\n".join(lines) + "\n"
+
+
+def _name(value):
+    # None for missing values (None, NaN, empty), else the text
+    if value is None or value != value or value == "":
+        return None
+    return str(value)
+
+
+def _quote(text) -> str:
+    return '"' + str(text).replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def _dot_header(title: str):
+    return [
+        "digraph lineage {",
+        f"  graph [rankdir=LR, label={_quote(title)}, labelloc=t, fontname=\"Helvetica\"];",
+        "  node [shape=box, style=\"rounded,filled\", fontname=\"Helvetica\"];",
+        "  edge [color=\"#555555\", arrowsize=0.6];",
+    ]
+
+
+def file_stem(table: str) -> str:
+    """
+    Safe, collision-free file name for a table's graphs.
+    """
+    safe = re.sub(r"[^\w.-]+", "_", table)[:80]
+    return f"{safe}_{hashlib.sha1(table.encode('utf-8')).hexdigest()[:8]}"
+
+
+class LineageGraphIndex:
+    def __init__(self, edges):
+        """
+        :param edges: iterable of (source_table, source_column, target_table,
+                      target_column); table names are compared case-insensitively
+        """
+        self.names = {}     # key -> display name
+        self.sources = {}   # target key -> {source key}
+        self.columns = {}   # target key -> [(source key, source column, target column)]
+        seen = set()
+        for edge in edges:
+            source_table, source_column, target_table, target_column = map(_name, edge)
+            if not source_table or not target_table:
+                continue
+            source, target = self._key(source_table), self._key(target_table)
+            edge = (source, source_column, target, target_column)
+            if edge in seen:
+                continue
+            seen.add(edge)
+            self.sources.setdefault(target, set()).add(source)
+            self.columns.setdefault(target, []).append((source, source_column, target_column))
+
+    def _key(self, table: str) -> str:
+        key = table.lower()
+        self.names.setdefault(key, table)
+        return key
+
+    def targets(self):
+        """
+        Every table that is written to, by name.
+        """
+        return sorted((self.names[k] for k in self.sources), key=str.lower)
+
+    def subgraph(self, target: str, depth: int = 2, max_nodes: int = 300) -> TargetSubgraph:
+        """
+        The tables up to depth hops upstream of target, nearest first, at
+        most max_nodes of them (the rest are counted per hop).
+        """
+        root = target.lower()
+        if root not in self.names:
+            raise KeyError(target)
+        hops = {root: 0}
+        order = [root]
+        frontier = [root]
+        for distance in range(1, depth + 1):
+            reached = sorted({s for t in frontier for s in self.sources.get(t, ()) if s not in hops})
+            for key in reached:
+                hops[key] = distance
+            order.extend(reached)
+            frontier = reached
+        # Room for the "+N more" nodes of every hop
+        kept = order[:max(1, max_nodes - depth)] if len(order) > max_nodes else order
+        kept_set = set(kept)
+        hidden = {}
+        for key in order[len(kept):]:
+            hidden[hops[key]] = hidden.get(hops[key], 0) + 1
+
+        column_edges = []
+        for target_key in kept:
+            for source, source_column, target_column in self.columns.get(target_key, ()):
+                if source in kept_set:
+                    column_edges.append((self.names[source], source_column,
+                                         self.names[target_key], target_column))
+        tables = {self.names[k]: hops[k] for k in kept}
+        return TargetSubgraph(self.names[root], tables, column_edges, hidden)
+
+
+def _render(dot_binary: str, source: str, dot_path: str, fmt: str, timeout: float):
+    """
+    Write source to dot_path and render it next to it. Returns (output
+    path or None, error or None).
+    """
+    with open(dot_path, "w", encoding="utf-8") as f:
+        f.write(source)
+    if not dot_binary:
+        return None, None
+    output = os.path.splitext(dot_path)[0] + "." + fmt
+    try:
+        subprocess.run([dot_binary, f"-T{fmt}", "-o", output, dot_path],
+                       check=True, capture_output=True, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        return None, f"dot timed out after {timeout:g}s"
+    except subprocess.CalledProcessError as e:
+        message = e.stderr.decode(errors="replace").strip().splitlines()
+        return None, f"dot failed: {message[0] if message else e.returncode}"
+    return output, None
+
+
+def render_subgraph(task):
+    """
+    Worker: write and render both views of one target. Returns the index
+    entry of the target.
+    """
+    subgraph, output_dir, fmt, dot_binary, timeout, max_nodes = task
+    stem = file_stem(subgraph.target)
+    column_nodes = len(subgraph.column_nodes)
+    entry = {
+        "target": subgraph.target,
+        "tables": len(subgraph.tables),
+        "hidden": sum(subgraph.hidden.values()),
+        "column_nodes": column_nodes,
+        "column_edges": len(subgraph.column_edges),
+        "views": {},
+        "errors": [],
+    }
+    views = [("tables", subgraph.table_dot)]
+    if column_nodes <= max_nodes:
+        views.append(("columns", subgraph.column_dot))
+    for view, make_source in views:
+        dot_path = os.path.join(output_dir, f"{stem}.{view}.dot")
+        output, error = _render(dot_binary, make_source(), dot_path, fmt, timeout)
+        entry["views"][view] = os.path.basename(output or dot_path)
+        if error:
+            entry["errors"].append(f"{view}: {error}")
+    return entry
+
+
+def render_targets(index: LineageGraphIndex, targets, output_dir: str, depth: int = 2,
+                   max_nodes: int = 300, fmt: str = "svg", workers: int = None,
+                   dot_binary: str = None, timeout: float = 60.0):
+    """
+    Render every target's views in worker processes and write index.html.
+    Returns the index entries, by target name.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    tasks = (
+        (index.subgraph(target, depth, max_nodes), output_dir, fmt, dot_binary, timeout, max_nodes)
+        for target in targets
+    )
+    entries = []
+    with multiprocessing.Pool(processes=workers) as pool:
+        for entry in pool.imap_unordered(render_subgraph, tasks, chunksize=4):
+            for error in entry["errors"]:
+                print(f"ERROR rendering {entry['target']}: {error}", file=sys.stderr)
+            entries.append(entry)
+    entries.sort(key=lambda e: e["target"].lower())
+    write_index(entries, os.path.join(output_dir, "index.html"), depth, max_nodes)
+    return entries
+
+
+def _view_html(name: str) -> str:
+    link = html.escape(name, quote=True)
+    if name.endswith((".svg", ".png")):
+        return f'<a href="{link}"><img loading="lazy" src="{link}" alt="{link}"></a>'
+    return f'<a href="{link}">{html.escape(name)}</a>'
+
+
+def write_index(entries, path: str, depth: int, max_nodes: int):
+    """
+    index.html: one row per target with its table view and collapsible
+    column view.
+    """
+    rows = []
+    for entry in entries:
+        views = entry["views"]
+        if "columns" in views:
+            columns = (f'<details><summary>{entry["column_nodes"]} columns, '
+                       f'{entry["column_edges"]} edges</summary>{_view_html(views["columns"])}</details>')
+        else:
+            columns = f'{entry["column_nodes"]} columns: over the {max_nodes}-node budget'
+        hidden = f' (+{entry["hidden"]} not shown)' if entry["hidden"] else ""
+        errors = "".join(f'<div class="error">{html.escape(e)}</div>' for e in entry["errors"])
+        rows.append(
+            f'<tr><td class="target">{html.escape(entry["target"])}</td>'
+            f'<td>{entry["tables"] - 1}{hidden}</td>'
+            f'<td><details open><summary>tables</summary>{_view_html(views["tables"])}</details></td>'
+            f'<td>{columns}{errors}</td></tr>'
+        )
+    page = f"""<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="UTF-8">
+<title>Lineage by target table</title>
+<style>
+    body {{ font-family: Arial, sans-serif; margin: 20px; }}
+    table {{ border-collapse: collapse; width: 100%; }}
+    th {{ background-color: {TARGET_COLOR}; color: #fff; text-align: left; }}
+    th, td {{ border: 1px solid #ccc; padding: 6px; vertical-align: top; }}
+    td.target {{ font-weight: bold; }}
+    img {{ max-width: 100%; }}
+    .error {{ color: #b00; }}
+</style>
+</head>
+<body>
+<h1>Lineage by target table</h1>
+<p>{len(entries)} target tables; upstream tables up to {depth} hops; at most {max_nodes} nodes per graph.</p>
+<input id="filter" placeholder="Filter tables" oninput="filterRows(this.value)">
+<table>
+<thead><tr><th>Target table</th><th>Upstream tables</th><th>Table view</th><th>Column view</th></tr></thead>
+<tbody id="rows">
+{chr(10).join(rows)}
+</tbody>
+</table>
+<script>
+function filterRows(text) {{
+    const needle = text.toLowerCase();
+    document.querySelectorAll('#rows tr').forEach(row => {{
+        row.style.display = row.cells[0].innerText.toLowerCase().includes(needle) ? '' : 'none';
+    }});
+}}
+</script>
+</body>
+</html>
+"""
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(page)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Render lineage as per-target-table graphviz graphs with an index page"
+    )
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--db", default="lineage.db",
+                        help="SQLite lineage store written by sql_lineage.py --store (default).")
+    source.add_argument("--lineage", default=None,
+                        help="Lineage output (.xlsx, Parquet, CSV.gz, JSONL or a directory).")
+    parser.add_argument("--output-dir", default="lineage_graphs",
+                        help="Directory for the graphs and index.html (default: lineage_graphs).")
+    parser.add_argument("--target", action="append", default=None,
+                        help="Target table to render (repeatable; default: every written table).")
+    parser.add_argument("--depth", type=int, default=2,
+                        help="Upstream hops shown per target (default: 2).")
+    parser.add_argument("--max-nodes", type=int, default=300,
+                        help="Node budget per graph (default: 300).")
+    parser.add_argument("--format", choices=RENDER_FORMATS, default="svg",
+                        help="Rendered image format (default: svg).")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Worker processes rendering graphs (default: CPU count).")
+    parser.add_argument("--dot", default="dot",
+                        help="graphviz dot binary (default: dot on the PATH).")
+    parser.add_argument("--dot-timeout", type=float, default=60.0,
+                        help="Seconds allowed per dot run (default: 60).")
+    args = parser.parse_args()
+
+    try:
+        if args.lineage:
+            df = read_lineage_output(args.lineage, EDGE_COLUMNS)
+            edges = df[EDGE_COLUMNS].itertuples(index=False, name=None)
+            index = LineageGraphIndex(edges)
+        else:
+            if not os.path.exists(args.db):
+                raise ValueError(f"{args.db} does not exist")
+            with LineageStore(args.db) as store:
+                index = LineageGraphIndex(store.iter_edges())
+    except (OSError, ValueError, KeyError) as e:
+        print(f"ERROR reading lineage: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    targets = args.target or index.targets()
+    unknown = [t for t in targets if t.lower() not in index.names]
+    if unknown:
+        print(f"ERROR: unknown target table(s): {', '.join(unknown)}", file=sys.stderr)
+        sys.exit(1)
+
+    dot_binary = shutil.which(args.dot)
+    if dot_binary is None:
+        print(f"WARNING: {args.dot} not found; writing .dot files only", file=sys.stderr)
+
+    entries = render_targets(index, targets, args.output_dir, args.depth, args.max_nodes,
+                             args.format, args.workers, dot_binary, args.dot_timeout)
+    failed = sum(1 for e in entries if e["errors"])
+    print(f"{len(entries)} target tables rendered to {args.output_dir} ({failed} with errors); "
+          f"open {os.path.join(args.output_dir, 'index.html')}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,386 @@
+#!/usr/bin/env python3
+"""
+lineage_pipeline.py
+
+Stitch per-file lineage into a pipeline of scripts.
+
+Every script reads its lineage source tables and writes its target
+tables. A script that reads a table another script writes runs after it,
+which gives a dependency graph between scripts:
+
+  order           scripts grouped into waves: every script of a wave only
+                  depends on earlier waves, so a wave can run in parallel
+  cycles          groups of scripts that (transitively) feed each other;
+                  each group is scheduled as a unit and reported together
+                  with the tables that close the loop
+  critical path   the longest chain of dependent scripts, weighted by
+                  script durations (--durations) or one per script; it
+                  bounds the wall time of a fully parallel schedule
+
+Edges come from the lineage_store.py SQLite store (sql_lineage.py --store)
+or from a batch lineage output with a source_file column. Table names are
+compared case-insensitively. A table written by several scripts makes
+every one of them upstream of its readers. The default target of a script
+without an INSERT (its file name, flagged by target_is_default) is not a
+table it writes.
+
+Usage:
+    python lineage_pipeline.py --db lineage.db
+    python lineage_pipeline.py --lineage lineage_output --durations runtimes.csv --format xlsx --output pipeline.xlsx
+
+Dependencies:
+    pip install pandas
+"""
+
+import argparse
+import glob
+import os
+import re
+import sys
+
+import pandas as pd
+
+from lineage_store import LineageStore
+from lineage_writers import WRITERS, open_writer
+
+ORDER_COLUMNS = ["wave", "path", "cycle", "cost", "earliest_start", "earliest_finish"]
+DEPENDENCY_COLUMNS = ["upstream_path", "downstream_path", "tables"]
+CYCLE_COLUMNS = ["cycle", "path", "tables"]
+CRITICAL_PATH_COLUMNS = ["step", "path", "cost", "finish", "via_tables"]
+
+# Lineage sheet of a workbook and its overflow sheets (see XlsxStreamWriter)
+_LINEAGE_SHEET_RE = re.compile(r"Lineage(?:_(\d+))?")
+
+
+class ScriptPipeline:
+    def __init__(self, file_tables, durations: dict = None):
+        """
+        :param file_tables: iterable of (path, source_table, target_table);
+                            either table may be empty
+        :param durations:   optional path -> cost (e.g. seconds); scripts
+                            without one cost 1
+        """
+        self.reads = {}    # path -> {table}
+        self.writes = {}   # path -> {table}
+        for path, source, target in file_tables:
+            self.reads.setdefault(path, set())
+            self.writes.setdefault(path, set())
+            if source:
+                self.reads[path].add(source.lower())
+            if target:
+                self.writes[path].add(target.lower())
+        self.paths = sorted(self.reads)
+        self.durations = durations or {}
+
+        writers = {}
+        for path in self.paths:
+            for table in self.writes[path]:
+                writers.setdefault(table, []).append(path)
+
+        # upstream path -> downstream path -> {tables}
+        self.edges = {path: {} for path in self.paths}
+        for path in self.paths:
+            for table in self.reads[path]:
+                for writer in writers.get(table, ()):
+                    if writer != path:
+                        self.edges[writer].setdefault(path, set()).add(table)
+
+        self.components = self._strongly_connected()
+        self.component_of = {path: cid for cid, members in enumerate(self.components)
+                             for path in members}
+
+    @classmethod
+    def from_store(cls, store: LineageStore, durations: dict = None):
+        return cls(store.iter_file_tables(), durations)
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, durations: dict = None):
+        """
+        From batch lineage rows: source_file (or path), source_table and
+        target_table columns; rows flagged target_is_default only read.
+        """
+        path_column = "source_file" if "source_file" in df.columns else "path"
+        triples = df[[path_column, "source_table", "target_table"]]
+        if "target_is_default" in df.columns:
+            default = pd.to_numeric(df["target_is_default"], errors="coerce").fillna(0).astype(bool)
+            triples = triples.assign(target_table=df["target_table"].where(~default, None))
+        triples = triples.drop_duplicates()
+        triples = triples.astype(object).where(triples.notna(), None)
+        return cls(triples.itertuples(index=False, name=None), durations)
+
+    def cost(self, path: str) -> float:
+        return float(self.durations.get(path, 1.0))
+
+    def _strongly_connected(self):
+        """
+        Tarjan's algorithm, iterative (pipelines can be deeper than the
+        recursion limit). Components come out in reverse topological order.
+        """
+        index = {}
+        low = {}
+        on_stack = set()
+        stack = []
+        components = []
+        counter = 0
+        for root in self.paths:
+            if root in index:
+                continue
+            work = [(root, iter(sorted(self.edges[root])))]
+            index[root] = low[root] = counter
+            counter += 1
+            stack.append(root)
+            on_stack.add(root)
+            while work:
+                node, children = work[-1]
+                advanced = False
+                for child in children:
+                    if child not in index:
+                        index[child] = low[child] = counter
+                        counter += 1
+                        stack.append(child)
+                        on_stack.add(child)
+                        work.append((child, iter(sorted(self.edges[child]))))
+                        advanced = True
+                        break
+                    if child in on_stack:
+                        low[node] = min(low[node], index[child])
+                if advanced:
+                    continue
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    low[parent] = min(low[parent], low[node])
+                if low[node] == index[node]:
+                    members = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        members.append(member)
+                        if member == node:
+                            break
+                    components.append(sorted(members))
+        return components[::-1]
+
+    def cycles(self):
+        """
+        Components of more than one script: lists of (path, tables it feeds
+        to other members of the same cycle).
+        """
+        result = []
+        for members in self.components:
+            if len(members) < 2:
+                continue
+            member_set = set(members)
+            result.append([
+                (path, sorted({t for d, tables in self.edges[path].items() if d in member_set
+                               for t in tables}))
+                for path in members
+            ])
+        return result
+
+    def _component_edges(self):
+        edges = {cid: set() for cid in range(len(self.components))}
+        for path, downstream in self.edges.items():
+            for d in downstream:
+                a, b = self.component_of[path], self.component_of[d]
+                if a != b:
+                    edges[a].add(b)
+        return edges
+
+    def schedule(self):
+        """
+        Waves and earliest start / finish times of every component, plus
+        the critical path.
+
+        Returns (waves, start, finish, critical): waves is a list of
+        component id lists, start/finish map component id -> time, and
+        critical is the list of component ids on the longest chain.
+        """
+        edges = self._component_edges()
+        indegree = {cid: 0 for cid in edges}
+        for targets in edges.values():
+            for b in targets:
+                indegree[b] += 1
+
+        start = {cid: 0.0 for cid in edges}
+        finish = {}
+        via = {}
+        waves = []
+        by_path = self.components.__getitem__
+        ready = sorted((cid for cid, n in indegree.items() if n == 0), key=by_path)
+        while ready:
+            waves.append(ready)
+            following = []
+            for a in ready:
+                finish[a] = start[a] + sum(self.cost(p) for p in self.components[a])
+                for b in edges[a]:
+                    if b not in via or finish[a] > start[b]:
+                        start[b] = finish[a]
+                        via[b] = a
+                    indegree[b] -= 1
+                    if indegree[b] == 0:
+                        following.append(b)
+            ready = sorted(following, key=by_path)
+
+        critical = []
+        if finish:
+            node = max(finish, key=lambda cid: (finish[cid], -cid))
+            while node is not None:
+                critical.append(node)
+                node = via.get(node)
+        return waves, start, finish, critical[::-1]
+
+    def write(self, writer):
+        """
+        Write Order, Dependencies, Cycles and CriticalPath sheets to a
+        lineage_writers writer.
+        """
+        waves, start, finish, critical = self.schedule()
+        cycle_ids = {}
+        for members in self.components:
+            if len(members) > 1:
+                cycle_ids[self.component_of[members[0]]] = len(cycle_ids) + 1
+
+        writer.write("Order", pd.DataFrame([
+            [wave_no, path, cycle_ids.get(cid), self.cost(path), start[cid], finish[cid]]
+            for wave_no, wave in enumerate(waves, 1)
+            for cid in wave
+            for path in self.components[cid]
+        ], columns=ORDER_COLUMNS))
+
+        writer.write("Dependencies", pd.DataFrame([
+            [path, downstream, ", ".join(sorted(tables))]
+            for path in self.paths
+            for downstream, tables in sorted(self.edges[path].items())
+        ], columns=DEPENDENCY_COLUMNS))
+
+        writer.write("Cycles", pd.DataFrame([
+            [cycle_no, path, ", ".join(tables)]
+            for cycle_no, members in enumerate(self.cycles(), 1)
+            for path, tables in members
+        ], columns=CYCLE_COLUMNS))
+
+        rows = []
+        previous = None
+        for cid in critical:
+            for path in self.components[cid]:
+                tables = ""
+                if previous is not None:
+                    tables = ", ".join(sorted({t for p in self.components[previous]
+                                               for d, ts in self.edges[p].items() if d == path
+                                               for t in ts}))
+                rows.append([len(rows) + 1, path, self.cost(path), finish[cid], tables])
+            previous = cid
+        writer.write("CriticalPath", pd.DataFrame(rows, columns=CRITICAL_PATH_COLUMNS))
+
+    def format_summary(self) -> str:
+        waves, _, finish, critical = self.schedule()
+        lines = [f"{len(self.paths)} scripts, "
+                 f"{sum(len(d) for d in self.edges.values())} dependencies, "
+                 f"{len(waves)} waves"]
+        for wave_no, wave in enumerate(waves, 1):
+            lines.append(f"Wave {wave_no}:")
+            for cid in wave:
+                members = self.components[cid]
+                suffix = "  (cycle)" if len(members) > 1 else ""
+                lines.extend(f"  {path}{suffix}" for path in members)
+        for cycle_no, members in enumerate(self.cycles(), 1):
+            lines.append(f"Cycle {cycle_no}:")
+            lines.extend(f"  {path} -> {', '.join(tables)}" for path, tables in members)
+        if critical:
+            lines.append(f"Critical path ({finish[critical[-1]]:g}):")
+            lines.extend(f"  {path}" for cid in critical for path in self.components[cid])
+        return "\n".join(lines)
+
+
+def read_lineage_output(path: str, columns=("source_file", "source_table", "target_table"),
+                        optional=("target_is_default",)) -> pd.DataFrame:
+    """
+    Lineage rows from a batch output: an .xlsx workbook (Lineage sheet and
+    its Lineage_2, Lineage_3, ... overflow sheets), a Parquet / CSV.gz /
+    JSONL file, or a directory of those.
+
+    :param columns:  the columns to read
+    :param optional: more columns to read when the output has them (older
+                     outputs have no target_is_default)
+    """
+    wanted = set(columns) | set(optional)
+    if os.path.isdir(path):
+        files = sorted(glob.glob(os.path.join(path, "lineage*")))
+        if not files:
+            raise ValueError(f"No lineage files in {path}")
+        return pd.concat([read_lineage_output(f, columns, optional) for f in files], ignore_index=True)
+    lower = path.lower()
+    if lower.endswith(".xlsx"):
+        with pd.ExcelFile(path) as workbook:
+            sheets = sorted((int(m.group(1) or 1), name) for name in workbook.sheet_names
+                            for m in [_LINEAGE_SHEET_RE.fullmatch(name)] if m)
+            if not sheets:
+                raise ValueError(f"No Lineage sheet in {path}")
+            df = pd.concat([workbook.parse(name, usecols=lambda c: c in wanted) for _, name in sheets],
+                           ignore_index=True)
+    elif lower.endswith(".parquet"):
+        import pyarrow.parquet as pq
+        df = pd.read_parquet(path, columns=[c for c in pq.read_schema(path).names if c in wanted])
+    elif lower.endswith((".jsonl", ".jsonl.gz")):
+        df = pd.read_json(path, lines=True)
+        df = df[[c for c in df.columns if c in wanted]]
+    else:
+        df = pd.read_csv(path, usecols=lambda c: c in wanted)
+    missing = [c for c in columns if c not in df.columns]
+    if missing and len(df.columns):
+        raise ValueError(f"{path} has no {', '.join(missing)} column")
+    return df
+
+
+def read_durations(path: str) -> dict:
+    """
+    path -> cost from a CSV with path (or source_file) and seconds (or
+    cost) columns.
+    """
+    df = pd.read_csv(path)
+    path_column = "path" if "path" in df.columns else "source_file"
+    cost_column = "seconds" if "seconds" in df.columns else "cost"
+    return dict(zip(df[path_column], df[cost_column].astype(float)))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Order lineage-linked scripts, detect cycles and find the critical path"
+    )
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--db", default="lineage.db",
+                        help="SQLite lineage store written by sql_lineage.py --store (default).")
+    source.add_argument("--lineage", default=None,
+                        help="Batch lineage output (.xlsx, Parquet, CSV.gz, JSONL or a directory).")
+    parser.add_argument("--durations", default=None,
+                        help="CSV of path,seconds used as script costs (default: 1 per script).")
+    parser.add_argument("--format", choices=list(WRITERS), default=None,
+                        help="Also write Order / Dependencies / Cycles / CriticalPath sheets.")
+    parser.add_argument("--output", default=None,
+                        help="Output path (default: pipeline.xlsx / pipeline_output).")
+    args = parser.parse_args()
+
+    try:
+        durations = read_durations(args.durations) if args.durations else None
+        if args.lineage:
+            pipeline = ScriptPipeline.from_frame(read_lineage_output(args.lineage), durations)
+        else:
+            if not os.path.exists(args.db):
+                raise ValueError(f"{args.db} does not exist")
+            with LineageStore(args.db) as store:
+                pipeline = ScriptPipeline.from_store(store, durations)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"ERROR reading lineage: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    print(pipeline.format_summary())
+    if args.format:
+        output = args.output or ("pipeline.xlsx" if args.format == "xlsx" else "pipeline_output")
+        with open_writer(args.format, output) as writer:
+            pipeline.write(writer)
+        print(f"Pipeline written to {output}")
+
+
+if __name__ == "__main__":
+    main()
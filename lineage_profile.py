@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+lineage_profile.py
+
+Per-phase and per-statement metrics for sql_lineage.py --profile.
+
+Phases are timed with perf_counter and, when memory tracing is on,
+charged with the net bytes allocated (tracemalloc) while they ran:
+
+  split       statement splitting (sql_statements.iter_statements)
+  cache       cache key hashing, lookups and stores
+  parse       sqlglot parse_one
+  visit       the single AST traversal (incl. WITH/CTE registration)
+  cte         column resolution through CTE / derived table bodies
+  resolve     projection walk: column resolution and SQL rendering
+  dataframes  DataFrame construction
+  write       output writers (and the lineage store)
+
+Nested phases are charged to the innermost one only, so phase times add
+up to the profiled total. Every statement's wall time, peak memory and
+size are recorded, but only the top-N slowest are kept. Profiles from
+batch workers are merged into the parent's with merge(); their phase
+times are then summed over all workers and can exceed the run's wall time.
+
+Dependencies:
+    (standard library only)
+"""
+
+import heapq
+import json
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+
+
+class NullProfiler:
+    """
+    Profiler stand-in used when profiling is off: every hook is a no-op.
+    """
+    enabled = False
+    _null = nullcontext()
+
+    def phase(self, name: str):
+        return self._null
+
+    def statement(self, **info):
+        return self._null
+
+
+class LineageProfiler:
+    enabled = True
+
+    def __init__(self, top_n: int = 20, trace_memory: bool = True):
+        """
+        :param top_n:        how many of the slowest statements to keep
+        :param trace_memory: record allocations with tracemalloc (slower)
+        """
+        self.top_n = top_n
+        self.trace_memory = trace_memory
+        self.phases = {}      # name -> [calls, wall_s, alloc_bytes]
+        self.statements = 0
+        self.statement_bytes = 0
+        self._slowest = []    # min-heap of (wall_s, seq, record)
+        self._seq = 0
+        self._stack = []      # [name, start, mem_start, child_wall, child_alloc]
+        self._started = None
+        self._wall = 0.0
+
+    def start(self):
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        self._started = time.perf_counter()
+        return self
+
+    def stop(self):
+        if self._started is not None:
+            self._wall += time.perf_counter() - self._started
+            self._started = None
+        if self.trace_memory and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    def _memory(self):
+        return tracemalloc.get_traced_memory()[0] if self.trace_memory else 0
+
+    @contextmanager
+    def phase(self, name: str):
+        if self._stack and self._stack[-1][0] == name:
+            # Re-entered (e.g. recursive CTE resolution): charge the outer entry
+            yield
+            return
+        frame = [name, time.perf_counter(), self._memory(), 0.0, 0]
+        self._stack.append(frame)
+        try:
+            yield
+        finally:
+            self._stack.pop()
+            wall = time.perf_counter() - frame[1]
+            alloc = self._memory() - frame[2]
+            stats = self.phases.setdefault(name, [0, 0.0, 0])
+            stats[0] += 1
+            stats[1] += wall - frame[3]
+            stats[2] += alloc - frame[4]
+            if self._stack:
+                self._stack[-1][3] += wall
+                self._stack[-1][4] += alloc
+
+    @contextmanager
+    def statement(self, **info):
+        """
+        Time one statement. info is stored with it; pass sql= to have its
+        size recorded (the text itself is not kept).
+        """
+        sql = info.pop("sql", "")
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+        mem_start = self._memory()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - start
+            peak = (tracemalloc.get_traced_memory()[1] - mem_start) if self.trace_memory else None
+            size = len(sql.encode("utf-8"))
+            self.statements += 1
+            self.statement_bytes += size
+            record = dict(info, wall_s=round(wall, 6), bytes=size,
+                          lines=sql.count("\n") + 1, peak_bytes=peak)
+            self._keep(wall, record)
+
+    def _keep(self, wall: float, record: dict):
+        self._seq += 1
+        item = (wall, self._seq, record)
+        if len(self._slowest) < self.top_n:
+            heapq.heappush(self._slowest, item)
+        elif wall > self._slowest[0][0]:
+            heapq.heapreplace(self._slowest, item)
+
+    def snapshot(self) -> dict:
+        """
+        Picklable metrics, e.g. to send from a batch worker to the parent.
+        """
+        return {
+            "phases": {k: list(v) for k, v in self.phases.items()},
+            "statements": self.statements,
+            "statement_bytes": self.statement_bytes,
+            "slowest": [record for _, _, record in self._slowest],
+        }
+
+    def reset(self):
+        self.phases = {}
+        self.statements = 0
+        self.statement_bytes = 0
+        self._slowest = []
+
+    def merge(self, snapshot: dict, **info):
+        """
+        Add a snapshot() from elsewhere; info (e.g. source_file=path) is
+        added to its statement records.
+        """
+        for name, (calls, wall, alloc) in snapshot["phases"].items():
+            stats = self.phases.setdefault(name, [0, 0.0, 0])
+            stats[0] += calls
+            stats[1] += wall
+            stats[2] += alloc
+        self.statements += snapshot["statements"]
+        self.statement_bytes += snapshot["statement_bytes"]
+        for record in snapshot["slowest"]:
+            self._keep(record["wall_s"], dict(info, **record))
+
+    def report(self) -> dict:
+        wall = self._wall
+        if self._started is not None:
+            wall += time.perf_counter() - self._started
+        phases = {
+            name: {"calls": calls, "wall_s": round(w, 6), "alloc_bytes": alloc}
+            for name, (calls, w, alloc) in sorted(self.phases.items(), key=lambda kv: -kv[1][1])
+        }
+        return {
+            "wall_s": round(wall, 6),
+            "statements": self.statements,
+            "statement_bytes": self.statement_bytes,
+            "memory_traced": self.trace_memory,
+            "phases": phases,
+            "slowest_statements": [r for _, _, r in sorted(self._slowest, key=lambda i: -i[0])],
+        }
+
+    def write_json(self, path: str):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.report(), f, indent=2)
+
+    def format_summary(self) -> str:
+        """
+        Human-readable phase table plus the slowest statements.
+        """
+        report = self.report()
+        lines = [f"Profiled {report['statements']} statements "
+                 f"({report['statement_bytes']} bytes) in {report['wall_s']:.2f}s",
+                 f"{'phase':<12}{'calls':>10}{'wall_s':>12}{'alloc_MB':>12}"]
+        for name, p in report["phases"].items():
+            lines.append(f"{name:<12}{p['calls']:>10}{p['wall_s']:>12.3f}"
+                         f"{p['alloc_bytes'] / 1e6:>12.1f}")
+        lines.append(f"Top {len(report['slowest_statements'])} slowest statements:")
+        for r in report["slowest_statements"]:
+            where = f"{r.get('source_file', '')}#{r.get('statement_no')} (line {r.get('statement_line')})"
+            lines.append(f"  {r['wall_s']:>9.3f}s  {r['bytes']:>9} bytes  {r['lines']:>6} lines  {where}")
+        return "\n".join(lines)
@@ -0,0 +1,430 @@
+#!/usr/bin/env python3
+"""
+lineage_server.py
+
+Lazy, paginated lineage API for the data.json / script2.js viewer.
+
+Serves table lineage from the lineage_store.py SQLite store in the same
+JSON shape as data.json:
+
+    {"nodes": [{"id": ..., "title": ..., "columns": [...], "expanded": ...}],
+     "links": [{"source": {"node": ..., "column": ...},
+                "target": {"node": ..., "column": ...}}]}
+
+but only one neighborhood at a time, so a graph of tens of thousands of
+tables never has to be loaded (or rendered) whole:
+
+  GET /data.json?root=T&direction=both&depth=1&page=0&size=50
+  GET /api/neighborhood/T?...      tables within depth hops of T (upstream,
+                                   downstream or both), breadth-first and
+                                   by name, one page at a time; links
+                                   connect the page's tables to T, to each
+                                   other and to the tables of earlier
+                                   pages (which the viewer already has)
+  GET /api/node/T?page=0&size=200  one table with a page of its columns
+  GET /api/tables?q=sales&page=0   a page of table names matching q
+  GET /data.json                   the first page of tables, collapsed
+
+Node ids are lower-cased table names (the store compares names
+case-insensitively); a node's columns are the ones its links on that
+page use, with "*" standing for a table-level edge (no column) in every
+endpoint. Neighborhood nodes come back collapsed with "lazy": true: the
+viewer fetches their own neighborhood when they are expanded. Paged
+responses carry "page", "size", "total" and "next_page" (null on the
+last page).
+
+Responses are cached server-side (LRU, keyed by the store version, so a
+store kept current by lineage_watch.py invalidates them on its next
+write), sent with an ETag (If-None-Match answers 304) and gzip-compressed
+when the client accepts it. Anything else is served as a static file
+from --static-dir, so the viewer itself can be opened from the server.
+
+Usage:
+    python lineage_server.py --db lineage.db --port 8000
+    (then open http://localhost:8000/index.html?root=FINAL_REPORT.SALES)
+
+Dependencies:
+    (standard library only)
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import sys
+import threading
+import traceback
+from collections import OrderedDict
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from lineage_store import LineageStore
+
+DIRECTIONS = ("upstream", "downstream")
+MAX_DEPTH = 5
+MAX_PAGE_SIZE = 1000
+# Name used for a table-level edge with no column
+TABLE_COLUMN = "*"
+
+
+class LRUCache:
+    def __init__(self, max_entries: int = 1024):
+        """
+        :param max_entries: entries kept before the least recently used go
+        """
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+
+class LineageGraphAPI:
+    def __init__(self, db_path: str, cache_size: int = 1024):
+        """
+        :param db_path:    SQLite lineage store written by sql_lineage.py --store
+        :param cache_size: cached responses (and neighborhood orders)
+        """
+        self.db_path = db_path
+        self.cache = LRUCache(cache_size)
+        self._tables = (None, {}, [])   # (version, key -> name, sorted keys)
+        self._tables_lock = threading.Lock()
+        # One connection for the server's lifetime, used by one request at a time
+        self.store = LineageStore(db_path, check_same_thread=False)
+        self.store_lock = threading.Lock()
+
+    def close(self):
+        self.store.close()
+
+    def tables_index(self, store: LineageStore, version):
+        """
+        (key -> table name, sorted keys) of the store at version, rebuilt
+        only when the store has changed.
+        """
+        with self._tables_lock:
+            if self._tables[0] != version:
+                names = {}
+                for name in store.tables():
+                    names.setdefault(name.lower(), name)
+                self._tables = (version, names, sorted(names))
+            return self._tables[1], self._tables[2]
+
+    def tables(self, store: LineageStore, version, q: str = "", page: int = 0, size: int = 50):
+        """
+        A page of collapsed table nodes whose name contains q.
+        """
+        names, keys = self.tables_index(store, version)
+        q = q.lower()
+        matches = [k for k in keys if q in k] if q else keys
+        nodes = [_node(k, names[k], [], lazy=True) for k in _page(matches, page, size)]
+        return _paged({"nodes": nodes, "links": []}, len(matches), page, size)
+
+    def node(self, store: LineageStore, version, table: str, page: int = 0, size: int = 200):
+        """
+        One expanded table node with a page of its columns.
+        """
+        key, name = self._lookup(store, version, table)
+        columns = _dedupe(column or TABLE_COLUMN for column in store.table_columns(name))
+        node = _node(key, name, _page(columns, page, size), expanded=True)
+        return _paged(node, len(columns), page, size)
+
+    def neighborhood(self, store: LineageStore, version, table: str, direction: str = "both",
+                     depth: int = 1, page: int = 0, size: int = 50):
+        """
+        A page of the tables within depth hops of table, in data.json shape.
+        The root node is on every page; links join the page's tables to
+        the root, to each other and to tables of earlier pages, which are
+        repeated (with just the columns these links use) after the page's
+        own nodes.
+        """
+        names, _ = self.tables_index(store, version)
+        root, name = self._lookup(store, version, table)
+        order = self._order(store, version, root, direction, depth)
+        start = page * size
+        page_keys = [k for k, _ in order[start:start + size]]
+        known = {root}.union(k for k, _ in order[:start])
+        on_page = set(page_keys)
+
+        columns = {k: {} for k in [root] + page_keys}
+        links = []
+        seen = set()
+        page_names = [names[k] for k in page_keys]
+        for side in DIRECTIONS:
+            for source, source_column, target, target_column in store.table_edges(page_names, side):
+                if source is None or target is None:
+                    continue
+                s, t = source.lower(), target.lower()
+                # Edges between two page tables come up on both sides: keep the downstream one
+                other = t if side == "downstream" else s
+                if other not in known and (side == "upstream" or other not in on_page):
+                    continue
+                source_column = _canonical(columns.setdefault(s, {}), source_column)
+                target_column = _canonical(columns.setdefault(t, {}), target_column)
+                link = (s, source_column, t, target_column)
+                if link in seen:
+                    continue
+                seen.add(link)
+                links.append({"source": {"node": s, "column": source_column},
+                              "target": {"node": t, "column": target_column}})
+
+        depths = dict(order)
+        nodes = [_node(root, name, sorted(columns.pop(root).values()), expanded=True, depth=0)]
+        # Page tables first, then earlier-page tables for the columns these links add to them
+        for k in page_keys + sorted(set(columns) - on_page):
+            nodes.append(_node(k, names[k], sorted(columns[k].values()), lazy=True, depth=depths[k]))
+        result = {"root": root, "direction": direction, "depth": depth, "nodes": nodes, "links": links}
+        return _paged(result, len(order), page, size)
+
+    def _lookup(self, store, version, table: str):
+        names, _ = self.tables_index(store, version)
+        key = table.lower()
+        if key not in names:
+            raise KeyError(f"unknown table {table!r}")
+        return key, names[key]
+
+    def _order(self, store, version, root: str, direction: str, depth: int):
+        """
+        [(key, hops)] of every table within depth hops of root,
+        breadth-first and by name within a hop; cached per store version.
+        """
+        cache_key = ("order", version, root, direction, depth)
+        order = self.cache.get(cache_key)
+        if order is not None:
+            return order
+        names, _ = self.tables_index(store, version)
+        sides = DIRECTIONS if direction == "both" else (direction,)
+        seen = {root}
+        order = []
+        frontier = [root]
+        for hops in range(1, depth + 1):
+            reached = set()
+            frontier_names = [names[k] for k in frontier]
+            for side in sides:
+                for source, target in store.table_links(frontier_names, side):
+                    other = target if side == "downstream" else source
+                    if other is None:
+                        continue
+                    key = other.lower()
+                    if key not in seen:
+                        seen.add(key)
+                        reached.add(key)
+            if not reached:
+                break
+            frontier = sorted(reached)
+            order.extend((k, hops) for k in frontier)
+        return self.cache.put(cache_key, order)
+
+
+def _node(key: str, name: str, columns, expanded: bool = False, lazy: bool = False, **extra):
+    node = {"id": key, "title": name, "columns": list(columns), "expanded": expanded}
+    if lazy:
+        node["lazy"] = True
+    node.update(extra)
+    return node
+
+
+def _page(items, page: int, size: int):
+    return items[page * size:(page + 1) * size]
+
+
+def _paged(result: dict, total: int, page: int, size: int) -> dict:
+    result.update(page=page, size=size, total=total,
+                  next_page=page + 1 if (page + 1) * size < total else None)
+    return result
+
+
+def _dedupe(names):
+    # Case-insensitive, keeping the first spelling
+    seen = {}
+    for name in names:
+        seen.setdefault(name.lower(), name)
+    return sorted(seen.values(), key=str.lower)
+
+
+def _canonical(columns: dict, column) -> str:
+    """
+    One spelling per column of a node, so every link of the response uses
+    the name listed in the node's columns.
+    """
+    column = column or TABLE_COLUMN
+    return columns.setdefault(column.lower(), column)
+
+
+class _Handler(SimpleHTTPRequestHandler):
+    server_version = "LineageServer/1.0"
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        path = unquote(url.path)
+        if path == "/data.json":
+            route, arg = "data", None
+        elif path.startswith("/api/"):
+            route, _, arg = path[len("/api/"):].partition("/")
+        else:
+            return super().do_GET()
+
+        try:
+            params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+            key = (route, arg, tuple(sorted(params.items())))
+            self._send_json(*self._respond(route, arg, params, key))
+        except KeyError as e:
+            self._send_error(404, e.args[0] if e.args else "not found")
+        except ValueError as e:
+            self._send_error(400, str(e))
+        except Exception as e:
+            self.log_error("error answering %s: %s: %s", self.path, type(e).__name__, e)
+            traceback.print_exc(file=sys.stderr)
+            self._send_error(500, f"{type(e).__name__}: {e}")
+
+    def _respond(self, route: str, arg, params: dict, key):
+        api = self.server.api
+        with api.store_lock:
+            store = api.store
+            version = store.version()
+            cached = api.cache.get((version,) + key)
+            if cached is not None:
+                return cached
+            page = _int_param(params, "page", 0, 0, None)
+            if route == "data":
+                if "root" not in params:
+                    result = api.tables(store, version, params.get("q", ""), page,
+                                        _int_param(params, "size", 50, 1, MAX_PAGE_SIZE))
+                else:
+                    result = self._neighborhood(api, store, version, params["root"], params, page)
+            elif route == "neighborhood" and arg:
+                result = self._neighborhood(api, store, version, arg, params, page)
+            elif route == "node" and arg:
+                result = api.node(store, version, arg, page,
+                                  _int_param(params, "size", 200, 1, MAX_PAGE_SIZE))
+            elif route == "tables":
+                result = api.tables(store, version, params.get("q", ""), page,
+                                    _int_param(params, "size", 50, 1, MAX_PAGE_SIZE))
+            else:
+                raise KeyError(f"no such endpoint: {self.path}")
+        body = json.dumps(result, separators=(",", ":")).encode("utf-8")
+        etag = '"' + hashlib.sha1(body).hexdigest()[:20] + '"'
+        compressed = gzip.compress(body, compresslevel=5) if len(body) > 1024 else None
+        return api.cache.put((version,) + key, (body, compressed, etag))
+
+    @staticmethod
+    def _neighborhood(api, store, version, table: str, params: dict, page: int):
+        direction = params.get("direction", "both")
+        if direction not in DIRECTIONS + ("both",):
+            raise ValueError(f"direction must be upstream, downstream or both, not {direction!r}")
+        return api.neighborhood(store, version, table, direction,
+                                _int_param(params, "depth", 1, 1, MAX_DEPTH), page,
+                                _int_param(params, "size", 50, 1, MAX_PAGE_SIZE))
+
+    def _send_json(self, body: bytes, compressed, etag: str):
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        if compressed is not None and "gzip" in self.headers.get("Accept-Encoding", ""):
+            body = compressed
+            self.send_response(200)
+            self.send_header("Content-Encoding", "gzip")
+        else:
+            self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Vary", "Accept-Encoding")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_error(self, status: int, message: str):
+        body = json.dumps({"error": message}).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def _int_param(params: dict, name: str, default: int, low: int, high):
+    value = params.get(name)
+    if value is None:
+        return default
+    try:
+        value = int(value)
+    except ValueError:
+        raise ValueError(f"{name} must be an integer, not {value!r}") from None
+    if value < low or (high is not None and value > high):
+        raise ValueError(f"{name} must be between {low} and {high}" if high is not None
+                         else f"{name} must be at least {low}")
+    return value
+
+
+class LineageServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, api: LineageGraphAPI, static_dir: str = "."):
+        """
+        :param address:    (host, port)
+        :param api:        LineageGraphAPI answering the /api and /data.json requests
+        :param static_dir: directory other paths are served from
+        """
+        self.api = api
+        self.static_dir = static_dir
+        super().__init__(address, self._make_handler)
+
+    def _make_handler(self, *args):
+        return _Handler(*args, directory=self.static_dir)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Serve lineage to the data.json viewer one paged neighborhood at a time"
+    )
+    parser.add_argument("--db", default="lineage.db",
+                        help="SQLite lineage store written by sql_lineage.py --store.")
+    parser.add_argument("--host", default="127.0.0.1",
+                        help="Address to listen on (default: 127.0.0.1).")
+    parser.add_argument("--port", type=int, default=8000,
+                        help="Port to listen on (default: 8000).")
+    parser.add_argument("--cache-size", type=int, default=1024,
+                        help="Responses kept in the server-side LRU cache (default: 1024).")
+    parser.add_argument("--static-dir", default=os.path.dirname(os.path.abspath(__file__)),
+                        help="Directory served for non-API paths (default: this script's directory).")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        print(f"ERROR opening store: {args.db} does not exist", file=sys.stderr)
+        sys.exit(1)
+
+    server = LineageServer((args.host, args.port), LineageGraphAPI(args.db, args.cache_size),
+                           args.static_dir)
+    print(f"Serving {args.db} on http://{args.host}:{server.server_address[1]}/")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        server.api.close()
+
+
+if __name__ == "__main__":
+    main()
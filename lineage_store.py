@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+"""
+lineage_store.py
+
+Persistent column-lineage edge store on SQLite.
+
+Every processed file's lineage rows are upserted as edges
+    (source_table, source_column) -> (target_table, target_column)
+tagged with the file and statement they came from, and whether the target
+is the default target (the file name of a script without an INSERT). Both
+ends are indexed (case-insensitively, Oracle-style), and re-processing a
+file atomically replaces that file's edges, so the store always reflects
+the latest run.
+
+Usage:
+    python lineage_store.py --db lineage.db --upstream FINAL_REPORT.SALES_FIGURE
+    python lineage_store.py --db lineage.db --downstream SALES.AMOUNT
+
+Dependencies:
+    pip install pandas
+"""
+
+import argparse
+import hashlib
+import json
+import sqlite3
+import sys
+import time
+
+from lineage_writers import LineageWriter, _is_missing
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    file_id       INTEGER PRIMARY KEY,
+    path          TEXT NOT NULL UNIQUE,
+    content_hash  TEXT,
+    processed_at  REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS edges (
+    file_id        INTEGER NOT NULL REFERENCES files(file_id) ON DELETE CASCADE,
+    statement_no   INTEGER,
+    source_table   TEXT COLLATE NOCASE,
+    source_column  TEXT COLLATE NOCASE,
+    target_table   TEXT COLLATE NOCASE,
+    target_column  TEXT COLLATE NOCASE,
+    transformation TEXT,
+    target_is_default INTEGER
+);
+CREATE INDEX IF NOT EXISTS edges_source ON edges(source_table, source_column);
+CREATE INDEX IF NOT EXISTS edges_target ON edges(target_table, target_column);
+CREATE INDEX IF NOT EXISTS edges_file ON edges(file_id);
+"""
+
+EDGE_COLUMNS = ["path", "statement_no", "source_table", "source_column",
+                "target_table", "target_column", "transformation"]
+
+
+def file_sha256(path: str) -> str:
+    """
+    SHA-256 of a file's bytes, read in chunks.
+    """
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def split_column_ref(ref: str):
+    """
+    'SCHEMA.TABLE.COLUMN' or 'TABLE.COLUMN' -> (table, column); the table
+    part keeps everything before the last dot.
+    """
+    table, _, column = ref.rpartition(".")
+    return table, column
+
+
+class LineageStore:
+    def __init__(self, db_path: str = "lineage.db", check_same_thread: bool = True):
+        """
+        :param db_path:           SQLite database file (created if missing)
+        :param check_same_thread: False to share the connection between
+                                  threads (the caller serializes its use)
+        """
+        self.db_path = db_path
+        self.conn = sqlite3.connect(db_path, check_same_thread=check_same_thread)
+        self.conn.execute("PRAGMA foreign_keys = ON")
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        self.conn.execute("PRAGMA synchronous = NORMAL")
+        self.conn.executescript(SCHEMA)
+        # Stores created before the target_is_default column
+        if "target_is_default" not in {row[1] for row in self.conn.execute("PRAGMA table_info(edges)")}:
+            self.conn.execute("ALTER TABLE edges ADD COLUMN target_is_default INTEGER")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.conn.close()
+
+    def replace_file(self, path: str, lineage_df, content_hash: str = None):
+        """
+        Replace all edges of one file with the rows of lineage_df
+        (SQLLineageExtractor output, optionally with statement_no), in a
+        single transaction. Returns the number of edges written.
+        """
+        with self.file_writer(path, content_hash) as writer:
+            if lineage_df is not None:
+                writer.write("Lineage", lineage_df)
+        return writer.edges_written
+
+    def file_writer(self, path: str, content_hash: str = None):
+        """
+        A lineage_writers.LineageWriter that replaces the edges of path with
+        the "Lineage" chunks written to it, for streaming a large file. The
+        replacement is one transaction, committed on close; leaving a
+        with-block through an exception rolls it back.
+        """
+        return _StoreFileWriter(self, path, content_hash)
+
+    def remove_file(self, path: str):
+        """
+        Drop a file and all of its edges (e.g. the script was deleted).
+        """
+        with self.conn:
+            self.conn.execute("DELETE FROM files WHERE path = ?", (path,))
+
+    def file_hashes(self):
+        """
+        path -> content_hash for every file in the store.
+        """
+        return dict(self.conn.execute("SELECT path, content_hash FROM files"))
+
+    def upstream(self, table: str, column: str):
+        """
+        Edges that feed table.column directly (one hop).
+        """
+        return self._query("e.target_table = ? AND e.target_column = ?", (table, column))
+
+    def downstream(self, table: str, column: str):
+        """
+        Edges fed by table.column directly (one hop).
+        """
+        return self._query("e.source_table = ? AND e.source_column = ?", (table, column))
+
+    def iter_edges(self, batch_size: int = 10000):
+        """
+        Stream every edge as (source_table, source_column, target_table,
+        target_column) tuples.
+        """
+        cur = self.conn.execute(
+            "SELECT source_table, source_column, target_table, target_column FROM edges"
+        )
+        while True:
+            rows = cur.fetchmany(batch_size)
+            if not rows:
+                break
+            yield from rows
+
+    def iter_file_tables(self):
+        """
+        Stream the distinct (path, source_table, target_table) triples: the
+        table-level reads and writes of every file. A default target (the
+        file name of a script without an INSERT) is not a write: it comes
+        out as None.
+        """
+        yield from self.conn.execute(
+            "SELECT DISTINCT f.path, e.source_table,"
+            " CASE WHEN e.target_is_default THEN NULL ELSE e.target_table END"
+            " FROM edges e JOIN files f ON f.file_id = e.file_id"
+        )
+
+    def version(self):
+        """
+        (file count, latest processed_at): changes whenever a file is
+        replaced or removed, so it can key caches of query results.
+        """
+        return tuple(self.conn.execute("SELECT count(*), max(processed_at) FROM files").fetchone())
+
+    def tables(self):
+        """
+        Every distinct table name, as source or target.
+        """
+        return [row[0] for row in self.conn.execute(
+            "SELECT source_table FROM edges WHERE source_table IS NOT NULL"
+            " UNION SELECT target_table FROM edges WHERE target_table IS NOT NULL"
+        )]
+
+    def table_columns(self, table: str):
+        """
+        Every distinct column of table that has an edge, in or out; None
+        stands for the table-level edges (no column).
+        """
+        return [row[0] for row in self.conn.execute(
+            "SELECT source_column FROM edges WHERE source_table = ?"
+            " UNION SELECT target_column FROM edges WHERE target_table = ?"
+            " ORDER BY 1",
+            (table, table)
+        )]
+
+    def table_links(self, tables, direction: str = "downstream"):
+        """
+        Distinct (source_table, target_table) pairs leaving ("downstream")
+        or entering ("upstream") any of tables.
+        """
+        side = "source_table" if direction == "downstream" else "target_table"
+        yield from self._in_batches(
+            f"SELECT DISTINCT source_table, target_table FROM edges WHERE {side} IN ({{}})", tables)
+
+    def table_edges(self, tables, direction: str = "downstream"):
+        """
+        Distinct (source_table, source_column, target_table, target_column)
+        edges leaving ("downstream") or entering ("upstream") any of tables.
+        """
+        side = "source_table" if direction == "downstream" else "target_table"
+        yield from self._in_batches(
+            "SELECT DISTINCT source_table, source_column, target_table, target_column"
+            f" FROM edges WHERE {side} IN ({{}})", tables)
+
+    def _in_batches(self, sql: str, values, batch_size: int = 500):
+        # Stay under SQLite's bound-parameter limit
+        values = list(values)
+        for i in range(0, len(values), batch_size):
+            batch = values[i:i + batch_size]
+            yield from self.conn.execute(sql.format(", ".join("?" * len(batch))), batch)
+
+    def _file_id(self, path: str, content_hash: str):
+        self.conn.execute(
+            "INSERT INTO files (path, content_hash, processed_at) VALUES (?, ?, ?)"
+            " ON CONFLICT(path) DO UPDATE SET content_hash = excluded.content_hash,"
+            " processed_at = excluded.processed_at",
+            (path, content_hash, time.time())
+        )
+        return self.conn.execute("SELECT file_id FROM files WHERE path = ?", (path,)).fetchone()[0]
+
+    def _query(self, where: str, params):
+        cur = self.conn.execute(
+            "SELECT f.path, e.statement_no, e.source_table, e.source_column,"
+            " e.target_table, e.target_column, e.transformation"
+            " FROM edges e JOIN files f ON f.file_id = e.file_id"
+            f" WHERE {where}"
+            " ORDER BY f.path, e.statement_no",
+            params
+        )
+        return [dict(zip(EDGE_COLUMNS, row)) for row in cur]
+
+
+class _StoreFileWriter(LineageWriter):
+    def __init__(self, store: LineageStore, path: str, content_hash: str = None):
+        self.conn = store.conn
+        self.edges_written = 0
+        # The first statement implicitly opens the transaction
+        self.file_id = store._file_id(path, content_hash)
+        self.conn.execute("DELETE FROM edges WHERE file_id = ?", (self.file_id,))
+
+    def write(self, sheet: str, df):
+        if sheet != "Lineage":
+            return
+        rows = [
+            (self.file_id, r.get("statement_no"),
+             r.get("source_table"), r.get("source_column"),
+             r.get("target_table"), r.get("target_column"),
+             _transformation_text(r.get("transformation_steps", r.get("transformation"))),
+             None if _is_missing(r.get("target_is_default")) else int(r["target_is_default"]))
+            for r in df.to_dict("records")
+        ]
+        self.conn.executemany(
+            "INSERT INTO edges (file_id, statement_no, source_table, source_column,"
+            " target_table, target_column, transformation, target_is_default)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            rows
+        )
+        self.edges_written += len(rows)
+
+    def close(self):
+        self.conn.commit()
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.conn.commit()
+        else:
+            self.conn.rollback()
+
+
+def _transformation_text(steps):
+    if steps is None:
+        return None
+    if isinstance(steps, str):
+        return steps
+    return json.dumps(list(steps))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Query the persistent column-lineage store"
+    )
+    parser.add_argument("--db", default="lineage.db",
+                        help="SQLite lineage store written by sql_lineage.py --store.")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--upstream", metavar="TABLE.COLUMN",
+                       help="List the direct sources of a column.")
+    group.add_argument("--downstream", metavar="TABLE.COLUMN",
+                       help="List the direct consumers of a column.")
+    args = parser.parse_args()
+
+    with LineageStore(args.db) as store:
+        if args.upstream:
+            edges = store.upstream(*split_column_ref(args.upstream))
+        else:
+            edges = store.downstream(*split_column_ref(args.downstream))
+
+    if not edges:
+        print("No edges found.", file=sys.stderr)
+    for e in edges:
+        print(f"{e['source_table']}.{e['source_column']} -> "
+              f"{e['target_table']}.{e['target_column']}  "
+              f"[{e['path']}#{e['statement_no']}]")
+
+
+if __name__ == "__main__":
+    main()
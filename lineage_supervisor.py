@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+"""
+lineage_supervisor.py
+
+Per-statement wall-clock and memory budgets for batch extraction.
+
+A SupervisedPool runs tasks (files) in worker processes like
+multiprocessing.Pool.imap_unordered, but every worker reports each
+statement it starts and finishes (through StatementBudget.statement, the
+hook SQLLineageExtractor calls around every statement), so the parent
+knows which statement each worker is on:
+
+  * a statement running longer than the timeout is interrupted in the
+    worker (SIGALRM); the worker carries on with the next statement
+  * a statement still running after timeout + grace (stuck where signals
+    are not handled, e.g. inside a C extension), or whose worker grows
+    past the memory budget (resident size over what it had when the
+    statement started), gets its worker killed; the worker is replaced
+    and the file is re-run with that statement skipped
+  * a worker that dies mid-statement (segfault, OOM killer) is handled
+    the same way
+
+Every statement given up on is returned as a quarantine record with its
+size stats (bytes, lines, CASE branches, list items), the reason, the
+time it ran and the memory it grew by, so the rest of the batch is not
+held up by it.
+
+Memory is measured from /proc (Linux); elsewhere only the time budget is
+enforced.
+
+Dependencies:
+    (standard library only)
+"""
+
+import multiprocessing
+import os
+import re
+import signal
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from multiprocessing.connection import wait
+
+QUARANTINE_COLUMNS = ["statement_no", "statement_line", "reason", "elapsed_s", "memory_mb",
+                      "bytes", "lines", "case_branches", "list_items"]
+
+_WHEN_RE = re.compile(r"\bWHEN\b", re.IGNORECASE)
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+class StatementBudgetExceeded(Exception):
+    pass
+
+
+@contextmanager
+def time_limit(seconds: float, exception=StatementBudgetExceeded):
+    """
+    Raise exception in the running code after seconds. Only enforced in
+    the main thread where SIGALRM exists; elsewhere a no-op.
+
+    Libraries may catch the exception and raise their own (sqlglot's
+    tokenizer turns it into a TokenError) or swallow it, so whether the
+    limit was hit is recorded when the alarm fires: once it has, the block
+    always ends with exception, whatever it raised or returned.
+    """
+    if (seconds is None or not hasattr(signal, "SIGALRM")
+            or threading.current_thread() is not threading.main_thread()):
+        yield
+        return
+
+    message = f"exceeded {seconds:.1f}s"
+    fired = []
+
+    def on_alarm(signum, frame):
+        fired.append(True)
+        raise exception(message)
+
+    previous = signal.signal(signal.SIGALRM, on_alarm)
+    signal.setitimer(signal.ITIMER_REAL, max(seconds, 0.001))
+    try:
+        yield
+    except BaseException as e:
+        if fired and not isinstance(e, exception):
+            raise exception(message) from e
+        raise
+    else:
+        if fired:
+            raise exception(message)
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+def statement_size(sql: str) -> dict:
+    """
+    Cheap size stats of a statement, for spotting pathological ones.
+    """
+    return {
+        "bytes": len(sql.encode("utf-8")),
+        "lines": sql.count("\n") + 1,
+        "case_branches": len(_WHEN_RE.findall(sql)),
+        "list_items": sql.count(","),
+    }
+
+
+def _rss(pid: int = None):
+    """
+    Resident set size in bytes, or None where /proc is not available.
+    """
+    try:
+        with open(f"/proc/{pid or 'self'}/statm", "rb") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+class NullBudget:
+    """
+    Budget stand-in used when no limits are set: every hook is a no-op.
+    """
+    _null = nullcontext()
+
+    def statement(self, **info):
+        return self._null
+
+
+class StatementBudget:
+    def __init__(self, timeout: float = None, conn=None):
+        """
+        :param timeout: seconds a statement may run before it is interrupted
+        :param conn:    pipe to the SupervisedPool parent (None in-process)
+        """
+        self.timeout = timeout
+        self.conn = conn
+        self.skip = {}          # statement_no -> reason, for a re-run task
+        self.quarantined = []
+
+    @contextmanager
+    def statement(self, **info):
+        """
+        Run one statement under the budget. info is reported with it; pass
+        sql= to have its size stats recorded.
+        """
+        sql = info.pop("sql", "")
+        record = dict(info, **statement_size(sql))
+        statement_no = info.get("statement_no")
+        if statement_no in self.skip:
+            raise StatementBudgetExceeded(f"quarantined ({self.skip[statement_no]})")
+        if self.conn is not None:
+            self.conn.send(("start", record, _rss()))
+        start = time.perf_counter()
+        rss_start = _rss()
+        try:
+            with time_limit(self.timeout):
+                yield
+        except StatementBudgetExceeded:
+            rss_end = _rss()
+            memory = round((rss_end - rss_start) / 1e6, 1) if rss_start and rss_end else None
+            self.quarantined.append(dict(record, reason="timeout",
+                                         elapsed_s=round(time.perf_counter() - start, 3),
+                                         memory_mb=memory))
+            raise
+        finally:
+            if self.conn is not None:
+                self.conn.send(("end",))
+
+
+def _worker_main(conn, initializer, initargs, func, timeout):
+    budget = StatementBudget(timeout, conn)
+    if initializer is not None:
+        initializer(*initargs, budget=budget)
+    while True:
+        message = conn.recv()
+        if message is None:
+            break
+        task_id, task, skip = message
+        budget.skip = skip
+        budget.quarantined = []
+        result = func(task)
+        conn.send(("done", task_id, result, budget.quarantined))
+    conn.close()
+
+
+class _Worker:
+    def __init__(self, ctx, args):
+        self.conn, child = ctx.Pipe()
+        self.process = ctx.Process(target=_worker_main, args=(child,) + args, daemon=True)
+        self.process.start()
+        child.close()
+        self.job = None          # (task_id, task, skip)
+        self.statement = None    # record of the running statement
+        self.started = None
+        self.rss_start = None
+        self.rss_peak = None
+
+    def kill(self):
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+
+class SupervisedPool:
+    def __init__(self, processes: int = None, initializer=None, initargs=(),
+                 timeout: float = None, memory_mb: float = None, grace: float = 2.0):
+        """
+        :param processes:   worker processes (default: CPU count)
+        :param initializer: called in every worker with initargs and
+                            budget=<that worker's StatementBudget>, which
+                            must wrap each statement the task runs
+        :param timeout:     seconds per statement (None: unlimited)
+        :param memory_mb:   resident growth allowed per statement (None: unlimited)
+        :param grace:       seconds after the timeout before a worker that
+                            does not respond to SIGALRM is killed
+        """
+        self.processes = processes or os.cpu_count() or 1
+        self.initializer = initializer
+        self.initargs = tuple(initargs)
+        self.timeout = timeout
+        self.memory_bytes = memory_mb * 1e6 if memory_mb else None
+        self.grace = grace
+        self._ctx = multiprocessing.get_context()
+        self.restarts = 0
+
+    def imap_unordered(self, func, tasks):
+        """
+        Run func(task) for every task in the workers. Yields (task, result,
+        quarantined) as tasks finish: quarantined lists the records of the
+        statements given up on. result is None only if the worker died
+        outside any statement (the task cannot be retried safely).
+        """
+        args = (self.initializer, self.initargs, func, self.timeout)
+        pending = deque((task_id, task, {}) for task_id, task in enumerate(tasks))
+        killed = {}   # task_id -> quarantine records of earlier attempts
+        workers = [_Worker(self._ctx, args) for _ in range(min(self.processes, len(pending)) or 1)]
+        tick = 0.1 if (self.timeout or self.memory_bytes) else None
+
+        try:
+            while pending or any(w.job for w in workers):
+                for worker in workers:
+                    if worker.job is None and pending:
+                        worker.job = pending.popleft()
+                        worker.conn.send(worker.job)
+
+                busy = [w for w in workers if w.job is not None]
+                ready = wait([w.conn for w in busy], timeout=tick)
+                for worker in busy:
+                    if worker.conn not in ready:
+                        continue
+                    try:
+                        message = worker.conn.recv()
+                    except (EOFError, OSError):
+                        yield from self._give_up(worker, workers, args, pending, killed, "crashed")
+                        continue
+                    if message[0] == "start":
+                        worker.statement = message[1]
+                        worker.started = time.perf_counter()
+                        worker.rss_start = worker.rss_peak = message[2]
+                    elif message[0] == "end":
+                        worker.statement = None
+                    else:
+                        _, task_id, result, quarantined = message
+                        task = worker.job[1]
+                        worker.job = worker.statement = None
+                        yield task, result, killed.pop(task_id, []) + quarantined
+
+                now = time.perf_counter()
+                for worker in list(workers):
+                    if worker.statement is None or worker.job is None:
+                        continue
+                    if self.timeout and now - worker.started > self.timeout + self.grace:
+                        yield from self._give_up(worker, workers, args, pending, killed, "killed: timeout")
+                        continue
+                    if self.memory_bytes and worker.rss_start:
+                        rss = _rss(worker.process.pid)
+                        if rss:
+                            worker.rss_peak = max(worker.rss_peak, rss)
+                            if rss - worker.rss_start > self.memory_bytes:
+                                yield from self._give_up(worker, workers, args, pending, killed,
+                                                         "killed: memory")
+        finally:
+            for worker in workers:
+                if worker.process.is_alive():
+                    try:
+                        worker.conn.send(None)
+                    except OSError:
+                        pass
+                    worker.process.join(timeout=1)
+                    if worker.process.is_alive():
+                        worker.kill()
+
+    def _give_up(self, worker, workers, args, pending, killed, reason: str):
+        """
+        Kill and replace a worker; quarantine its statement and re-queue
+        its task with that statement skipped.
+        """
+        task_id, task, skip = worker.job
+        statement = worker.statement
+        elapsed = time.perf_counter() - worker.started if worker.started else None
+        memory = None
+        if worker.rss_start and worker.rss_peak:
+            memory = round((worker.rss_peak - worker.rss_start) / 1e6, 1)
+        worker.kill()
+        workers[workers.index(worker)] = _Worker(self._ctx, args)
+        self.restarts += 1
+
+        if statement is None:
+            records = killed.pop(task_id, [])
+            yield task, None, records + [{"reason": reason, "elapsed_s": None, "memory_mb": None}]
+            return
+        killed.setdefault(task_id, []).append(
+            dict(statement, reason=reason,
+                 elapsed_s=round(elapsed, 3) if elapsed is not None else None,
+                 memory_mb=memory))
+        # Front of the queue: this file was already running
+        pending.appendleft((task_id, task, {**skip, statement["statement_no"]: reason}))
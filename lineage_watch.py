@@ -0,0 +1,378 @@
+#!/usr/bin/env python3
+"""
+lineage_watch.py
+
+Keep a lineage store (and optionally per-file outputs and the compiled
+lineage graph) current with a directory of SQL scripts.
+
+Runs as a long-lived process. On start, and whenever the directory
+changes, the files matching the pattern are compared with the store:
+
+  * added files, and files whose content hash differs from the one in the
+    store, are re-extracted and their edges replaced
+  * files that are in the store but no longer on disk have their edges
+    retracted (only files under the watched directory are considered)
+  * files that were only touched (same content) are left alone
+
+Changes are noticed with inotify on Linux (stdlib ctypes, no extra
+package) or by polling file sizes and mtimes every --interval seconds.
+A burst of changes (a checkout, a save-all) is debounced: syncing waits
+until the tree has been quiet for --debounce seconds. Small change sets
+are extracted in-process with a warm extractor and cache; larger ones go
+to the batch worker pool.
+
+Usage:
+    python lineage_watch.py --sql-dir sql --store lineage.db --dialect oracle
+    python lineage_watch.py --sql-dir sql --store lineage.db --output-dir lineage_out --format jsonl --graph-dir lineage_graph
+    python lineage_watch.py --sql-dir sql --store lineage.db --once
+
+Dependencies:
+    pip install sqlglot pandas
+    pip install pyarrow    (only for --format parquet)
+"""
+
+import argparse
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import time
+
+from lineage_graph import LineageGraph
+from lineage_store import LineageStore, file_sha256
+from lineage_writers import SHEETS, WRITERS, open_writer
+from sql_lineage import (STATEMENT_COLUMNS, _extract_batch_file, _init_batch_worker, _with_leading,
+                         find_sql_files, iter_batch_lineage, sheet_columns)
+
+# Change sets up to this size are extracted in-process (no pool start-up)
+LOCAL_BATCH = 8
+
+# inotify(7) event mask: anything that can add, change or remove a file
+_IN_EVENTS = (0x00000002 | 0x00000008 | 0x00000040 | 0x00000080 | 0x00000100 | 0x00000200
+              | 0x00000400 | 0x00000800)  # MODIFY CLOSE_WRITE MOVED_* CREATE DELETE DELETE_SELF MOVE_SELF
+_IN_NONBLOCK = 0o4000
+_IN_CLOEXEC = 0o2000000
+
+
+class _Inotify:
+    """
+    Minimal inotify wrapper: watches directories and reports whether
+    anything happened. Events are only used as a wake-up; what changed is
+    always worked out by rescanning.
+    """
+
+    def __init__(self):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self.fd = libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._watched = set()
+
+    def watch_tree(self, root: str):
+        """
+        Watch root and every directory below it (new ones included, when
+        called again after a change).
+        """
+        for directory, _, _ in os.walk(root):
+            if directory not in self._watched:
+                if self._add_watch(self.fd, os.fsencode(directory), _IN_EVENTS) >= 0:
+                    self._watched.add(directory)
+
+    def wait(self, timeout: float) -> bool:
+        """
+        Block up to timeout seconds; True if any event arrived (all pending
+        events are drained).
+        """
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return False
+        while True:
+            try:
+                data = os.read(self.fd, 65536)
+            except BlockingIOError:
+                break
+            # Forget removed directories so they are re-added if recreated
+            offset = 0
+            while offset < len(data):
+                _, mask, _, length = struct.unpack_from("iIII", data, offset)
+                offset += 16 + length
+                if mask & 0x00008000:  # IN_IGNORED: the watch went away
+                    self._watched = {d for d in self._watched if os.path.isdir(d)}
+        return True
+
+    def close(self):
+        os.close(self.fd)
+
+
+class LineageWatcher:
+    def __init__(self,
+                 sql_dir: str,
+                 store: LineageStore,
+                 pattern: str = "**/*.sql",
+                 dialect: str = None,
+                 workers: int = None,
+                 cache_dir: str = None,
+                 cache_bytes: int = None,
+                 catalog_path: str = None,
+                 output_dir: str = None,
+                 output_format: str = "jsonl",
+                 graph_dir: str = None):
+        """
+        :param sql_dir:       directory to keep in sync
+        :param store:         LineageStore receiving the edges
+        :param output_dir:    optional directory for one lineage output per
+                              script (mirroring sql_dir, in output_format)
+        :param graph_dir:     optional compiled LineageGraph rebuilt after
+                              every sync that changed the store
+        """
+        self.sql_dir = sql_dir
+        self.store = store
+        self.pattern = pattern
+        self.dialect = dialect
+        self.workers = workers
+        self.cache_dir = cache_dir
+        self.cache_bytes = cache_bytes
+        self.catalog_path = catalog_path
+        self.output_dir = output_dir
+        self.output_format = output_format
+        self.graph_dir = graph_dir
+        self._local_ready = False
+
+    def scan(self):
+        """
+        path -> (size, mtime_ns) of every file matching the pattern.
+        """
+        stats = {}
+        for path in find_sql_files(self.sql_dir, self.pattern):
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue  # removed while scanning
+            stats[path] = (st.st_size, st.st_mtime_ns)
+        return stats
+
+    def _stored_paths(self):
+        """
+        absolute path -> (path as stored, content_hash) of the store's files
+        under sql_dir.
+        """
+        root = os.path.abspath(self.sql_dir)
+        stored = {}
+        for path, h in self.store.file_hashes().items():
+            full = os.path.abspath(path)
+            if os.path.commonpath([root, full]) == root:
+                stored[full] = (path, h)
+        return stored
+
+    def sync(self, paths=None):
+        """
+        Bring the store in line with the directory. paths limits the
+        content check to those files (e.g. the ones whose stat changed);
+        deletions are always detected. Returns (changed, removed) paths.
+        """
+        stored = self._stored_paths()
+        on_disk = {os.path.abspath(path): path for path in find_sql_files(self.sql_dir, self.pattern)}
+        candidates = set(on_disk.values())
+        if paths is not None:
+            candidates &= set(paths)
+
+        changed, hashes = [], {}
+        for path in sorted(candidates):
+            try:
+                hashes[path] = file_sha256(path)
+            except OSError:
+                continue
+            if stored.get(os.path.abspath(path), (None, None))[1] != hashes[path]:
+                changed.append(path)
+        removed = sorted(stored[full][0] for full in set(stored) - set(on_disk))
+
+        for path in removed:
+            self.store.remove_file(path)
+            self._remove_output(path)
+        if changed:
+            self._extract(changed, hashes)
+        if (changed or removed) and self.graph_dir:
+            LineageGraph.build(self.store.iter_edges(), self.graph_dir)
+        return changed, removed
+
+    def _extract(self, paths, hashes):
+        if len(paths) <= LOCAL_BATCH:
+            results = self._iter_local(paths)
+        else:
+            results = iter_batch_lineage(paths, self.dialect, workers=self.workers,
+                                         cache_dir=self.cache_dir, cache_bytes=self.cache_bytes,
+                                         catalog_path=self.catalog_path)
+        for path, frames, file_errors in results:
+            for error in file_errors:
+                where = f"{path}:{error['statement_line']}" if error["statement_line"] else path
+                print(f"ERROR in {where}: {error['error']}", file=sys.stderr)
+            if frames is None:
+                continue
+            self.store.replace_file(path, frames[0], content_hash=hashes[path])
+            self._write_output(path, frames)
+
+    def _iter_local(self, paths):
+        """
+        Same results as iter_batch_lineage, extracted in this process with
+        one long-lived extractor (its cache stays warm between syncs).
+        """
+        if not self._local_ready:
+            _init_batch_worker(self.dialect, self.cache_dir, self.cache_bytes, None, self.catalog_path)
+            self._local_ready = True
+        for path in paths:
+            default_target = os.path.splitext(os.path.basename(path))[0]
+            yield _extract_batch_file((path, default_target))[:3]
+
+    def _output_path(self, path: str):
+        relative = os.path.relpath(path, self.sql_dir)
+        return os.path.join(self.output_dir, relative + (".xlsx" if self.output_format == "xlsx" else ""))
+
+    def _write_output(self, path: str, frames):
+        if not self.output_dir:
+            return
+        self._remove_output(path)
+        output = self._output_path(path)
+        os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+        with open_writer(self.output_format, output, sheet_columns(["source_file"] + STATEMENT_COLUMNS)) as writer:
+            for sheet, df in zip(SHEETS, frames):
+                if not df.empty:
+                    writer.write(sheet, _with_leading(df, {"source_file": path}))
+
+    def _remove_output(self, path: str):
+        if not self.output_dir:
+            return
+        output = self._output_path(path)
+        if os.path.isdir(output):
+            for name in os.listdir(output):
+                os.remove(os.path.join(output, name))
+            os.rmdir(output)
+        elif os.path.exists(output):
+            os.remove(output)
+
+    def run(self, interval: float = 2.0, debounce: float = 0.5, use_inotify: bool = True):
+        """
+        Sync once, then keep syncing on changes until interrupted.
+        """
+        self._report(*self.sync())
+        notifier = None
+        if use_inotify and sys.platform.startswith("linux"):
+            try:
+                notifier = _Inotify()
+                notifier.watch_tree(self.sql_dir)
+            except (OSError, AttributeError) as e:
+                print(f"inotify unavailable ({e}); polling every {interval}s", file=sys.stderr)
+                notifier = None
+
+        snapshot = self.scan()
+        try:
+            while True:
+                if notifier is not None:
+                    # Also rescan now and then: inotify can overflow or miss
+                    # network file systems
+                    notifier.wait(max(interval, 30.0))
+                else:
+                    time.sleep(interval)
+                current = self.scan()
+                if current == snapshot:
+                    continue
+
+                # Debounce: wait until the tree stops changing
+                while True:
+                    if notifier is not None:
+                        notifier.watch_tree(self.sql_dir)
+                        if notifier.wait(debounce):
+                            continue
+                    else:
+                        time.sleep(debounce)
+                    settled = self.scan()
+                    if settled == current:
+                        break
+                    current = settled
+
+                touched = [p for p, st in current.items() if snapshot.get(p) != st]
+                snapshot = current
+                self._report(*self.sync(touched))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if notifier is not None:
+                notifier.close()
+
+    def _report(self, changed, removed):
+        if changed or removed:
+            print(f"{time.strftime('%H:%M:%S')}  {len(changed)} files re-extracted, "
+                  f"{len(removed)} retracted", file=sys.stderr)
+            for path in changed:
+                print(f"  ~ {path}", file=sys.stderr)
+            for path in removed:
+                print(f"  - {path}", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Keep a lineage store current with a directory of SQL scripts"
+    )
+    parser.add_argument("--sql-dir", required=True,
+                        help="Directory of .sql files to watch.")
+    parser.add_argument("--pattern", default="**/*.sql",
+                        help="Glob pattern, relative to the directory (default: **/*.sql).")
+    parser.add_argument("--store", default="lineage.db",
+                        help="SQLite lineage store to keep current (default: lineage.db).")
+    parser.add_argument("--dialect", default=None,
+                        help="SQL dialect for parsing (default: generic).")
+    parser.add_argument("--workers", type=int, default=None,
+                        help=f"Worker processes for change sets over {LOCAL_BATCH} files (default: CPU count).")
+    parser.add_argument("--catalog", default=None,
+                        help="Schema catalog for unqualified columns and * expansion (see schema_catalog.py).")
+    parser.add_argument("--output-dir", default=None,
+                        help="Also keep one lineage output per script in this directory.")
+    parser.add_argument("--format", choices=list(WRITERS), default="jsonl",
+                        help="Format of the --output-dir outputs (default: jsonl).")
+    parser.add_argument("--graph-dir", default=None,
+                        help="Also rebuild the compiled lineage graph (lineage_graph.py) after each sync.")
+    parser.add_argument("--interval", type=float, default=2.0,
+                        help="Polling interval in seconds when inotify is not used (default: 2).")
+    parser.add_argument("--debounce", type=float, default=0.5,
+                        help="Quiet time in seconds before a burst of changes is synced (default: 0.5).")
+    parser.add_argument("--poll", action="store_true",
+                        help="Poll even where inotify is available.")
+    parser.add_argument("--once", action="store_true",
+                        help="Sync once and exit.")
+    parser.add_argument("--cache-dir", default=".sql_lineage_cache",
+                        help="Directory for the on-disk lineage cache (default: .sql_lineage_cache).")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Always re-parse; neither read nor write the cache.")
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.sql_dir):
+        print(f"ERROR: {args.sql_dir} is not a directory", file=sys.stderr)
+        sys.exit(1)
+
+    with LineageStore(args.store) as store:
+        watcher = LineageWatcher(
+            args.sql_dir,
+            store,
+            pattern=args.pattern,
+            dialect=args.dialect,
+            workers=args.workers,
+            cache_dir=None if args.no_cache else args.cache_dir,
+            cache_bytes=512 * 1024 * 1024,
+            catalog_path=args.catalog,
+            output_dir=args.output_dir,
+            output_format=args.format,
+            graph_dir=args.graph_dir
+        )
+        if args.once:
+            changed, removed = watcher.sync()
+            print(f"{len(changed)} files re-extracted, {len(removed)} retracted")
+            return
+        print(f"Watching {args.sql_dir} (Ctrl-C to stop)", file=sys.stderr)
+        watcher.run(interval=args.interval, debounce=args.debounce, use_inotify=not args.poll)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+"""
+lineage_writers.py
+
+Pluggable, incremental output writers for sql_lineage.py.
+
+Results are written sheet by sheet ("Lineage", "Filters", "Joins",
+"Errors") in chunks as statements / files are processed, so nothing is
+accumulated for the whole run:
+
+  xlsx     one workbook, openpyxl write-only mode (rows are streamed to
+           disk); sheets roll over to Lineage_2, ... at Excel's row limit
+  parquet  one <sheet>.parquet per sheet, one row group per chunk
+  csv.gz   one <sheet>.csv.gz per sheet
+  jsonl    one <sheet>.jsonl per sheet, one JSON object per line
+
+For the directory formats the output path is a directory.
+FrameCollector is the in-memory writer that the DataFrame-returning APIs
+use; TeeWriter fans chunks out to several writers.
+
+Dependencies:
+    pip install pandas openpyxl          (xlsx)
+    pip install pyarrow                  (parquet)
+"""
+
+import gzip
+import json
+import math
+import os
+from collections.abc import Sequence
+
+import pandas as pd
+
+SHEETS = ("Lineage", "Filters", "Joins", "Errors")
+
+# Excel's hard limit, header row included
+XLSX_MAX_ROWS = 1048576
+
+# Integer-valued columns: the leading statement columns and the 0/1 flag
+# marking lineage rows whose target table is the default (the file name)
+INT_COLUMNS = {"statement_no", "statement_line", "target_is_default"}
+
+
+def _is_missing(value):
+    return value is None or (isinstance(value, float) and math.isnan(value))
+
+
+def _json_default(value):
+    # numpy scalars (e.g. int64 statement numbers) and TransformTree steps
+    # -> plain Python values
+    return value.tolist() if hasattr(value, "tolist") else str(value)
+
+
+class LineageWriter:
+    """
+    Base class: write(sheet, df) may be called any number of times per
+    sheet; the columns of a sheet are fixed by its first chunk. Sheets are
+    created on their first write; the file writers take a sheet -> column
+    list dict of known sheets that are still written (header only) on
+    close when they got no rows.
+    """
+
+    def write(self, sheet: str, df: pd.DataFrame):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class FrameCollector(LineageWriter):
+    """
+    Keep every chunk in memory and concatenate per sheet on demand.
+    """
+
+    def __init__(self, columns: dict = None):
+        """
+        :param columns: sheet -> column list used for sheets that received no rows
+        """
+        self.columns = columns or {}
+        self._parts = {}
+
+    def write(self, sheet: str, df: pd.DataFrame):
+        self._parts.setdefault(sheet, []).append(df)
+
+    def frame(self, sheet: str) -> pd.DataFrame:
+        parts = self._parts.get(sheet)
+        if not parts:
+            return pd.DataFrame(columns=self.columns.get(sheet))
+        return pd.concat(parts, ignore_index=True)
+
+
+class TeeWriter(LineageWriter):
+    """
+    Forward every chunk to several writers (e.g. an output file and the
+    lineage store).
+    """
+
+    def __init__(self, *writers):
+        self.writers = writers
+
+    def write(self, sheet: str, df: pd.DataFrame):
+        for writer in self.writers:
+            writer.write(sheet, df)
+
+    def close(self):
+        for writer in self.writers:
+            writer.close()
+
+    def __exit__(self, *exc):
+        for writer in self.writers:
+            writer.__exit__(*exc)
+
+
+class _PerSheetFileWriter(LineageWriter):
+    """
+    Directory output with one file per sheet, opened on first write.
+    """
+    extension = None
+
+    def __init__(self, output_dir: str, columns: dict = None):
+        self.output_dir = output_dir
+        self.columns = columns or {}
+        os.makedirs(output_dir, exist_ok=True)
+        self._files = {}
+
+    def _path(self, sheet: str):
+        return os.path.join(self.output_dir, f"{sheet.lower()}.{self.extension}")
+
+    def close(self):
+        for sheet, columns in self.columns.items():
+            if sheet not in self._files:
+                self.write(sheet, pd.DataFrame(columns=columns))
+        for f in self._files.values():
+            f.close()
+        self._files = {}
+
+
+class CsvGzWriter(_PerSheetFileWriter):
+    extension = "csv.gz"
+
+    def write(self, sheet: str, df: pd.DataFrame):
+        f = self._files.get(sheet)
+        header = f is None
+        if header:
+            f = self._files[sheet] = gzip.open(self._path(sheet), "wt", encoding="utf-8", newline="")
+        df.to_csv(f, index=False, header=header)
+
+
+class JsonLinesWriter(_PerSheetFileWriter):
+    extension = "jsonl"
+
+    def write(self, sheet: str, df: pd.DataFrame):
+        f = self._files.get(sheet)
+        if f is None:
+            f = self._files[sheet] = open(self._path(sheet), "w", encoding="utf-8")
+        columns = list(df.columns)
+        for row in df.itertuples(index=False, name=None):
+            record = {c: (None if _is_missing(v) else v) for c, v in zip(columns, row)}
+            f.write(json.dumps(record, default=_json_default))
+            f.write("\n")
+
+
+class ParquetWriter(_PerSheetFileWriter):
+    extension = "parquet"
+
+    def __init__(self, output_dir: str, columns: dict = None):
+        super().__init__(output_dir, columns)
+        import pyarrow  # noqa: F401  (fail early if missing)
+
+    def write(self, sheet: str, df: pd.DataFrame):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        writer = self._files.get(sheet)
+        if writer is None:
+            schema = pa.schema([(c, self._arrow_type(c)) for c in df.columns])
+            writer = self._files[sheet] = pq.ParquetWriter(self._path(sheet), schema)
+        schema = writer.schema
+        arrays = [
+            pa.array([self._value(c, v) for v in df[c].tolist()], type=schema.field(c).type)
+            for c in schema.names
+        ]
+        writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+
+    @staticmethod
+    def _arrow_type(column: str):
+        import pyarrow as pa
+        if column in INT_COLUMNS:
+            return pa.int64()
+        if column == "transformation_steps":
+            return pa.list_(pa.string())
+        return pa.string()
+
+    @staticmethod
+    def _value(column: str, value):
+        if _is_missing(value):
+            return None
+        if column in INT_COLUMNS:
+            return int(value)
+        if column == "transformation_steps":
+            return [str(v) for v in value]
+        return str(value)
+
+
+class XlsxStreamWriter(LineageWriter):
+    """
+    Constant-memory workbook writer (openpyxl write-only mode).
+    """
+
+    def __init__(self, output_path: str, columns: dict = None, max_rows: int = XLSX_MAX_ROWS):
+        from openpyxl import Workbook
+        self.output_path = output_path
+        self.columns = columns or {}
+        self.max_rows = max_rows
+        self._workbook = Workbook(write_only=True)
+        # sheet -> [worksheet, rows written, part number, header]
+        self._sheets = {}
+
+    def _sheet_state(self, sheet: str):
+        state = self._sheets.get(sheet)
+        if state is None:
+            state = self._sheets[sheet] = [self._workbook.create_sheet(sheet), 0, 1, None]
+        return state
+
+    def write(self, sheet: str, df: pd.DataFrame):
+        from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+
+        state = self._sheet_state(sheet)
+        if state[3] is None:
+            state[3] = list(df.columns)
+            state[0].append(state[3])
+            state[1] = 1
+        for row in df.itertuples(index=False, name=None):
+            if state[1] >= self.max_rows:
+                # Excel row limit: continue on Lineage_2, Lineage_3, ...
+                state[2] += 1
+                state[0] = self._workbook.create_sheet(f"{sheet}_{state[2]}")
+                state[0].append(state[3])
+                state[1] = 1
+            cells = []
+            for v in row:
+                if _is_missing(v):
+                    v = None
+                elif isinstance(v, str):
+                    v = ILLEGAL_CHARACTERS_RE.sub("", v)
+                elif isinstance(v, Sequence):
+                    # lists and TransformTree steps
+                    v = ILLEGAL_CHARACTERS_RE.sub("", str(list(v)))
+                cells.append(v)
+            state[0].append(cells)
+            state[1] += 1
+
+    def close(self):
+        if self._workbook is not None:
+            for sheet, columns in self.columns.items():
+                if sheet not in self._sheets:
+                    self.write(sheet, pd.DataFrame(columns=columns))
+            self._workbook.save(self.output_path)
+            self._workbook = None
+
+
+WRITERS = {
+    "xlsx": XlsxStreamWriter,
+    "parquet": ParquetWriter,
+    "csv.gz": CsvGzWriter,
+    "jsonl": JsonLinesWriter,
+}
+
+
+def open_writer(fmt: str, output_path: str, columns: dict = None) -> LineageWriter:
+    """
+    Create the writer for an output format (one of WRITERS).
+
+    :param columns: sheet -> column list of the sheets to write even when
+                    they get no rows
+    """
+    try:
+        cls = WRITERS[fmt]
+    except KeyError:
+        raise ValueError(f"Unknown output format '{fmt}' (expected one of: {', '.join(WRITERS)})")
+    return cls(output_path, columns)
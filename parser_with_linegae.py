@@ -1,46 +1,313 @@
-import sqlglot
-from sqlglot import exp
+#!/usr/bin/env python3
+"""
+parser_with_linegae.py
+
+Table / column / join graph of a SQL project, streamed as compact JSON.
+
+Every statement is parsed once with sqlglot and added to one graph:
+
+  nodes   tables and "table.column" names, interned: each distinct name
+          gets a single integer id the first time it is seen, however many
+          statements mention it (aliases are resolved to schema-qualified
+          table names; references to a statement's CTEs are not tables)
+  edges   table -> column (the column is used), table -> table for every
+          join predicate, with its endpoints taken from the AST (the two
+          sides of each column comparison in ON, or the tables of a USING),
+          and source table -> target table (the INSERT target, else the
+          target table named by the file); each distinct edge is kept once
+
+The JSON is written while the project is read: a node is written when it
+is first interned and edges are spooled to a temp file, then appended, so
+the output is {"nodes": [...], "edges": [...]} with no indentation and
+memory only holds the name -> id table and the edge keys.
+
+Usage:
+    python parser_with_linegae.py target_table_name.sql
+    python parser_with_linegae.py --sql-dir project --dialect oracle --output lineage_graph.json
+
+Dependencies:
+    pip install sqlglot
+"""
+
+import argparse
 import json
 import os
+import sys
+import tempfile
+
+import sqlglot
+from sqlglot import exp
+
+from sql_lineage import find_sql_files
+from sql_statements import iter_statements
+
+UNKNOWN_TABLE = 'UNKNOWN_TABLE'
+
+
+def _cte_names(sql_expression):
+    return {cte.alias_or_name for cte in sql_expression.find_all(exp.CTE)}
+
+
+def _tables(sql_expression, ctes=None):
+    # every table of the statement, except references to its own CTEs
+    ctes = _cte_names(sql_expression) if ctes is None else ctes
+    for table in sql_expression.find_all(exp.Table):
+        if not table.name or (not table.db and table.name in ctes):
+            continue
+        yield table
+
+
+def _alias_map(sql_expression):
+    # alias (or bare name) -> qualified table name, for every table of the statement
+    return {table.alias_or_name: exp.table_name(table) for table in _tables(sql_expression)}
+
+
+def _column_table(column, aliases):
+    return aliases.get(column.table, column.table) if column.table else UNKNOWN_TABLE
+
+
+def extract_join_edges(sql_expression, aliases=None):
+    """
+    Endpoints of every join predicate, from the AST: one
+    (left_table, left_column, right_table, right_column, kind, condition)
+    per column comparison in ON (columns are None for a USING join).
+    """
+    aliases = _alias_map(sql_expression) if aliases is None else aliases
+    edges = []
+    for join in sql_expression.find_all(exp.Join):
+        kind = " ".join(filter(None, (join.side, join.kind))) or "INNER"
+        on = join.args.get('on')
+        if on is not None:
+            for predicate in on.find_all(exp.Predicate):
+                if not isinstance(predicate, exp.Binary):
+                    continue
+                left, right = predicate.left, predicate.right
+                if not isinstance(left, exp.Column) or not isinstance(right, exp.Column):
+                    continue
+                edges.append((_column_table(left, aliases), left.name,
+                              _column_table(right, aliases), right.name, kind, predicate.sql()))
+            continue
+        if join.args.get('using') and isinstance(join.this, exp.Table):
+            select = join.parent_select
+            source = select.args.get('from_') if select is not None else None
+            if source is not None and isinstance(source.this, exp.Table):
+                edges.append((exp.table_name(source.this), None, exp.table_name(join.this), None, kind,
+                              f"USING ({', '.join(c.name for c in join.args['using'])})"))
+    return edges
+
 
 def extract_sql_details(sql_expression):
-    # ... (same function as before)
-
-def create_lineage(sql_details, target_table):
-    lineage = {"nodes": [], "edges": []}
-    
-    # Add tables as nodes
-    for table in sql_details["tables"]:
-        lineage["nodes"].append({"id": table, "label": table})
-    
-    # Add columns as nodes and create edges from table to column
-    for column in sql_details["columns"]:
-        table_name, column_name = column.split('.')
-        lineage["nodes"].append({"id": column, "label": column_name})
-        lineage["edges"].append({"from": table_name, "to": column})
-    
-    # Add edges for JOIN logic
-    for join in sql_details["join_logic"]:
-        join_parts = join.split(' ')
-        source_table = join_parts[-1].split('.')[0]
-        target_table = join_parts[-3].split('.')[0]
-        lineage["edges"].append({"from": source_table, "to": target_table, "label": join})
-    
-    return lineage
-
-# Read SQL from file named after the target table
-target_table = 'target_table_name'  # Replace with your target table name
-sql_file_path = f"{target_table}.sql"
-
-if os.path.exists(sql_file_path):
-    with open(sql_file_path, 'r') as file:
-        sql_query = file.read()
-        parsed_sql = sqlglot.parse_one(sql_query)
-        sql_details = extract_sql_details(parsed_sql)
-        lineage = create_lineage(sql_details, target_table)
-        
-        # Convert the lineage to JSON
-        lineage_json = json.dumps(lineage, indent=4)
-        print(lineage_json)
-else:
-    print(f"No SQL file found for the target table: {target_table}")
+    ctes = _cte_names(sql_expression)
+    aliases = _alias_map(sql_expression)
+    tables = []
+    columns = []
+    join_logic = []
+
+    for table_exp in _tables(sql_expression, ctes):
+        tables.append(exp.table_name(table_exp))
+
+    for column in sql_expression.find_all(exp.Column):
+        if column.table and column.table not in aliases and column.table in ctes:
+            continue  # a column of a CTE, not of a table
+        columns.append(f"{_column_table(column, aliases)}.{column.name}")
+
+    column_logic = [str(projection) for select in sql_expression.find_all(exp.Select)
+                    for projection in select.expressions]
+
+    where_conditions = [str(where) for where in sql_expression.find_all(exp.Where)]
+
+    for join in sql_expression.find_all(exp.Join):
+        join_type = join.args.get('kind')
+        join_condition = str(join.args.get('on'))
+        join_logic.append(f"{join_type} JOIN ON {join_condition}")
+
+    target = sql_expression.this if isinstance(sql_expression, exp.Insert) else None
+    if isinstance(target, exp.Schema):
+        target = target.this
+
+    sql_details = {
+        "tables": tables,
+        "columns": columns,
+        "column_logic": column_logic,
+        "where_conditions": where_conditions,
+        "join_logic": join_logic,
+        "join_edges": extract_join_edges(sql_expression, aliases),
+        "target_table": exp.table_name(target) if isinstance(target, exp.Table) else None,
+    }
+
+    return sql_details
+
+
+class LineageGraphBuilder:
+    def __init__(self, output):
+        """
+        :param output: text file object the JSON graph is streamed to
+        """
+        self.output = output
+        self._ids = {}       # node name -> id
+        self._labels = {}    # edge label -> small int, for compact edge keys
+        self._edges = set()  # (from, to, type, label code)
+        self._spool = tempfile.TemporaryFile("w+", encoding="utf-8")
+        self._encode = json.JSONEncoder(separators=(",", ":")).encode
+        self.output.write('{"nodes":[')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self._spool.close()
+
+    @property
+    def node_count(self):
+        return len(self._ids)
+
+    @property
+    def edge_count(self):
+        return len(self._edges)
+
+    def node(self, name: str, label: str, node_type: str) -> int:
+        """
+        Id of the node called name, writing it out the first time.
+        """
+        node_id = self._ids.get(name)
+        if node_id is None:
+            node_id = self._ids[name] = len(self._ids)
+            prefix = "," if node_id else ""
+            self.output.write(prefix + self._encode(
+                {"id": node_id, "name": name, "label": label, "type": node_type}))
+        return node_id
+
+    def edge(self, source: int, target: int, edge_type: str, label: str = None):
+        """
+        Spool the edge unless the same one was already added.
+        """
+        code = self._labels.setdefault(label, len(self._labels))
+        key = (source, target, edge_type, code)
+        if key in self._edges:
+            return
+        self._edges.add(key)
+        edge = {"from": source, "to": target, "type": edge_type}
+        if label is not None:
+            edge["label"] = label
+        self._spool.write(("," if len(self._edges) > 1 else "") + self._encode(edge))
+
+    def table(self, name: str) -> int:
+        return self.node(name, name, "table")
+
+    def add_statement(self, sql_details, target_table: str = None):
+        """
+        Add the tables, columns, joins and table lineage of one statement
+        (extract_sql_details output).
+        """
+        target_table = sql_details.get("target_table") or target_table
+        for table in sql_details["tables"]:
+            self.table(table)
+
+        for column in sql_details["columns"]:
+            table_name, _, column_name = column.rpartition('.')
+            self.edge(self.table(table_name), self.node(column, column_name, "column"), "column")
+
+        for left_table, left_column, right_table, right_column, kind, condition in sql_details["join_edges"]:
+            self.edge(self.table(left_table), self.table(right_table), "join", f"{kind}: {condition}")
+
+        if target_table:
+            target_id = self.table(target_table)
+            for table in sql_details["tables"]:
+                if table != target_table:
+                    self.edge(self.table(table), target_id, "lineage")
+
+    def close(self):
+        """
+        Append the spooled edges and finish the JSON document.
+        """
+        self.output.write('],"edges":[')
+        self._spool.seek(0)
+        for chunk in iter(lambda: self._spool.read(1 << 20), ""):
+            self.output.write(chunk)
+        self._spool.close()
+        self.output.write("]}\n")
+
+
+def create_lineage(sql_details, target_table, builder=None):
+    """
+    Graph of one statement's details; pass a LineageGraphBuilder to add
+    them to a larger (streamed) graph instead.
+    """
+    if builder is not None:
+        builder.add_statement(sql_details, target_table)
+        return builder
+
+    with tempfile.TemporaryFile("w+", encoding="utf-8") as f:
+        with LineageGraphBuilder(f) as graph:
+            graph.add_statement(sql_details, target_table)
+        f.seek(0)
+        return json.load(f)
+
+
+def build_project_graph(paths, output, dialect: str = None):
+    """
+    Stream the graph of every statement of every file in paths to output.
+    The target table of a file without an INSERT is the file's name.
+    Returns (builder, [(path, statement_no, error)]).
+    """
+    errors = []
+    with LineageGraphBuilder(output) as builder:
+        for path in paths:
+            default_target = os.path.splitext(os.path.basename(path))[0]
+            with open(path, 'r', encoding='utf-8', errors='replace') as file:
+                for statement_no, _, sql in iter_statements(file, dialect):
+                    try:
+                        parsed_sql = sqlglot.parse_one(sql, read=dialect)
+                    except sqlglot.errors.SqlglotError as e:
+                        errors.append((path, statement_no, str(e).splitlines()[0]))
+                        continue
+                    if parsed_sql is None:
+                        continue
+                    create_lineage(extract_sql_details(parsed_sql), default_target, builder)
+    return builder, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Write the table/column/join graph of SQL files as compact JSON"
+    )
+    parser.add_argument("sql_files", nargs="*",
+                        help="SQL files; each file's name is its default target table.")
+    parser.add_argument("--sql-dir", default=None,
+                        help="Directory of SQL files (searched recursively).")
+    parser.add_argument("--pattern", default="**/*.sql",
+                        help="Glob under --sql-dir (default: **/*.sql).")
+    parser.add_argument("--dialect", default=None,
+                        help="sqlglot dialect to parse with (default: sqlglot's generic dialect).")
+    parser.add_argument("--output", default=None,
+                        help="Output JSON file (default: standard output).")
+    args = parser.parse_args()
+
+    paths = list(args.sql_files)
+    if args.sql_dir:
+        paths.extend(find_sql_files(args.sql_dir, args.pattern))
+    if not paths:
+        print("ERROR: no SQL files given", file=sys.stderr)
+        sys.exit(1)
+
+    output = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+    try:
+        builder, errors = build_project_graph(paths, output, args.dialect)
+    except OSError as e:
+        print(f"ERROR reading SQL: {e}", file=sys.stderr)
+        sys.exit(1)
+    finally:
+        if args.output:
+            output.close()
+
+    for path, statement_no, error in errors:
+        print(f"WARNING {path} statement {statement_no}: {error}", file=sys.stderr)
+    print(f"{builder.node_count} nodes, {builder.edge_count} edges from {len(paths)} file(s)",
+          file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
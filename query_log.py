@@ -0,0 +1,383 @@
+#!/usr/bin/env python3
+"""
+query_log.py
+
+Column lineage from captured production SQL (V$SQL / AWR / audit
+extracts) instead of checked-in scripts.
+
+Captured statements are mostly the same few thousand queries with
+different literals and bind values, so every statement is first
+normalized and fingerprinted:
+
+  * the statement is tokenized with sqlglot (in the log's dialect) and
+    rebuilt from its tokens with canonical spacing, so comments, layout
+    and spacing around operators (a=1 / a = 1) do not matter
+  * string literals (including Oracle q'[...]' literals), numbers and bind
+    variables (:name, :1, ?, @p, $1) become ?
+  * IN / VALUES lists of placeholders collapse to a single (?)
+  * everything outside quoted identifiers is upper-cased
+
+Text sqlglot cannot tokenize falls back to a regex normalization.
+
+Lineage is then extracted once per fingerprint, from the first statement
+seen with it, and every fingerprint keeps its execution count (the
+EXECUTIONS column if the extract has one, else one per captured row).
+The output has the per-fingerprint lineage (Lineage), the distinct
+fingerprints (Fingerprints), and the lineage edges weighted by executions
+(Edges), plus statements that failed (Errors).
+
+Input formats: CSV / CSV.gz, Parquet, JSON Lines (.jsonl / .jsonl.gz)
+with a SQL_FULLTEXT / SQL_TEXT / SQL column, or a plain .sql script.
+
+Usage:
+    python query_log.py --log v_sql.csv --dialect oracle --output query_lineage.xlsx
+    python query_log.py --log awr.parquet --sql-column SQL_TEXT --count-column EXECUTIONS_DELTA --workers 8
+
+Dependencies:
+    pip install sqlglot pandas openpyxl
+    pip install pyarrow    (only for Parquet input or output)
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import multiprocessing
+import re
+import sys
+from functools import lru_cache
+
+import pandas as pd
+from sqlglot.dialects import Dialect
+from sqlglot.errors import TokenError
+from sqlglot.tokens import TokenType
+
+import sql_lineage
+from lineage_writers import WRITERS, open_writer
+from sql_lineage import _error_message, _init_batch_worker, _with_leading
+from sql_statements import iter_statements
+
+# Column names tried, in order, when --sql-column / --count-column are not given
+SQL_COLUMNS = ("SQL_FULLTEXT", "SQL_TEXT", "SQL", "STATEMENT", "QUERY")
+COUNT_COLUMNS = ("EXECUTIONS", "EXECUTIONS_DELTA", "EXECUTIONS_TOTAL", "EXEC_COUNT", "COUNT")
+
+FINGERPRINT_COLUMNS = ["fingerprint", "executions", "occurrences", "normalized_sql"]
+EDGE_COLUMNS = ["source_table", "source_column", "target_table", "target_column",
+                "executions", "fingerprints"]
+
+_TOKEN_RE = re.compile(
+    r"""
+      (?P<comment>--[^\n]*|/\*.*?\*/)
+    | (?P<qstring>[nN]?[qQ]'(?:\[.*?\]|\(.*?\)|\{.*?\}|<.*?>|(?P<q>[^\s\[({<]).*?(?P=q))')
+    | (?P<string>[nN]?'(?:[^']|'')*')
+    | (?P<ident>"(?:[^"]|"")*")
+    | (?P<bind>:\w+|\?|@\w+|\$\d+)
+    | (?P<number>(?<![\w.])(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?(?![\w]))
+    | (?P<space>\s+)
+    """,
+    re.DOTALL | re.VERBOSE
+)
+
+_PLACEHOLDER_LIST_RE = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+
+# sqlglot tokens that are literal values
+_LITERAL_TOKENS = frozenset(
+    getattr(TokenType, name) for name in (
+        "STRING", "NATIONAL_STRING", "RAW_STRING", "HEREDOC_STRING", "BIT_STRING",
+        "HEX_STRING", "BYTE_STRING", "UNICODE_STRING", "NUMBER", "PLACEHOLDER")
+    if hasattr(TokenType, name)
+)
+# Bind markers tokenized apart from the name / position that follows (:name, :1, @p, $1)
+_BIND_PREFIX_TOKENS = frozenset((TokenType.COLON, TokenType.PARAMETER))
+_NO_SPACE_BEFORE = frozenset((TokenType.COMMA, TokenType.R_PAREN, TokenType.DOT, TokenType.R_BRACKET))
+_NO_SPACE_AFTER = frozenset((TokenType.L_PAREN, TokenType.DOT, TokenType.L_BRACKET))
+
+
+@lru_cache(maxsize=None)
+def _tokenizer(dialect: str):
+    try:
+        return Dialect.get_or_raise(dialect or None).tokenizer_class()
+    except ValueError:
+        # Unknown names (e.g. "default") tokenize generically
+        return Dialect.get_or_raise(None).tokenizer_class()
+
+
+def normalize_sql(sql: str, dialect: str = None) -> str:
+    """
+    Literal- and bind-free, case- and whitespace-normalized form of a
+    statement, rebuilt from its sqlglot tokens (see the module docstring).
+    """
+    # sqlglot does not tokenize Oracle q'[...]' literals: make them plain ones first
+    text = _TOKEN_RE.sub(lambda m: "''" if m.lastgroup in ("qstring", "q") else m.group(), sql)
+    try:
+        tokens = _tokenizer(dialect).tokenize(text)
+    except TokenError:
+        return _normalize_text(sql)
+    while tokens and tokens[-1].token_type == TokenType.SEMICOLON:
+        tokens.pop()
+
+    parts = []
+    previous = None
+    i = 0
+    while i < len(tokens):
+        token = tokens[i]
+        kind = token.token_type
+        following = tokens[i + 1] if i + 1 < len(tokens) else None
+        if (kind in _BIND_PREFIX_TOKENS and following is not None
+                and following.token_type in (TokenType.VAR, TokenType.NUMBER)
+                and following.start == token.end + 1):
+            piece = "?"
+            i += 1
+        elif kind in _LITERAL_TOKENS or (kind == TokenType.VAR and token.text[:1] == "$"
+                                         and token.text[1:].isdigit()):
+            piece = "?"
+        elif kind == TokenType.IDENTIFIER:
+            piece = '"' + token.text.replace('"', '""') + '"'
+        else:
+            piece = token.text.upper()
+        call = kind == TokenType.L_PAREN and previous == TokenType.VAR
+        if parts and not call and kind not in _NO_SPACE_BEFORE and previous not in _NO_SPACE_AFTER:
+            parts.append(" ")
+        parts.append(piece)
+        previous = kind
+        i += 1
+    return _PLACEHOLDER_LIST_RE.sub("(?)", "".join(parts))
+
+
+def _normalize_text(sql: str) -> str:
+    """
+    normalize_sql() for text sqlglot cannot tokenize: the same
+    replacements on the raw text, with whitespace collapsed.
+    """
+    parts = []
+    pos = 0
+    for m in _TOKEN_RE.finditer(sql):
+        parts.append(sql[pos:m.start()].upper())
+        pos = m.end()
+        kind = m.lastgroup
+        if kind in ("comment", "space"):
+            parts.append(" ")
+        elif kind == "ident":
+            parts.append(m.group())
+        else:
+            # lastgroup is "q" for q'X...X' literals closed by the same character
+            parts.append("?")
+    parts.append(sql[pos:].upper())
+    text = " ".join("".join(parts).split())
+    text = _PLACEHOLDER_LIST_RE.sub("(?)", text)
+    return text.rstrip(" ;")
+
+
+def fingerprint_sql(sql: str, dialect: str = None):
+    """
+    (fingerprint, normalized_sql): the fingerprint is a short hash of the
+    normalized text, equal for statements that only differ in literals,
+    bind values, comments, case, layout or spacing.
+    """
+    normalized = normalize_sql(sql, dialect)
+    return hashlib.sha1(normalized.encode("utf-8")).hexdigest()[:16], normalized
+
+
+def _pick_column(columns, wanted: str, candidates):
+    by_upper = {str(c).upper(): c for c in columns}
+    if wanted:
+        if wanted.upper() not in by_upper:
+            raise ValueError(f"Column {wanted} not found (columns: {', '.join(map(str, columns))})")
+        return by_upper[wanted.upper()]
+    for name in candidates:
+        if name in by_upper:
+            return by_upper[name]
+    return None
+
+
+def _open_text(path: str):
+    if path.lower().endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8")
+    return open(path, "r", encoding="utf-8")
+
+
+def iter_query_log(path: str, sql_column: str = None, count_column: str = None,
+                   chunksize: int = 100000, dialect: str = None):
+    """
+    Stream (sql_text, executions) pairs from a captured-SQL extract,
+    chunk by chunk, so extracts with millions of rows fit in memory.
+    A .sql script is split into statements in dialect.
+    """
+    lower = path.lower()
+    if lower.endswith(".sql"):
+        with _open_text(path) as f:
+            for _, _, text in iter_statements(f, dialect):
+                yield text, 1
+        return
+
+    if lower.endswith((".jsonl", ".jsonl.gz", ".ndjson")):
+        sql_key = count_key = None
+        with _open_text(path) as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                if sql_key is None:
+                    sql_key = _pick_column(record, sql_column, SQL_COLUMNS)
+                    count_key = _pick_column(record, count_column, COUNT_COLUMNS)
+                    if sql_key is None:
+                        raise ValueError(f"No SQL text field in {path}; use --sql-column")
+                yield record.get(sql_key), int(record.get(count_key) or 1) if count_key else 1
+        return
+
+    if lower.endswith(".parquet"):
+        import pyarrow.parquet as pq
+        parquet = pq.ParquetFile(path)
+        names = parquet.schema_arrow.names
+        sql_key = _pick_column(names, sql_column, SQL_COLUMNS)
+        count_key = _pick_column(names, count_column, COUNT_COLUMNS)
+        if sql_key is None:
+            raise ValueError(f"No SQL text column in {path}; use --sql-column")
+        columns = [sql_key] + ([count_key] if count_key else [])
+        chunks = (batch.to_pandas() for batch in parquet.iter_batches(chunksize, columns=columns))
+    else:
+        chunks = pd.read_csv(path, dtype=str, keep_default_na=False, chunksize=chunksize)
+        sql_key = count_key = None
+
+    for chunk in chunks:
+        if sql_key is None:
+            sql_key = _pick_column(chunk.columns, sql_column, SQL_COLUMNS)
+            count_key = _pick_column(chunk.columns, count_column, COUNT_COLUMNS)
+            if sql_key is None:
+                raise ValueError(f"No SQL text column in {path}; use --sql-column")
+        texts = chunk[sql_key].tolist()
+        if count_key:
+            counts = pd.to_numeric(chunk[count_key], errors="coerce").fillna(1).astype("int64").tolist()
+        else:
+            counts = [1] * len(texts)
+        yield from zip(texts, counts)
+
+
+def fingerprint_log(statements, dialect: str = None):
+    """
+    Group (sql_text, executions) pairs by fingerprint (statements are
+    tokenized in dialect).
+
+    Returns {fingerprint: [sample_sql, normalized_sql, executions, occurrences]},
+    the sample being the first statement seen with that fingerprint.
+    """
+    groups = {}
+    for text, executions in statements:
+        if not text or not str(text).strip():
+            continue
+        fp, normalized = fingerprint_sql(text, dialect)
+        group = groups.get(fp)
+        if group is None:
+            groups[fp] = [text, normalized, executions, 1]
+        else:
+            group[2] += executions
+            group[3] += 1
+    return groups
+
+
+def _extract_fingerprint(task):
+    """
+    Worker: lineage of one fingerprint's sample statement. Never raises.
+    """
+    fp, sql = task
+    try:
+        return fp, sql_lineage._batch_extractor.extract(sql)[0], None
+    except Exception as e:
+        return fp, None, _error_message(e)
+
+
+def write_query_log_lineage(groups: dict, writer, dialect: str = None, workers: int = None,
+                            cache_dir: str = None, cache_bytes: int = None, catalog_path: str = None):
+    """
+    Extract lineage once per fingerprint (in a process pool) and stream it
+    into a lineage_writers writer: Lineage rows lead with fingerprint and
+    executions, then Fingerprints, Edges (weighted by executions) and
+    Errors. Returns the number of fingerprints that failed.
+    """
+    failed = 0
+    # (source_table, source_column, target_table, target_column) -> [executions, fingerprints]
+    edges = {}
+    tasks = [(fp, group[0]) for fp, group in groups.items()]
+    with multiprocessing.Pool(processes=workers,
+                              initializer=_init_batch_worker,
+                              initargs=(dialect, cache_dir, cache_bytes, None, catalog_path)) as pool:
+        for fp, lineage_df, error in pool.imap_unordered(_extract_fingerprint, tasks, chunksize=16):
+            executions = groups[fp][2]
+            if error is not None:
+                failed += 1
+                writer.write("Errors", pd.DataFrame([{"fingerprint": fp, "executions": executions,
+                                                      "error": error}]))
+                continue
+            if lineage_df.empty:
+                continue
+            writer.write("Lineage", _with_leading(lineage_df, {"fingerprint": fp, "executions": executions}))
+            keys = set(zip(lineage_df["source_table"], lineage_df["source_column"],
+                           lineage_df["target_table"], lineage_df["target_column"]))
+            for key in keys:
+                weight = edges.setdefault(key, [0, 0])
+                weight[0] += executions
+                weight[1] += 1
+
+    writer.write("Fingerprints", pd.DataFrame(
+        [[fp, group[2], group[3], group[1]] for fp, group in groups.items()],
+        columns=FINGERPRINT_COLUMNS
+    ).sort_values("executions", ascending=False))
+    writer.write("Edges", pd.DataFrame(
+        [key + tuple(weight) for key, weight in edges.items()],
+        columns=EDGE_COLUMNS
+    ).sort_values("executions", ascending=False))
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Extract column lineage from captured SQL, once per statement fingerprint"
+    )
+    parser.add_argument("--log", required=True,
+                        help="Captured SQL: CSV / CSV.gz, Parquet, JSON Lines or a .sql script.")
+    parser.add_argument("--sql-column", default=None,
+                        help=f"Column holding the SQL text (default: first of {', '.join(SQL_COLUMNS)}).")
+    parser.add_argument("--count-column", default=None,
+                        help=f"Column holding execution counts (default: first of {', '.join(COUNT_COLUMNS)}; "
+                             "without one every row counts once).")
+    parser.add_argument("--dialect", default=None,
+                        help="SQL dialect for parsing (default: generic).")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Worker processes for extraction (default: CPU count).")
+    parser.add_argument("--catalog", default=None,
+                        help="Schema catalog for unqualified columns and * expansion (see schema_catalog.py).")
+    parser.add_argument("--format", choices=list(WRITERS), default="xlsx",
+                        help="Output format (default: xlsx).")
+    parser.add_argument("--output", default=None,
+                        help="Output path (default: query_lineage.xlsx / query_lineage_output).")
+    parser.add_argument("--cache-dir", default=".sql_lineage_cache",
+                        help="Directory for the on-disk lineage cache (default: .sql_lineage_cache).")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Always re-parse; neither read nor write the cache.")
+    args = parser.parse_args()
+
+    output = args.output or ("query_lineage.xlsx" if args.format == "xlsx" else "query_lineage_output")
+    try:
+        groups = fingerprint_log(iter_query_log(args.log, args.sql_column, args.count_column,
+                                              dialect=args.dialect), args.dialect)
+    except (OSError, ValueError) as e:
+        print(f"ERROR reading query log: {e}", file=sys.stderr)
+        sys.exit(1)
+    statements = sum(group[3] for group in groups.values())
+    print(f"{statements} statements, {len(groups)} distinct fingerprints", file=sys.stderr)
+
+    with open_writer(args.format, output) as writer:
+        failed = write_query_log_lineage(
+            groups,
+            writer,
+            dialect=args.dialect,
+            workers=args.workers,
+            cache_dir=None if args.no_cache else args.cache_dir,
+            cache_bytes=512 * 1024 * 1024,
+            catalog_path=args.catalog
+        )
+    print(f"Lineage for {len(groups)} fingerprints written to {output} ({failed} errors)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+"""
+schema_catalog.py
+
+In-memory schema catalog for column resolution in sql_lineage.py.
+
+Loads a column dictionary export -- Oracle ALL_TAB_COLUMNS (OWNER,
+TABLE_NAME, COLUMN_NAME[, COLUMN_ID]) as CSV / CSV.gz / Parquet, or a JSON
+dump (a list of such records, or {"OWNER.TABLE": [columns, ...]}) -- and
+indexes it by table name, so SQLLineageExtractor can qualify unqualified
+columns and expand SELECT * / t.*.
+
+The catalog can be saved in a compact binary form (.npz): every distinct
+name stored once in a single string blob, plus int32 arrays of name ids
+per table and a CSR index from tables to their columns. Loading one only
+decodes the blob and hashes the table names; per-table column sets are
+built lazily on first use, so a 2M-column catalog opens in a fraction of
+a second.
+
+Name lookups are case-insensitive (Oracle stores unquoted names upper
+case). A table name that exists under several owners resolves to the
+alphabetically first owner unless the owner is given.
+
+Usage:
+    python schema_catalog.py build all_tab_columns.csv --output catalog.npz
+    python schema_catalog.py show catalog.npz HR.EMPLOYEES
+
+Dependencies:
+    pip install numpy pandas
+    pip install pyarrow    (only for Parquet exports)
+"""
+
+import argparse
+import hashlib
+import json
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+# Bumped if the .npz layout changes
+FORMAT_VERSION = 1
+
+
+def _find_column(df: pd.DataFrame, name: str, required: bool = True):
+    for column in df.columns:
+        if str(column).upper() == name:
+            return column
+    if required:
+        raise ValueError(f"Catalog export has no {name} column (columns: {', '.join(map(str, df.columns))})")
+    return None
+
+
+class SchemaCatalog:
+    def __init__(self, names, table_owner, table_name, indptr, column_name, fingerprint: str = None):
+        """
+        Low-level constructor; use SchemaCatalog.load() or from_frame().
+
+        :param names:       distinct names; the arrays below hold indexes into it
+        :param table_owner: name id of each table's owner (-1: none)
+        :param table_name:  name id of each table
+        :param indptr:      table i's columns are column_name[indptr[i]:indptr[i + 1]]
+        :param column_name: name id of every column, in COLUMN_ID order per table
+        """
+        self.names = names
+        self.table_owner = table_owner
+        self.table_name = table_name
+        self.indptr = indptr
+        self.column_name = column_name
+        self.fingerprint = fingerprint or self._fingerprint()
+        self.num_tables = len(table_name)
+        self.num_columns = len(column_name)
+
+        # TABLE -> [(OWNER, table id), ...], sorted by owner
+        self._tables = {}
+        upper = [n.upper() for n in names]
+        for tid, (owner, table) in enumerate(zip(table_owner.tolist(), table_name.tolist())):
+            self._tables.setdefault(upper[table], []).append((upper[owner] if owner >= 0 else "", tid))
+        for entries in self._tables.values():
+            entries.sort()
+        self._column_sets = {}
+
+    @classmethod
+    def load(cls, path: str):
+        """
+        Load a catalog: .npz (saved with save()), .parquet, .json, or
+        CSV (anything else, gzip allowed).
+        """
+        lower = path.lower()
+        if lower.endswith(".npz"):
+            return cls._load_binary(path)
+        if lower.endswith(".parquet"):
+            return cls.from_frame(pd.read_parquet(path))
+        if lower.endswith(".json"):
+            with open(path, "r", encoding="utf-8") as f:
+                return cls.from_json(json.load(f))
+        return cls.from_frame(pd.read_csv(path, dtype=str, keep_default_na=False))
+
+    @classmethod
+    def from_json(cls, data):
+        """
+        data: a list of ALL_TAB_COLUMNS-style records, or a mapping of
+        "OWNER.TABLE" (or "TABLE") to its ordered column names.
+        """
+        if isinstance(data, dict):
+            rows = []
+            for qualified, columns in data.items():
+                owner, _, table = qualified.rpartition(".")
+                rows.extend((owner, table, column, position)
+                            for position, column in enumerate(columns, 1))
+            data = pd.DataFrame(rows, columns=["OWNER", "TABLE_NAME", "COLUMN_NAME", "COLUMN_ID"])
+        return cls.from_frame(pd.DataFrame(data))
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame):
+        """
+        Build from a DataFrame with TABLE_NAME and COLUMN_NAME columns and
+        optionally OWNER and COLUMN_ID (any case).
+        """
+        table_col = _find_column(df, "TABLE_NAME")
+        column_col = _find_column(df, "COLUMN_NAME")
+        owner_col = _find_column(df, "OWNER", required=False)
+        id_col = _find_column(df, "COLUMN_ID", required=False)
+
+        frame = pd.DataFrame({
+            "owner": df[owner_col].fillna("").astype(str) if owner_col is not None else "",
+            "table": df[table_col].astype(str),
+            "column": df[column_col].astype(str),
+            "position": pd.to_numeric(df[id_col], errors="coerce") if id_col is not None
+            else np.arange(len(df)),
+        })
+        frame = frame.sort_values(["owner", "table", "position"], kind="stable")
+
+        codes, names = pd.factorize(pd.concat([frame["owner"], frame["table"], frame["column"]],
+                                              ignore_index=True))
+        n = len(frame)
+        owner_ids, table_ids, column_ids = codes[:n], codes[n:2 * n], codes[2 * n:]
+        empty = np.flatnonzero(names == "")
+        if len(empty):
+            owner_ids = np.where(owner_ids == empty[0], -1, owner_ids)
+
+        # One table per (owner, table) run of the sorted rows
+        if n:
+            starts = np.flatnonzero(np.r_[True, (owner_ids[1:] != owner_ids[:-1])
+                                          | (table_ids[1:] != table_ids[:-1])])
+        else:
+            starts = np.zeros(0, dtype=np.int64)
+        indptr = np.r_[starts, n].astype(np.int64)
+        return cls(list(names),
+                   owner_ids[starts].astype(np.int32),
+                   table_ids[starts].astype(np.int32),
+                   indptr,
+                   column_ids.astype(np.int32))
+
+    def save(self, path: str):
+        """
+        Write the compact binary form (numpy .npz, uncompressed).
+        """
+        blob = "\n".join(self.names).encode("utf-8")
+        np.savez(path,
+                 format_version=np.array([FORMAT_VERSION]),
+                 fingerprint=np.frombuffer(self.fingerprint.encode("ascii"), dtype=np.uint8),
+                 names=np.frombuffer(blob, dtype=np.uint8),
+                 table_owner=self.table_owner,
+                 table_name=self.table_name,
+                 indptr=self.indptr,
+                 column_name=self.column_name)
+
+    @classmethod
+    def _load_binary(cls, path: str):
+        with np.load(path) as data:
+            if int(data["format_version"][0]) != FORMAT_VERSION:
+                raise ValueError(f"{path}: unsupported catalog format version "
+                                 f"{int(data['format_version'][0])}; rebuild it")
+            blob = data["names"].tobytes().decode("utf-8")
+            return cls(blob.split("\n") if blob else [],
+                       data["table_owner"], data["table_name"],
+                       data["indptr"], data["column_name"],
+                       fingerprint=data["fingerprint"].tobytes().decode("ascii"))
+
+    def _fingerprint(self):
+        h = hashlib.sha256()
+        h.update("\n".join(self.names).encode("utf-8"))
+        for array in (self.table_owner, self.table_name, self.indptr, self.column_name):
+            h.update(np.ascontiguousarray(array).tobytes())
+        return h.hexdigest()[:16]
+
+    def _table_id(self, table: str, owner: str = None):
+        entries = self._tables.get(table.upper())
+        if not entries:
+            return None
+        if owner:
+            owner = owner.upper()
+            for entry_owner, tid in entries:
+                if entry_owner == owner:
+                    return tid
+            return None
+        return entries[0][1]
+
+    def has_table(self, table: str, owner: str = None) -> bool:
+        return self._table_id(table, owner) is not None
+
+    def columns(self, table: str, owner: str = None):
+        """
+        Column names of a table in COLUMN_ID order, or None if unknown.
+        """
+        tid = self._table_id(table, owner)
+        if tid is None:
+            return None
+        start, end = self.indptr[tid], self.indptr[tid + 1]
+        return [self.names[i] for i in self.column_name[start:end].tolist()]
+
+    def has_column(self, table: str, column: str, owner: str = None) -> bool:
+        tid = self._table_id(table, owner)
+        if tid is None:
+            return False
+        column_set = self._column_sets.get(tid)
+        if column_set is None:
+            start, end = self.indptr[tid], self.indptr[tid + 1]
+            column_set = self._column_sets[tid] = frozenset(
+                self.names[i].upper() for i in self.column_name[start:end].tolist())
+        return column.upper() in column_set
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Build or inspect a schema catalog for sql_lineage.py --catalog"
+    )
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    build = sub.add_parser("build", help="Convert an ALL_TAB_COLUMNS export to the binary form.")
+    build.add_argument("export", help="CSV / CSV.gz / Parquet / JSON export.")
+    build.add_argument("--output", default="catalog.npz", help="Binary catalog to write.")
+
+    show = sub.add_parser("show", help="List the columns of a table.")
+    show.add_argument("catalog", help="Catalog file (any supported format).")
+    show.add_argument("table", metavar="[OWNER.]TABLE")
+
+    args = parser.parse_args()
+
+    if args.command == "build":
+        start = time.perf_counter()
+        catalog = SchemaCatalog.load(args.export)
+        catalog.save(args.output)
+        print(f"{catalog.num_tables} tables / {catalog.num_columns} columns written to "
+              f"{args.output} in {time.perf_counter() - start:.2f}s")
+        return
+
+    start = time.perf_counter()
+    catalog = SchemaCatalog.load(args.catalog)
+    elapsed = time.perf_counter() - start
+    owner, _, table = args.table.rpartition(".")
+    columns = catalog.columns(table, owner or None)
+    if columns is None:
+        print(f"ERROR: {args.table} is not in the catalog", file=sys.stderr)
+        sys.exit(1)
+    for column in columns:
+        print(column)
+    print(f"{len(columns)} columns (catalog loaded in {elapsed * 1000:.0f} ms)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,7 @@
 // Function to fetch JSON data and initialize the lineage visualization
 function fetchDataAndInitialize() {
-    fetch('data.json')
+    // Query parameters (e.g. ?root=SALES.ORDERS) are passed on to lineage_server.py
+    fetch('data.json' + window.location.search)
         .then(response => response.json())
         .then(data => {
             window.currentData = data; // Store data globally for expand/collapse functions
@@ -32,7 +33,7 @@ function createNodesAndLinks(data) {
         nodesMap.set(node.id, nodeEl);
 
         // Position node
-        const nodeLevel = nodeLevels[node.id];
+        const nodeLevel = nodeLevels[node.id] || 0;
         if (!nodePosition[nodeLevel]) {
             nodePosition[nodeLevel] = 0;
         }
@@ -51,6 +52,11 @@ function createNodesAndLinks(data) {
         const collapseExpandEl = document.createElement('span');
         collapseExpandEl.innerText = node.expanded ? '-' : '+';
         collapseExpandEl.addEventListener('click', () => {
+            if (node.lazy && !node.expanded) {
+                node.expanded = true;
+                loadNeighborhood(node, 0);
+                return;
+            }
             node.expanded = !node.expanded;
             collapseExpandEl.innerText = node.expanded ? '-' : '+';
             columnsEl.style.display = node.expanded ? 'block' : 'none';
@@ -58,6 +64,14 @@ function createNodesAndLinks(data) {
         });
 
         actionsEl.appendChild(collapseExpandEl);
+        if (node.nextPage != null) {
+            // More of this node's neighborhood is available from the server
+            const moreEl = document.createElement('span');
+            moreEl.innerText = ' \u2026';
+            moreEl.title = 'Load more';
+            moreEl.addEventListener('click', () => loadNeighborhood(node, node.nextPage));
+            actionsEl.appendChild(moreEl);
+        }
         titleEl.appendChild(actionsEl);
 
         const columnsEl = document.createElement('ul');
@@ -82,11 +96,54 @@ function createNodesAndLinks(data) {
     drawLinks(data, nodesMap);
 }
 
+// Function to fetch one page of a node's neighborhood from lineage_server.py and merge it
+function loadNeighborhood(node, page) {
+    fetch(`data.json?root=${encodeURIComponent(node.id)}&page=${page}`)
+        .then(response => response.json())
+        .then(data => {
+            mergeData(window.currentData, data);
+            node.lazy = false;
+            node.nextPage = data.next_page;
+            createNodesAndLinks(window.currentData);
+        })
+        .catch(error => console.error('Error loading neighborhood:', error));
+}
+
+// Function to merge fetched nodes and links into the current data
+function mergeData(current, data) {
+    const nodesById = new Map(current.nodes.map(n => [n.id, n]));
+    data.nodes.forEach(node => {
+        const existing = nodesById.get(node.id);
+        if (!existing) {
+            current.nodes.push(node);
+            nodesById.set(node.id, node);
+            return;
+        }
+        node.columns.forEach(col => {
+            if (!existing.columns.includes(col)) {
+                existing.columns.push(col);
+            }
+        });
+    });
+    const linkKey = link => `${link.source.node}|${link.source.column}|${link.target.node}|${link.target.column}`;
+    const linkKeys = new Set(current.links.map(linkKey));
+    data.links.forEach(link => {
+        if (!linkKeys.has(linkKey(link))) {
+            current.links.push(link);
+            linkKeys.add(linkKey(link));
+        }
+    });
+}
+
 // Function to calculate the levels of each node
 function calculateNodeLevels(links) {
     const nodeLevels = {};
 
     function setNodeLevel(nodeId, level) {
+        // A path longer than the number of links means a cycle: stop there
+        if (level > links.length) {
+            return;
+        }
         if (nodeLevels[nodeId] == null || nodeLevels[nodeId] < level) {
             nodeLevels[nodeId] = level;
             links.filter(link => link.source.node === nodeId)
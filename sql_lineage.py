@@ -4,109 +4,409 @@ sql_lineage_extractor.py
 
 A self‑contained script to extract column‑level lineage, filters, and joins
 from any complex SQL (INSERT or SELECT), including WITH/CTE support, for a
-specified SQL dialect, and write the results to an Excel workbook.
+specified SQL dialect, and write the results to an Excel workbook
+(or, with --format, to Parquet, CSV.gz or JSON Lines; see lineage_writers.py).
+Output is written incrementally as statements are processed.
+
+A whole directory of scripts can be processed in one run with --sql-dir;
+files are fanned out over a process pool and consolidated into a single
+workbook with a source_file column plus an Errors sheet.
+
+Results are cached on disk (see lineage_cache.py) keyed by the normalized
+SQL text, dialect and extractor version; pass --no-cache to disable.
+
+Files may hold whole deployment scripts: statements are split and parsed
+one at a time (see sql_statements.py), each result row carries its
+statement_no / statement_line, and a statement that fails to parse is
+reported in the Errors sheet without affecting the rest of the script.
+
+With --store, each file's lineage edges are also upserted into a local
+SQLite store (see lineage_store.py) that accumulates across runs.
+
+With --catalog, a schema catalog (ALL_TAB_COLUMNS export or its binary
+form, see schema_catalog.py) is used to attribute unqualified columns to
+the right table and to expand SELECT * / t.*.
+
+With --statement-timeout / --statement-memory-mb, every statement runs
+under a budget (see lineage_supervisor.py): one that exceeds it is
+interrupted, or its worker killed and replaced, and it is listed with its
+size stats in a Quarantine sheet while the rest of the batch carries on.
+
+With --profile, wall time and allocations are recorded per phase (parse,
+CTE resolution, projection walk, DataFrame build, write, ...) and per
+statement (see lineage_profile.py); the metrics are dumped as JSON and the
+slowest statements are listed.
 
 Dependencies:
     pip install sqlglot pandas openpyxl
+    pip install pyarrow    (only for --format parquet)
 """
 
 import argparse
+import glob
+import multiprocessing
+import os
 import sys
 
 import pandas as pd
 import sqlglot
 from sqlglot import parse_one, exp
 
+from lineage_cache import LineageCache
+from lineage_columns import ColumnarCollector
+from lineage_profile import LineageProfiler, NullProfiler
+from lineage_store import LineageStore, file_sha256
+from lineage_supervisor import QUARANTINE_COLUMNS, NullBudget, StatementBudget, SupervisedPool
+from lineage_writers import SHEETS, WRITERS, FrameCollector, TeeWriter, open_writer
+from schema_catalog import SchemaCatalog
+from sql_statements import iter_statements
+from transform_tree import TransformTreeBuilder
+
+
+# Output columns of the three DataFrames returned by SQLLineageExtractor.extract
+LINEAGE_COLUMNS = ["source_table", "source_column", "transformation_steps",
+                   "target_table", "target_column", "target_is_default"]
+FILTER_COLUMNS = ["predicate"]
+JOIN_COLUMNS = ["join_type", "condition"]
+
+# Leading columns added to every frame when a script is split into statements
+STATEMENT_COLUMNS = ["statement_no", "statement_line"]
+ERROR_COLUMNS = ["error"]
+
+
+def sheet_columns(leading):
+    """
+    Output sheet -> full column list, given the leading columns
+    (e.g. source_file, statement_no, statement_line).
+    """
+    return dict(zip(SHEETS, (leading + LINEAGE_COLUMNS,
+                             leading + FILTER_COLUMNS,
+                             leading + JOIN_COLUMNS,
+                             leading + ERROR_COLUMNS)))
+
+# Node types recorded as transformation steps
+TRANSFORM_TYPES = (exp.Func, exp.Cast, exp.Case, exp.If)
+
+# UNION / INTERSECT / EXCEPT (older sqlglot derives them all from Union)
+SET_OPERATION_TYPES = getattr(exp, "SetOperation", exp.Union)
+
+
+def _catalog_name(table: str):
+    """
+    (table, owner) of a possibly qualified table name, as SchemaCatalog
+    looks tables up; owner is None for an unqualified name.
+    """
+    owner, _, name = table.rpartition(".")
+    return name, owner.rpartition(".")[2] or None
+
+
+def _is_star(node: exp.Expression) -> bool:
+    """
+    True for a * or t.* projection.
+    """
+    return isinstance(node, exp.Star) or (isinstance(node, exp.Column) and isinstance(node.this, exp.Star))
+
 
 class SQLLineageExtractor:
-    def __init__(self, dialect: str = "default"):
+    # Bump whenever the shape or content of extract() results changes,
+    # so stale cache entries are never served
+    VERSION = "8"
+
+    def __init__(self, dialect: str = "default", cache: LineageCache = None,
+                 profiler: LineageProfiler = None, catalog: SchemaCatalog = None,
+                 budget: StatementBudget = None):
         """
-        :param dialect: SQL dialect (e.g. 'oracle', 'hive', 'tsql', 'mysql', 'postgres', ...)
+        :param dialect:  SQL dialect (e.g. 'oracle', 'hive', 'tsql', 'mysql', 'postgres', ...)
+        :param cache:    optional LineageCache; unchanged SQL is then served from disk
+        :param profiler: optional LineageProfiler collecting per-phase / per-statement metrics
+        :param catalog:  optional SchemaCatalog for unqualified columns and * expansion
+        :param budget:   optional StatementBudget limiting each statement of a script
         """
         self.dialect = dialect
+        self.cache = cache
+        self.profiler = profiler or NullProfiler()
+        self.catalog = catalog
+        self.budget = budget or NullBudget()
+        self._transforms = TransformTreeBuilder(dialect, TRANSFORM_TYPES)
+        # Results depend on the catalog too
+        self._cache_version = self.VERSION if catalog is None else f"{self.VERSION}+{catalog.fingerprint}"
         # Will hold CTE definitions: name -> SELECT AST
-        self.ctes = {}
+        self._reset_statement_state()
 
     def extract(self, sql: str, default_target: str = None):
         """
         Parse the SQL and return three pandas DataFrames:
           1. lineage_df: source→target column mappings + multi-step transform logic
+             (target_is_default is 1 when the target table is default_target)
           2. filters_df: all WHERE predicates
           3. joins_df: all JOIN conditions
 
         :param sql:       SQL statement (INSERT ... SELECT or raw SELECT, possibly with WITH)
         :param default_target: if no INSERT, use this as the "target table" (e.g. filename)
         """
-        # 1. Parse to AST
-        tree = parse_one(sql, read=self.dialect)
-
-        # 2. Extract any WITH / CTE definitions
-        with_expr = tree.find(exp.With)
-        if with_expr:
-            # Map each CTE alias -> its SELECT AST
-            for cte in with_expr.expressions:
-                # cte.alias is an exp.TableAlias; its name is the CTE name
-                alias = cte.alias_or_name
-                self.ctes[alias] = cte.this  # the SELECT (or other) expression
-            # The real query is the 'this' of the WITH node
-            tree = with_expr.this
-        else:
-            self.ctes = {}
+        if self.cache is None:
+            return self._extract(sql, default_target)
+
+        with self.profiler.phase("cache"):
+            key = LineageCache.make_key(sql, self.dialect, self._cache_version, default_target)
+            result = self.cache.get(key)
+        if result is None:
+            result = self._extract(sql, default_target)
+            with self.profiler.phase("cache"):
+                self.cache.put(key, result)
+        return result
+
+    def extract_statements(self, lines, default_target: str = None):
+        """
+        Stream a multi-statement script, one statement at a time.
 
-        # 3. Determine target table & columns
-        target_table, _ = self._find_target(tree, default_target)
+        :param lines: iterable of script lines, e.g. an open file; it is
+                      consumed incrementally so memory stays flat
+        Yields (statement_no, start_line, frames, error) per statement, where
+        frames is extract()'s (lineage_df, filters_df, joins_df), or None
+        with error set when the statement could not be processed.
+        """
+        profiler = self.profiler
+        statements = iter_statements(lines, self.dialect)
+        while True:
+            with profiler.phase("split"):
+                item = next(statements, None)
+            if item is None:
+                return
+            statement_no, start_line, text = item
+            try:
+                with profiler.statement(statement_no=statement_no, statement_line=start_line, sql=text), \
+                        self.budget.statement(statement_no=statement_no, statement_line=start_line, sql=text):
+                    frames = self.extract(text, default_target=default_target)
+            except Exception as e:
+                yield statement_no, start_line, None, _error_message(e)
+                continue
+            yield statement_no, start_line, frames, None
+
+    def write_script(self, lines, writer, default_target: str = None, leading: dict = None):
+        """
+        Stream a script's results into a lineage_writers writer, statement
+        by statement; nothing is accumulated across statements.
+
+        Rows of each sheet get leading statement_no / statement_line columns
+        (after any extra leading columns, e.g. {"source_file": path}).
+        Failed statements go to the "Errors" sheet. Returns their number.
+        """
+        failed = 0
+        for statement_no, start_line, frames, error in self.extract_statements(lines, default_target):
+            values = dict(leading or {}, statement_no=statement_no, statement_line=start_line)
+            with self.profiler.phase("write"):
+                if error is not None:
+                    failed += 1
+                    writer.write("Errors", pd.DataFrame([dict(values, error=error)]))
+                    continue
+                for sheet, df in zip(SHEETS, frames):
+                    if not df.empty:
+                        writer.write(sheet, _with_leading(df, values))
+        return failed
+
+    def extract_script(self, lines, default_target: str = None, columnar: bool = False):
+        """
+        Run write_script() into memory and return four DataFrames: lineage,
+        filters and joins, each with leading statement_no / statement_line
+        columns, and the per-statement errors.
 
-        # 4. Walk SELECT projections to build lineage
-        lineage_records = []
-        for select in tree.find_all(exp.Select):
-            for proj in select.expressions:
+        With columnar=True the four results are dictionary-encoded
+        lineage_columns.ColumnarBuffers instead (convert with to_pandas()
+        or to_arrow()), for scripts too large to hold as DataFrames.
+        """
+        columns = sheet_columns(STATEMENT_COLUMNS)
+        collector = ColumnarCollector(columns) if columnar else FrameCollector(columns)
+        self.write_script(lines, collector, default_target)
+        if columnar:
+            return tuple(collector.buffer(sheet) for sheet in SHEETS)
+        return tuple(collector.frame(sheet) for sheet in SHEETS)
+
+    def _extract(self, sql: str, default_target: str = None):
+        # 1. Parse to AST
+        with self.profiler.phase("parse"):
+            tree = parse_one(sql, read=self.dialect)
+        return self._extract_tree(tree, default_target)
+
+    def _extract_tree(self, tree: exp.Expression, default_target: str = None):
+        """
+        Build the three DataFrames from an already parsed statement.
+        """
+        # 2. One traversal collects CTEs, projections, filters and joins
+        profiler = self.profiler
+        self._reset_statement_state()
+        with profiler.phase("visit"):
+            insert, projections, wheres, join_nodes = self._visit(tree)
+
+        with profiler.phase("resolve"):
+            # 3. Determine target table & columns
+            target_table, _ = self._target_of(insert, default_target)
+            target_is_default = int(insert is None and default_target is not None)
+
+            # 4. Resolve each projection's columns; SQL text is rendered only
+            #    now, once per node, and only for projections that produce rows
+            #    (transformation steps as TransformTrees, see transform_tree.py)
+            rendered = {}
+
+            def render(node):
+                text = rendered.get(id(node))
+                if text is None:
+                    text = rendered[id(node)] = node.sql(dialect=self.dialect)
+                return text
+
+            # Rows are collected column by column (one list per output
+            # column, LINEAGE_COLUMNS order), not as a dict per row
+            source_tables, source_columns, steps, target_columns = [], [], [], []
+            for proj, columns, transforms in projections:
+                if _is_star(proj):
+                    star_columns = self._star_columns(proj)
+                    identity = ["IDENTITY"]
+                    for name in star_columns:
+                        for src_table, src_col in self._star_column_sources(proj, name):
+                            source_tables.append(src_table)
+                            source_columns.append(src_col)
+                            steps.append(identity)
+                            target_columns.append(name)
+                    if star_columns:
+                        continue
+                if not columns:
+                    continue
                 tgt_col = proj.alias_or_name
-                transform_steps = self._extract_transform_steps(proj)
-                src_cols = self._find_source_columns(proj)
-                for src_table, src_col in src_cols:
-                    lineage_records.append({
-                        "source_table": src_table,
-                        "source_column": src_col,
-                        "transformation_steps": transform_steps,
-                        "target_table": target_table,
-                        "target_column": tgt_col
-                    })
-
-        # 5. Extract filters
-        filters = []
-        for where in tree.find_all(exp.Where):
-            filters.append({
-                "predicate": where.this.sql(dialect=self.dialect)
-            })
-
-        # 6. Extract joins
-        joins = []
-        for join in tree.find_all(exp.Join):
-            kind = join.args.get("kind", "JOIN")
-            condition = None
-            if join.on and isinstance(join.on, exp.On):
-                condition = join.on.this.sql(dialect=self.dialect)
-            joins.append({
-                "join_type": kind.upper(),
-                "condition": condition
-            })
+                transform_steps = self._transforms.build(transforms) if transforms else ["IDENTITY"]
+                for col in columns:
+                    for src_table, src_col in self._resolve_column(col):
+                        source_tables.append(src_table)
+                        source_columns.append(src_col)
+                        steps.append(transform_steps)
+                        target_columns.append(tgt_col)
+
+            # 5. Filters
+            filters = [{"predicate": render(where.this)} for where in wheres]
+
+            # 6. Joins
+            joins = []
+            for join in join_nodes:
+                on = join.args.get("on")
+                joins.append({
+                    "join_type": " ".join(p for p in (join.side, join.kind) if p) or "JOIN",
+                    "condition": render(on) if on is not None else None
+                })
 
         # 7. Build DataFrames
-        lineage_df = pd.DataFrame(lineage_records)
-        filters_df = pd.DataFrame(filters)
-        joins_df = pd.DataFrame(joins)
+        with profiler.phase("dataframes"):
+            if source_tables:
+                lineage_df = pd.DataFrame(dict(zip(LINEAGE_COLUMNS, (
+                    source_tables, source_columns, steps,
+                    [target_table] * len(source_tables), target_columns,
+                    [target_is_default] * len(source_tables)))))
+            else:
+                lineage_df = pd.DataFrame(columns=LINEAGE_COLUMNS)
+            filters_df = pd.DataFrame(filters, columns=FILTER_COLUMNS)
+            joins_df = pd.DataFrame(joins, columns=JOIN_COLUMNS)
 
         return lineage_df, filters_df, joins_df
 
+    def _reset_statement_state(self):
+        """
+        CTE definitions and resolution indexes are only valid for one statement.
+        """
+        self.ctes = {}
+        # Transformation templates reference this statement's nodes
+        self._transforms.reset()
+        # id(SELECT) -> {alias: table name or CTE / derived table body}
+        self._sources_memo = {}
+        # id(CTE / derived table body) -> {output column: [projection nodes]}
+        self._cte_index = {}
+        # id(CTE / derived table body) -> explicit output column names
+        self._column_names = {}
+        # (id(body), column) -> [(source_table, source_column), ...]
+        self._cte_memo = {}
+        # (id(body), column) pairs currently being resolved, for cycle detection
+        self._resolving = set()
+        # id(star projection) -> the column names it expands to
+        self._star_memo = {}
+
+    def _visit(self, tree: exp.Expression):
+        """
+        Single depth-first traversal of the statement.
+
+        Registers WITH/CTE definitions in self.ctes (their bodies are only
+        walked later, on demand, when a column resolves into them) and
+        returns:
+          insert      - the first INSERT (or CREATE TABLE/VIEW) node, or None
+          projections - [proj, columns, transforms] for every SELECT
+                        projection, in document order
+          wheres      - every WHERE node
+          joins       - every JOIN node
+
+        A node nested under a projection is credited to that projection and
+        to every enclosing one (e.g. a scalar subquery in a SELECT list), the
+        same as searching each projection subtree separately would.
+        """
+        insert = None
+        projections = []
+        wheres = []
+        joins = []
+
+        # (node, enclosing projection records)
+        stack = [(tree, ())]
+        while stack:
+            node, owners = stack.pop()
+
+            if isinstance(node, exp.Column):
+                for record in owners:
+                    record[1].append(node)
+                continue  # only identifiers below
+
+            if isinstance(node, exp.With):
+                for cte in node.expressions:
+                    self._register_cte(cte)
+                continue
+
+            if owners and isinstance(node, TRANSFORM_TYPES):
+                for record in owners:
+                    record[2].append(node)
+            elif isinstance(node, exp.Where):
+                wheres.append(node)
+            elif isinstance(node, exp.Join):
+                joins.append(node)
+            elif insert is None and (
+                    isinstance(node, exp.Insert)
+                    or (isinstance(node, exp.Create) and node.args.get("kind") in ("TABLE", "VIEW"))):
+                insert = node
+
+            children = list(node.iter_expressions())
+            if isinstance(node, exp.Select):
+                select_records = {}
+                for proj in node.expressions:
+                    record = [proj, [], []]
+                    projections.append(record)
+                    select_records[id(proj)] = owners + (record,)
+                for child in reversed(children):
+                    stack.append((child, select_records.get(id(child), owners)))
+            else:
+                for child in reversed(children):
+                    stack.append((child, owners))
+
+        return insert, projections, wheres, joins
+
     def _find_target(self, tree: exp.Expression, default: str):
         """
         Locate INSERT INTO target table/columns, or fall back to default.
         """
-        insert = tree.find(exp.Insert)
+        return self._target_of(tree.find(exp.Insert), default)
+
+    def _target_of(self, insert: exp.Expression, default: str):
+        """
+        Target table/columns of an INSERT or CREATE TABLE/VIEW ... AS node.
+        """
         if insert:
-            table = insert.this.name
-            cols = [c.name for c in insert.columns] if insert.columns else []
-            return table, cols
+            target = insert.this
+            if isinstance(target, exp.Schema):
+                # INSERT INTO t (c1, c2, ...)
+                cols = [c.name for c in target.expressions]
+                return exp.table_name(target.this), cols
+            return exp.table_name(target), []
         else:
             # No INSERT: standalone SELECT
             return default, []
@@ -114,16 +414,10 @@ class SQLLineageExtractor:
     def _extract_transform_steps(self, expr: exp.Expression):
         """
         Collect each Func, Cast, Case, or If node as a transformation step.
-        Returns a list of SQL snippets in evaluation order.
+        Returns a TransformTree of their SQL, outermost first.
         """
-        steps = []
-        for node in expr.walk():
-            if isinstance(node, exp.Func) \
-               or isinstance(node, exp.Cast) \
-               or isinstance(node, exp.Case) \
-               or isinstance(node, exp.If):
-                steps.append(node.sql(dialect=self.dialect))
-        return steps or ["IDENTITY"]
+        steps = [node for node in expr.walk() if isinstance(node, TRANSFORM_TYPES)]
+        return self._transforms.build(steps) if steps else ["IDENTITY"]
 
     def _find_source_columns(self, expr: exp.Expression):
         """
@@ -132,93 +426,687 @@ class SQLLineageExtractor:
         """
         results = []
         for col in expr.find_all(exp.Column):
-            tbl = col.table
-            # If the table alias is a CTE, expand it
-            if tbl and tbl in self.ctes:
-                # Drill into that CTE to find its own source for this column
-                expanded = self._extract_from_cte(tbl, col.name)
-                results.extend(expanded)
-            else:
-                # Normal base table or inherited alias
-                resolved_tbl = tbl or self._resolve_table_alias(col)
-                results.append((resolved_tbl, col.name))
+            results.extend(self._resolve_column(col))
         return results
 
+    def _resolve_column(self, col: exp.Column):
+        """
+        Resolve one Column node to its (source_table, source_column) pairs.
+        """
+        tbl = col.table
+        source = self._column_source(col)
+        if source is None and not tbl:
+            # Unqualified, and not the only source in scope
+            source = self._resolve_table_alias(col)
+        # If the column comes from a CTE or derived table, expand it
+        if isinstance(source, exp.Expression):
+            # Drill into that body to find its own source for this column
+            return self._resolve_body_column(source, col.name)
+        # Normal base table or inherited alias
+        return [(source or tbl, col.name)]
+
     def _resolve_table_alias(self, column_node: exp.Column):
         """
-        Fallback alias resolution: scan the AST for a FROM or JOIN
-        that defines this alias. For simplicity, return the alias itself.
+        Fallback for columns whose FROM/JOIN scope did not identify a single
+        source: the column goes to the one source of the innermost SELECT
+        that has a column of that name -- a base table according to the
+        schema catalog, or a CTE / derived table by its output columns.
+        Correlated subqueries also look at the enclosing SELECT's sources;
+        CTE and FROM-clause subquery bodies are their own scope. Otherwise
+        the column's own qualifier is returned.
         """
+        name = column_node.name
+        select = column_node.find_ancestor(exp.Select)
+        while select is not None:
+            matches = [source for source in self._select_sources(select).values()
+                       if self._source_has_column(source, name)]
+            if len(matches) == 1:
+                return matches[0]
+            if matches:
+                break  # ambiguous
+            outer = select.parent
+            while isinstance(outer, (exp.Subquery, exp.Paren)) or isinstance(outer, SET_OPERATION_TYPES):
+                outer = outer.parent
+            if outer is None or isinstance(outer, (exp.CTE, exp.From, exp.Join)):
+                break
+            select = select.find_ancestor(exp.Select)
         return column_node.table
 
+    def _source_has_column(self, source, column: str) -> bool:
+        """
+        True if a FROM/JOIN source (base table name or CTE / derived table
+        body) is known to have the column. Base tables are only known
+        through the catalog.
+        """
+        if isinstance(source, exp.Expression):
+            return self._body_has_column(source, column)
+        if self.catalog is None:
+            return False
+        table, owner = _catalog_name(source)
+        return self.catalog.has_column(table, column, owner)
+
+    def _body_has_column(self, body: exp.Expression, column: str) -> bool:
+        # Case-insensitive, like the catalog (expanded names are upper case)
+        column = column.upper()
+        return any(name.upper() == column for name in self._body_columns(body))
+
+    def _body_columns(self, body: exp.Expression):
+        """
+        Output column names of a CTE / derived table body, with * expanded
+        where the sources are known.
+        """
+        names = []
+        for name, projs in self._body_index(body).items():
+            if name == "*":
+                for star in projs:
+                    names.extend(self._star_columns(star))
+            else:
+                names.append(name)
+        return list(dict.fromkeys(names))
+
+    def _star_columns(self, star: exp.Expression):
+        """
+        Column names a * or t.* projection expands to: catalog columns of
+        base tables and output columns of CTEs / derived tables. Sources
+        that are not known contribute nothing.
+        """
+        names = self._star_memo.get(id(star))
+        if names is not None:
+            return names
+        self._star_memo[id(star)] = []  # a cycle expands to nothing
+        names = []
+        for source in self._star_sources(star):
+            if isinstance(source, exp.Expression):
+                names.extend(self._body_columns(source))
+            elif self.catalog is not None:
+                names.extend(self.catalog.columns(*_catalog_name(source)) or ())
+        names = self._star_memo[id(star)] = list(dict.fromkeys(names))
+        return names
+
+    def _star_sources(self, star: exp.Expression):
+        """
+        The FROM/JOIN sources a * (all of them) or t.* (just t) reads.
+        """
+        select = star.find_ancestor(exp.Select)
+        if select is None:
+            return []
+        qualifier = star.table if isinstance(star, exp.Column) else ""
+        return [source for alias, source in self._select_sources(select).items()
+                if not qualifier or alias == qualifier]
+
+    def _star_column_sources(self, star: exp.Expression, column: str):
+        """
+        (source_table, source_column) pairs of one column expanded from a
+        * or t.* projection. A base table missing from the catalog is
+        assumed to have the column only if it is the star's sole source.
+        """
+        sources = self._star_sources(star)
+        results = []
+        for source in sources:
+            if isinstance(source, exp.Expression):
+                if self._body_has_column(source, column):
+                    results.extend(self._resolve_body_column(source, column))
+            elif self._source_has_column(source, column) or (
+                    len(sources) == 1
+                    and (self.catalog is None or not self.catalog.has_table(*_catalog_name(source)))):
+                results.append((source, column))
+        return results
+
+    def _column_source(self, col: exp.Column):
+        """
+        Find what a column reads from, looking outwards through the enclosing
+        SELECTs (so correlated references resolve too). Returns a base table
+        name, a CTE / derived table body (an Expression), or None.
+
+        Unqualified columns are only attributed when the innermost SELECT
+        has exactly one source.
+        """
+        tbl = col.table
+        select = col.find_ancestor(exp.Select)
+        while select is not None:
+            sources = self._select_sources(select)
+            if tbl:
+                if tbl in sources:
+                    return sources[tbl]
+            else:
+                if len(sources) == 1:
+                    return next(iter(sources.values()))
+                return None
+            select = select.find_ancestor(exp.Select)
+        if tbl in self.ctes:
+            return self.ctes[tbl]
+        return None
+
+    def _select_sources(self, select: exp.Select):
+        """
+        alias -> base table name (with its owner), or CTE / derived table
+        body, for every FROM and JOIN source of one SELECT (memoized per
+        statement).
+        """
+        sources = self._sources_memo.get(id(select))
+        if sources is not None:
+            return sources
+        sources = {}
+        for clause in select.iter_expressions():
+            if not isinstance(clause, (exp.From, exp.Join)):
+                continue
+            source = clause.this
+            if isinstance(source, exp.Table):
+                cte = self.ctes.get(source.name) if not source.db else None
+                if cte is not None and self._cte_visible(cte, select):
+                    sources[source.alias_or_name] = cte
+                else:
+                    # Base tables keep their owner: s1.orders is not s2.orders
+                    sources[source.alias_or_name] = exp.table_name(source)
+            elif isinstance(source, exp.Subquery) and source.alias:
+                self._register_column_names(source.this, source.args.get("alias"))
+                sources[source.alias] = source.this
+        self._sources_memo[id(select)] = sources
+        return sources
+
+    @staticmethod
+    def _cte_visible(body: exp.Expression, node: exp.Expression) -> bool:
+        """
+        Whether the CTE with this body is in scope at node: a CTE of a plain
+        WITH is only visible after its definition (so in WITH t AS (SELECT
+        x FROM t) the inner t is the base table), one of a WITH RECURSIVE
+        everywhere in it.
+        """
+        cte = body.parent
+        with_ = cte.parent if isinstance(cte, exp.CTE) else None
+        if not isinstance(with_, exp.With) or with_.args.get("recursive"):
+            return True
+        position = next(i for i, e in enumerate(with_.expressions) if e is cte)
+        while node is not None:
+            if node.parent is with_:
+                return next(i for i, e in enumerate(with_.expressions) if e is node) > position
+            node = node.parent
+        return True
+
     def _extract_from_cte(self, cte_name: str, cte_column: str):
         """
         Given a CTE name and one of its output columns,
         walk that CTE’s SELECT AST to find underlying (table, column).
         """
-        cte_select = self.ctes.get(cte_name)
-        if not isinstance(cte_select, exp.Select):
+        cte_body = self.ctes.get(cte_name)
+        if cte_body is None:
             return []
+        return self._resolve_body_column(cte_body, cte_column)
+
+    def _resolve_body_column(self, body: exp.Expression, column: str):
+        """
+        Memoized (body, column) -> base (table, column) resolution for a CTE
+        or derived table body. A (body, column) pair that is already being
+        resolved further up the stack is a cycle (e.g. the recursive member
+        of a recursive CTE) and contributes nothing.
+        """
+        key = (id(body), column)
+        if key in self._cte_memo:
+            return self._cte_memo[key]
+        if key in self._resolving:
+            return []
+
+        self._resolving.add(key)
+        try:
+            with self.profiler.phase("cte"):
+                results = []
+                index = self._body_index(body)
+                for proj in index.get(column, ()):
+                    results.extend(self._find_source_columns(proj))
+                if column not in index:
+                    # Passed through a SELECT * / t.*
+                    for star in index.get("*", ()):
+                        results.extend(self._star_column_sources(star, column))
+        finally:
+            self._resolving.discard(key)
+        # De-duplicate, or diamond-shaped CTE chains grow exponentially
+        results = list(dict.fromkeys(results))
+        self._cte_memo[key] = results
+        return results
 
-        # Find the projection in the CTE that produced cte_column
-        for proj in cte_select.expressions:
-            if proj.alias_or_name == cte_column:
-                # Reuse the normal logic on this projection node
-                return self._find_source_columns(proj)
-        return []
+    def _register_cte(self, cte: exp.CTE):
+        self.ctes[cte.alias_or_name] = cte.this
+        self._register_column_names(cte.this, cte.args.get("alias"))
+
+    def _register_column_names(self, body: exp.Expression, alias: exp.TableAlias):
+        """
+        Remember an explicit column list, as in WITH t (a, b) AS (...),
+        which renames the body's output columns by position.
+        """
+        if alias is not None and alias.columns:
+            self._column_names[id(body)] = [c.name for c in alias.columns]
+
+    def _body_index(self, body: exp.Expression):
+        """
+        Output column -> projection nodes of a CTE / derived table body,
+        built once per body. For UNION / INTERSECT / EXCEPT bodies the names
+        come from the first branch and every branch's projection at the same
+        position is indexed under that name. WITH clauses nested inside the
+        body are registered in self.ctes (without shadowing outer CTEs).
+        """
+        index = self._cte_index.get(id(body))
+        if index is not None:
+            return index
+
+        branches = []
+        pending = [body]
+        while pending:
+            node = pending.pop()
+            if isinstance(node, exp.Subquery):
+                pending.append(node.this)
+            elif isinstance(node, SET_OPERATION_TYPES):
+                # right first so the leftmost branch ends up first
+                pending.append(node.expression)
+                pending.append(node.this)
+            elif isinstance(node, exp.Select):
+                branches.append(node)
+            if isinstance(node, (exp.Select, SET_OPERATION_TYPES)):
+                for child in node.iter_expressions():
+                    if isinstance(child, exp.With):
+                        for cte in child.expressions:
+                            if cte.alias_or_name not in self.ctes:
+                                self._register_cte(cte)
+
+        index = {}
+        if branches:
+            names = self._column_names.get(id(body)) \
+                or [proj.alias_or_name for proj in branches[0].expressions]
+            for branch in branches:
+                for name, proj in zip(names, branch.expressions):
+                    index.setdefault(name, []).append(proj)
+        self._cte_index[id(body)] = index
+        return index
 
 
 def to_excel(lineage_df: pd.DataFrame,
              filters_df: pd.DataFrame,
              joins_df: pd.DataFrame,
-             output_path: str):
+             output_path: str,
+             errors_df: pd.DataFrame = None):
     """
     Write the three DataFrames to separate sheets in an Excel workbook.
+    In batch mode the per-file error report goes to an extra Errors sheet.
     """
     with pd.ExcelWriter(output_path, engine="openpyxl") as writer:
         lineage_df.to_excel(writer, sheet_name="Lineage", index=False)
         filters_df.to_excel(writer, sheet_name="Filters", index=False)
         joins_df.to_excel(writer, sheet_name="Joins", index=False)
+        if errors_df is not None:
+            errors_df.to_excel(writer, sheet_name="Errors", index=False)
+
+
+def find_sql_files(sql_dir: str, pattern: str = "**/*.sql"):
+    """
+    Return the sorted list of files under sql_dir matching a glob pattern.
+    """
+    paths = glob.glob(os.path.join(sql_dir, pattern), recursive=True)
+    return sorted(p for p in paths if os.path.isfile(p))
+
+
+# One extractor per worker process, created by _init_batch_worker
+_batch_extractor = None
+
+
+def _init_batch_worker(dialect: str, cache_dir: str = None, cache_bytes: int = None,
+                       profile: dict = None, catalog_path: str = None,
+                       budget: StatementBudget = None):
+    global _batch_extractor
+    cache = LineageCache(cache_dir, cache_bytes) if cache_dir else None
+    profiler = LineageProfiler(**profile).start() if profile is not None else None
+    catalog = SchemaCatalog.load(catalog_path) if catalog_path else None
+    _batch_extractor = SQLLineageExtractor(dialect=dialect, cache=cache, profiler=profiler,
+                                           catalog=catalog, budget=budget)
+
+
+def _with_leading(df: pd.DataFrame, values: dict) -> pd.DataFrame:
+    """
+    Copy of df with constant columns inserted in front, in order.
+    (A copy: cached frames must not be mutated in place.)
+    """
+    df = df.copy()
+    for position, (column, value) in enumerate(values.items()):
+        df.insert(position, column, value)
+    return df
+
+
+def _error_message(e: Exception) -> str:
+    # First line only: sqlglot ParseErrors append a highlighted (ANSI) excerpt
+    message = (str(e).strip().splitlines() or [""])[0]
+    return f"{type(e).__name__}: {message}"
+
+
+def _extract_batch_file(task):
+    """
+    Worker: extract one file, statement by statement. Never raises; failures
+    come back as error records so a bad script cannot kill the batch.
+    When profiling, the file's metrics come back as a fourth element.
+    """
+    path, default_target = task
+    profiler = _batch_extractor.profiler
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            lineage_df, filters_df, joins_df, errors_df = \
+                _batch_extractor.extract_script(f, default_target=default_target)
+        result = path, (lineage_df, filters_df, joins_df), errors_df.to_dict("records")
+    except Exception as e:
+        error = {"statement_no": None, "statement_line": None, "error": _error_message(e)}
+        result = path, None, [error]
+    if not profiler.enabled:
+        return result + (None,)
+    snapshot = profiler.snapshot()
+    profiler.reset()
+    return result + (snapshot,)
+
+
+def iter_batch_lineage(paths,
+                       dialect: str = "default",
+                       default_target: str = None,
+                       workers: int = None,
+                       chunksize: int = 4,
+                       cache_dir: str = None,
+                       cache_bytes: int = None,
+                       profiler: LineageProfiler = None,
+                       catalog_path: str = None,
+                       statement_timeout: float = None,
+                       statement_memory_mb: float = None,
+                       quarantine: list = None):
+    """
+    Fan SQLLineageExtractor.extract out over a process pool.
+
+    Yields (source_file, (lineage_df, filters_df, joins_df), errors) as soon
+    as each file finishes. errors lists the statements that failed; frames
+    is None if the whole file failed (e.g. could not be read). If no
+    default_target is given, each file's name (without extension) is used.
+    Workers share the on-disk cache in cache_dir when one is given.
+    With a LineageProfiler, the workers profile too and their metrics are
+    merged into it, file by file. Each worker loads the schema catalog at
+    catalog_path, if given (use the binary form; see schema_catalog.py).
+
+    With a statement_timeout (seconds) or statement_memory_mb, files run in
+    a lineage_supervisor.SupervisedPool instead: a statement over budget
+    is interrupted, or its worker killed and replaced, and the statement
+    fails with an error; its quarantine record (with source_file) is
+    appended to the quarantine list before its file is yielded.
+    """
+    tasks = [
+        (path, default_target or os.path.splitext(os.path.basename(path))[0])
+        for path in paths
+    ]
+    profile = None
+    if profiler is not None:
+        profile = {"top_n": profiler.top_n, "trace_memory": profiler.trace_memory}
+    if statement_timeout or statement_memory_mb:
+        pool = SupervisedPool(processes=workers,
+                              initializer=_init_batch_worker,
+                              initargs=(dialect, cache_dir, cache_bytes, profile, catalog_path),
+                              timeout=statement_timeout,
+                              memory_mb=statement_memory_mb)
+        for (path, _), result, quarantined in pool.imap_unordered(_extract_batch_file, tasks):
+            if quarantine is not None:
+                quarantine.extend({"source_file": path, **q} for q in quarantined)
+            if result is None:
+                reason = quarantined[-1]["reason"]
+                yield path, None, [{"statement_no": None, "statement_line": None,
+                                    "error": f"worker {reason} outside a statement"}]
+                continue
+            *result, snapshot = result
+            if snapshot is not None:
+                profiler.merge(snapshot, source_file=path)
+            # Statements skipped after a kill fail with "quarantined (...)"
+            yield tuple(result)
+        return
+
+    with multiprocessing.Pool(processes=workers,
+                              initializer=_init_batch_worker,
+                              initargs=(dialect, cache_dir, cache_bytes, profile,
+                                        catalog_path)) as pool:
+        for *result, snapshot in pool.imap_unordered(_extract_batch_file, tasks, chunksize=chunksize):
+            if snapshot is not None:
+                profiler.merge(snapshot, source_file=result[0])
+            yield tuple(result)
+
+
+def write_batch(paths,
+                writer,
+                dialect: str = "default",
+                default_target: str = None,
+                workers: int = None,
+                cache_dir: str = None,
+                cache_bytes: int = None,
+                store: LineageStore = None,
+                profiler: LineageProfiler = None,
+                catalog_path: str = None,
+                statement_timeout: float = None,
+                statement_memory_mb: float = None):
+    """
+    Run the batch and stream each file's results into a lineage_writers
+    writer as it completes, with a leading source_file column. If a
+    LineageStore is given, each file's edges replace its previous ones.
+    Statements over the per-statement budget (see iter_batch_lineage) are
+    also listed, with their size stats, in a "Quarantine" sheet.
+    Returns the number of errors reported.
+    """
+    failed = 0
+    quarantine = []
+    batch = iter_batch_lineage(paths, dialect, default_target, workers,
+                               cache_dir=cache_dir, cache_bytes=cache_bytes, profiler=profiler,
+                               catalog_path=catalog_path, statement_timeout=statement_timeout,
+                               statement_memory_mb=statement_memory_mb, quarantine=quarantine)
+    write_phase = profiler.phase if profiler is not None else NullProfiler().phase
+    for path, frames, file_errors in batch:
+        for error in file_errors:
+            where = f"{path}:{error['statement_line']}" if error["statement_line"] else path
+            print(f"ERROR in {where}: {error['error']}", file=sys.stderr)
+        with write_phase("write"):
+            if quarantine:
+                writer.write("Quarantine", pd.DataFrame(quarantine, columns=["source_file"] + QUARANTINE_COLUMNS))
+                quarantine.clear()
+            if file_errors:
+                failed += len(file_errors)
+                writer.write("Errors", pd.DataFrame([{"source_file": path, **e} for e in file_errors]))
+            if frames is None:
+                continue
+            if store is not None:
+                store.replace_file(path, frames[0], content_hash=file_sha256(path))
+            for sheet, df in zip(SHEETS, frames):
+                if not df.empty:
+                    writer.write(sheet, _with_leading(df, {"source_file": path}))
+    return failed
+
+
+def extract_batch(paths,
+                  dialect: str = "default",
+                  default_target: str = None,
+                  workers: int = None,
+                  cache_dir: str = None,
+                  cache_bytes: int = None,
+                  store: LineageStore = None,
+                  profiler: LineageProfiler = None,
+                  catalog_path: str = None,
+                  statement_timeout: float = None,
+                  statement_memory_mb: float = None,
+                  columnar: bool = False):
+    """
+    Run write_batch() into memory.
+
+    Returns four DataFrames: lineage, filters and joins (each with leading
+    source_file, statement_no and statement_line columns) and an errors
+    report (source_file, statement_no, statement_line, error). With
+    columnar=True they are lineage_columns.ColumnarBuffers sharing one name
+    dictionary, which keeps multi-million-edge runs compact.
+    """
+    columns = sheet_columns(["source_file"] + STATEMENT_COLUMNS)
+    collector = ColumnarCollector(columns) if columnar else FrameCollector(columns)
+    write_batch(paths, collector, dialect, default_target, workers,
+                cache_dir=cache_dir, cache_bytes=cache_bytes, store=store, profiler=profiler,
+                catalog_path=catalog_path, statement_timeout=statement_timeout,
+                statement_memory_mb=statement_memory_mb)
+    if columnar:
+        return tuple(collector.buffer(sheet) for sheet in SHEETS)
+    return tuple(collector.frame(sheet) for sheet in SHEETS)
 
 
 def main():
     parser = argparse.ArgumentParser(
         description="Extract SQL lineage (source→target columns, transforms, filters, joins), with CTE support"
     )
-    parser.add_argument("--sql-file",
-                        help="Path to .sql file (INSERT ... SELECT or SELECT, possibly WITH).",
-                        required=True)
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--sql-file",
+                        help="Path to .sql file (INSERT ... SELECT or SELECT, possibly WITH).")
+    source.add_argument("--sql-dir",
+                        help="Directory of .sql files to process in parallel (batch mode).")
+    parser.add_argument("--pattern",
+                        help="Glob pattern for --sql-dir, relative to the directory (default: **/*.sql).",
+                        default="**/*.sql")
+    parser.add_argument("--workers",
+                        help="Worker processes for --sql-dir (default: CPU count).",
+                        type=int,
+                        default=None)
     parser.add_argument("--default-target",
                         help="If no INSERT, use this as target (e.g. filename or table name).",
                         default=None)
     parser.add_argument("--dialect",
                         help="SQL dialect for parsing (default: generic).",
                         default="default")
+    parser.add_argument("--format",
+                        help="Output format (default: xlsx). Other formats write one file per sheet into --output as a directory.",
+                        choices=list(WRITERS),
+                        default="xlsx")
     parser.add_argument("--output",
-                        help="Output Excel file path.",
-                        default="sql_lineage.xlsx")
+                        help="Output Excel file path, or directory for the other formats (default: sql_lineage.xlsx / sql_lineage_output).",
+                        default=None)
+    parser.add_argument("--cache-dir",
+                        help="Directory for the on-disk lineage cache (default: .sql_lineage_cache).",
+                        default=".sql_lineage_cache")
+    parser.add_argument("--cache-size-mb",
+                        help="Size limit for the cache directory; least recently used entries are evicted (default: 512).",
+                        type=int,
+                        default=512)
+    parser.add_argument("--no-cache",
+                        help="Always re-parse; neither read nor write the cache.",
+                        action="store_true")
+    parser.add_argument("--store",
+                        help="SQLite lineage store to upsert edges into (e.g. lineage.db).",
+                        default=None)
+    parser.add_argument("--catalog",
+                        help="Schema catalog for unqualified columns and * expansion: an ALL_TAB_COLUMNS export (CSV / Parquet / JSON) or its binary .npz form.",
+                        default=None)
+    parser.add_argument("--statement-timeout",
+                        help="Seconds a single statement may take; slower ones are interrupted (killed if unresponsive) and quarantined (default: unlimited).",
+                        type=float,
+                        default=None)
+    parser.add_argument("--statement-memory-mb",
+                        help="Memory a single statement may grow a --sql-dir worker by before the worker is killed and the statement quarantined (default: unlimited).",
+                        type=float,
+                        default=None)
+    parser.add_argument("--profile",
+                        help="Record per-phase and per-statement time and memory and dump them to this JSON file (default: lineage_profile.json).",
+                        nargs="?",
+                        const="lineage_profile.json",
+                        default=None)
+    parser.add_argument("--profile-top",
+                        help="Number of slowest statements to keep and list with --profile (default: 10).",
+                        type=int,
+                        default=10)
+    parser.add_argument("--profile-no-memory",
+                        help="With --profile, skip allocation tracking (tracemalloc slows extraction down).",
+                        action="store_true")
 
     args = parser.parse_args()
-
+    cache_dir = None if args.no_cache else args.cache_dir
+    cache_bytes = args.cache_size_mb * 1024 * 1024
+
+    output = args.output or ("sql_lineage.xlsx" if args.format == "xlsx" else "sql_lineage_output")
+    profiler = None
+    if args.profile:
+        profiler = LineageProfiler(top_n=args.profile_top, trace_memory=not args.profile_no_memory)
+    # Opening and closing (saving) the output counts as "write" time
+    write_phase = (profiler or NullProfiler()).phase
+
+    if args.sql_dir:
+        paths = find_sql_files(args.sql_dir, args.pattern)
+        if not paths:
+            print(f"ERROR: no files matching {args.pattern} under {args.sql_dir}", file=sys.stderr)
+            sys.exit(1)
+        store = LineageStore(args.store) if args.store else None
+        if profiler is not None:
+            profiler.start()
+        try:
+            with write_phase("write"):
+                writer = open_writer(args.format, output, sheet_columns(["source_file"] + STATEMENT_COLUMNS))
+            try:
+                failed = write_batch(
+                    paths,
+                    writer,
+                    dialect=args.dialect,
+                    default_target=args.default_target,
+                    workers=args.workers,
+                    cache_dir=cache_dir,
+                    cache_bytes=cache_bytes,
+                    store=store,
+                    profiler=profiler,
+                    catalog_path=args.catalog,
+                    statement_timeout=args.statement_timeout,
+                    statement_memory_mb=args.statement_memory_mb
+                )
+            finally:
+                # Not around write_batch: that mostly waits for the workers
+                with write_phase("write"):
+                    writer.close()
+        finally:
+            if store is not None:
+                store.close()
+        print(f"Lineage for {len(paths)} files written to {output} ({failed} errors)")
+        _report_profile(profiler, args.profile)
+        return
+
+    cache = LineageCache(cache_dir, cache_bytes) if cache_dir else None
+    catalog = SchemaCatalog.load(args.catalog) if args.catalog else None
+    # In-process: a statement over the timeout is interrupted, not killed
+    budget = StatementBudget(args.statement_timeout) if args.statement_timeout else None
+    extractor = SQLLineageExtractor(dialect=args.dialect, cache=cache, profiler=profiler,
+                                    catalog=catalog, budget=budget)
     try:
-        with open(args.sql_file, "r", encoding="utf-8") as f:
-            sql_text = f.read()
-    except Exception as e:
+        sql_file = open(args.sql_file, "r", encoding="utf-8")
+    except OSError as e:
         print(f"ERROR reading SQL file: {e}", file=sys.stderr)
         sys.exit(1)
 
-    extractor = SQLLineageExtractor(dialect=args.dialect)
-    lineage_df, filters_df, joins_df = extractor.extract(
-        sql_text,
-        default_target=args.default_target
-    )
-
-    to_excel(lineage_df, filters_df, joins_df, args.output)
-    print(f"Lineage written to {args.output}")
+    store = LineageStore(args.store) if args.store else None
+    if profiler is not None:
+        profiler.start()
+    try:
+        with sql_file, write_phase("write"):
+            writer = open_writer(args.format, output, sheet_columns(STATEMENT_COLUMNS))
+            if store is not None:
+                writer = TeeWriter(writer, store.file_writer(args.sql_file, file_sha256(args.sql_file)))
+            with writer:
+                failed = extractor.write_script(sql_file, writer, default_target=args.default_target)
+                if budget is not None and budget.quarantined:
+                    writer.write("Quarantine", pd.DataFrame(budget.quarantined, columns=QUARANTINE_COLUMNS))
+    finally:
+        if store is not None:
+            store.close()
+
+    print(f"Lineage written to {output} ({failed} errors)")
+    _report_profile(profiler, args.profile)
+
+
+def _report_profile(profiler: LineageProfiler, path: str):
+    """
+    Stop the profiler, dump its metrics to path and print the summary.
+    """
+    if profiler is None:
+        return
+    profiler.stop()
+    profiler.write_json(path)
+    print(profiler.format_summary(), file=sys.stderr)
+    print(f"Profile written to {path}", file=sys.stderr)
 
 
 if __name__ == "__main__":
-    main()
+    # The scripts appended below have entry points of their own
+    sys.exit(main())
     
     
     
@@ -230,6 +1118,11 @@ column_lineage_with_transforms.py
 Extract column-level lineage + transformation logic from any SQL
 (using sqllineage + sqlglot), then output to Excel.
 
+The input is split into statements once (sql_statements.py); each
+statement is parsed by sqlglot once, and that AST gives both the target
+table and the transformations, while sqllineage analyses the same
+statement text. With --profile, per-phase timings are reported.
+
 Dependencies:
     pip install sqllineage sqlglot pandas openpyxl
 """
@@ -242,6 +1135,15 @@ import sqlglot
 from sqlglot import exp, parse_one
 from sqllineage.runner import LineageRunner
 
+from lineage_profile import LineageProfiler, NullProfiler
+from sql_statements import iter_statements
+
+TRANSFORM_LINEAGE_COLUMNS = ["source_table", "source_column", "target_table",
+                             "target_column", "transformation"]
+
+# sqlglot dialect -> sqllineage (sqlfluff) dialect, where the names differ
+SQLLINEAGE_DIALECTS = {None: "ansi", "default": "ansi", "spark": "sparksql", "spark2": "sparksql"}
+
 
 def extract_transforms(sql: str, dialect: str = "default"):
     """
@@ -251,11 +1153,21 @@ def extract_transforms(sql: str, dialect: str = "default"):
     If the projection is simply `col` or `tbl.col`, we record "IDENTITY".
     """
     tree = parse_one(sql, read=dialect)
+    transforms = _transforms_from_tree(tree, dialect)
+    if transforms is None:
+        raise ValueError("No SELECT found in SQL")
+    return transforms
+
 
+def _transforms_from_tree(tree: exp.Expression, dialect: str):
+    """
+    extract_transforms() on an already parsed statement; None if it has
+    no SELECT.
+    """
     # If it's an INSERT, dive into its SELECT
     select = tree.find(exp.Select)
     if select is None:
-        raise ValueError("No SELECT found in SQL")
+        return None
 
     transforms = {}
     for proj in select.expressions:
@@ -269,42 +1181,95 @@ def extract_transforms(sql: str, dialect: str = "default"):
     return transforms
 
 
-def extract_column_lineage_with_transforms(
-    sql: str,
-    default_target: str = None,
-    dialect: str = "default"
-) -> pd.DataFrame:
+def _target_from_tree(tree: exp.Expression, default_target: str):
     """
-    Returns a DataFrame with columns:
-      source_table, source_column, target_table, target_column, transformation
+    Target table of an INSERT (with or without a column list), else default_target.
     """
-    # 1) Get raw column lineage pairs
-    runner = LineageRunner(sql)
-    col_pairs = runner.get_column_lineage()
-
-    # 2) Determine target table (from INSERT) or fallback
-    tree = parse_one(sql, read=dialect)
     insert = tree.find(exp.Insert)
-    if insert:
-        target_table = insert.this.name
-    else:
-        target_table = default_target
+    if insert is None:
+        return default_target
+    target = insert.this
+    if isinstance(target, exp.Schema):
+        target = target.this
+    return exp.table_name(target)
+
+
+def _column_parts(column):
+    """
+    (table, column) of a sqllineage Column; the table keeps its schema
+    unless that is sqllineage's <default> placeholder.
+    """
+    table = column.parent
+    if table is None:
+        return None, column.raw_name
+    name = str(table)
+    if name.startswith("<default>."):
+        name = name[len("<default>."):]
+    return name, column.raw_name
 
-    # 3) Fetch transformation snippets
-    transforms = extract_transforms(sql, dialect=dialect)
 
-    # 4) Build rows
+def _statement_lineage(sql: str, default_target: str, dialect: str, profiler):
+    """
+    Lineage rows of one statement: a single sqlglot parse shared by target
+    detection and transform extraction, plus one sqllineage pass.
+    Statements without a SELECT have no column lineage and are skipped
+    before sqllineage sees them.
+    """
+    with profiler.phase("parse"):
+        tree = parse_one(sql, read=dialect)
+
+    with profiler.phase("transforms"):
+        transforms = _transforms_from_tree(tree, dialect)
+        if transforms is None:
+            return []
+        target_table = _target_from_tree(tree, default_target)
+
+    with profiler.phase("sqllineage"):
+        runner = LineageRunner(sql, dialect=SQLLINEAGE_DIALECTS.get(dialect, dialect))
+        # Each path runs source -> (CTE / subquery columns) -> target
+        paths = runner.get_column_lineage()
+
     rows = []
-    for src_col, tgt_col in col_pairs:
+    for path in paths:
+        src_table, src_column = _column_parts(path[0])
+        _, tgt_column = _column_parts(path[-1])
         rows.append({
-            "source_table": src_col.table,
-            "source_column": src_col.name,
+            "source_table": src_table,
+            "source_column": src_column,
             "target_table": target_table,
-            "target_column": tgt_col.name,
-            "transformation": transforms.get(tgt_col.name, "IDENTITY")
+            "target_column": tgt_column,
+            "transformation": transforms.get(tgt_column, "IDENTITY")
         })
+    return rows
 
-    return pd.DataFrame(rows)
+
+def extract_column_lineage_with_transforms(
+    sql: str,
+    default_target: str = None,
+    dialect: str = "default",
+    profiler: LineageProfiler = None
+) -> pd.DataFrame:
+    """
+    Returns a DataFrame with columns:
+      source_table, source_column, target_table, target_column, transformation
+
+    sql may hold several statements; they are split once and each one is
+    parsed once by sqlglot and once by sqllineage.
+    """
+    profiler = profiler or NullProfiler()
+    rows = []
+    statements = iter_statements(sql.splitlines(True), dialect)
+    while True:
+        with profiler.phase("split"):
+            item = next(statements, None)
+        if item is None:
+            break
+        statement_no, start_line, text = item
+        with profiler.statement(statement_no=statement_no, statement_line=start_line, sql=text):
+            rows.extend(_statement_lineage(text, default_target, dialect, profiler))
+
+    with profiler.phase("dataframes"):
+        return pd.DataFrame(rows, columns=TRANSFORM_LINEAGE_COLUMNS)
 
 
 def to_excel(df: pd.DataFrame, path: str):
@@ -332,6 +1297,10 @@ def main():
         "--output", default="column_lineage.xlsx",
         help="Output Excel filename"
     )
+    parser.add_argument(
+        "--profile", nargs="?", const="column_lineage_profile.json", default=None,
+        help="Record per-phase timings (split, parse, transforms, sqllineage, ...) to this JSON file"
+    )
     args = parser.parse_args()
 
     try:
@@ -340,14 +1309,20 @@ def main():
         print(f"ERROR reading SQL file: {e}", file=sys.stderr)
         sys.exit(1)
 
+    profiler = LineageProfiler().start() if args.profile else None
     df = extract_column_lineage_with_transforms(
         sql=sql_text,
         default_target=args.default_target,
-        dialect=args.dialect
+        dialect=args.dialect,
+        profiler=profiler
     )
 
     to_excel(df, args.output)
     print(f"✅ Written column‑level lineage + transforms to {args.output}")
+    if profiler is not None:
+        profiler.stop()
+        profiler.write_json(args.profile)
+        print(profiler.format_summary(), file=sys.stderr)
 
 
 if __name__ == "__main__":
@@ -380,23 +1355,21 @@ def get_column_lineage(sql_query: str):
         # Check if column lineage is available
         if not hasattr(parser, 'columns_aliases_names') or not parser.columns_aliases_names:
              # Fallback for simpler queries or when direct lineage isn't obvious
-            source_columns = parser.columns
-            target_columns = parser.columns
+            # Columns are "table.column" where sql_metadata resolved the
+            # table; otherwise the table is only known if there is just one
+            # (never guessed from list positions)
             source_tables = parser.tables
-            
-            if len(source_tables) == 1:
-                target_table = source_tables[0]
-            else:
-                target_table = "result_set"
 
-
-            for i in range(len(source_columns)):
-                 lineage.append({
-                    "source_table": source_tables[i] if i < len(source_tables) else target_table,
-                    "source_column": source_columns[i],
+            for column in parser.columns:
+                source_table, _, column_name = column.rpartition(".")
+                if not source_table and len(source_tables) == 1:
+                    source_table = source_tables[0]
+                lineage.append({
+                    "source_table": source_table or None,
+                    "source_column": column_name,
                     "transformation_logic": "Direct Mapping",
-                    "target_table": target_table,
-                    "target_column": target_columns[i]
+                    "target_table": "result_set",
+                    "target_column": column_name
                 })
             return lineage
 
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+sql_statements.py
+
+Incremental statement splitter for large SQL / SQL*Plus deployment scripts.
+
+iter_statements() consumes any iterable of lines (an open file works) and
+yields one statement at a time, so memory is bounded by the largest single
+statement rather than the size of the script. It understands:
+
+  * ';' terminators, ignoring those inside strings, quoted identifiers,
+    Oracle q'[...]' literals, Postgres $$...$$ / $tag$...$tag$ bodies and
+    -- / /* */ comments
+  * for Oracle (dialect="oracle"), PL/SQL blocks (CREATE
+    PROCEDURE/FUNCTION/PACKAGE/TRIGGER/TYPE, DECLARE, BEGIN), where ';' is
+    part of the body and only a '/' line ends the block; a transaction's
+    BEGIN; / BEGIN TRANSACTION; / BEGIN WORK; is an ordinary statement.
+    In other dialects every top-level ';' ends a statement (a T-SQL
+    DECLARE @x INT; is one statement)
+  * '/' on a line of its own as a statement terminator
+  * SQL*Plus directives (SET, PROMPT, SPOOL, REM, @script, ...), skipped
+
+Usage:
+    python sql_statements.py deploy.sql oracle   # prints line numbers and statement heads
+
+Dependencies:
+    (standard library only)
+"""
+
+import re
+import sys
+
+# A q-quote or dollar-quote opener must not continue a word (freq'x', V$SQL$X)
+_TOKEN_RE = re.compile(r"--|/\*|(?<![\w$#])[nN]?[qQ]'|(?<![\w$#])\$(?:[A-Za-z_]\w*)?\$|'|\"|;")
+
+_PLSQL_RE = re.compile(
+    r"(CREATE\s+(OR\s+REPLACE\s+)?((NON)?EDITIONABLE\s+)?"
+    r"(PROCEDURE|FUNCTION|PACKAGE|TRIGGER|TYPE\s+BODY)"
+    r"|DECLARE"
+    # A transaction (BEGIN; / BEGIN TRANSACTION / BEGIN WORK ...) is not a block
+    r"|BEGIN(?!\s*(;|$)|\s+(TRANSACTION|WORK|TRAN|ISOLATION)\b))\b",
+    re.IGNORECASE
+)
+
+_LEADING_COMMENTS_RE = re.compile(r"^(\s+|--[^\n]*(\n|$)|/\*.*?\*/)*", re.DOTALL)
+
+_SQLPLUS_RE = re.compile(
+    r"(REM(ARK)?|PRO(MPT)?|SPO(OL)?|WHENEVER|DEF(INE)?|UNDEF(INE)?|COL(UMN)?|"
+    r"SHO(W)?|TTITLE|BTITLE|BREAK|COMPUTE|EXIT|QUIT|PAUSE|CONN(ECT)?)(\s|$)"
+    r"|SET\s+(?!TRANSACTION\b|ROLE\b|CONSTRAINTS?\b)|@",
+    re.IGNORECASE
+)
+
+# Dialects whose scripts hold PL/SQL blocks
+PLSQL_DIALECTS = frozenset(("oracle",))
+
+# Closing delimiters for Oracle q'X...X' literals
+_Q_CLOSE = {"[": "]", "(": ")", "{": "}", "<": ">"}
+
+
+def is_plsql(text: str) -> bool:
+    """
+    True if the statement text starts a PL/SQL block.
+    """
+    code = _LEADING_COMMENTS_RE.sub("", text, count=1)
+    return _PLSQL_RE.match(code) is not None
+
+
+def iter_statements(lines, dialect: str = None):
+    """
+    Split a script into statements, incrementally.
+
+    :param lines:   iterable of text lines (with or without trailing newlines)
+    :param dialect: sqlglot dialect of the script; PL/SQL blocks are only
+                    recognized for PLSQL_DIALECTS
+    Yields (statement_no, start_line, text) with 1-based numbering; text has
+    its terminator removed. Comment-only fragments are not yielded.
+    """
+    buf = []            # pieces of the current statement
+    has_code = False    # current statement contains something besides comments
+    start_line = None
+    detect_plsql = (dialect or "").lower() in PLSQL_DIALECTS
+    plsql = None        # decided at the first top-level ';'
+    state = None        # None, or the text that closes the open string/comment
+    statement_no = 0
+
+    def flush():
+        nonlocal buf, has_code, start_line, plsql, statement_no
+        text = "".join(buf).strip()
+        done = None
+        if has_code and text:
+            statement_no += 1
+            done = (statement_no, start_line, text)
+        buf, has_code, start_line, plsql = [], False, None, None
+        return done
+
+    for lineno, line in enumerate(lines, 1):
+        if state is None:
+            stripped = line.strip()
+            if stripped == "/":
+                done = flush()
+                if done:
+                    yield done
+                continue
+            if not has_code and _SQLPLUS_RE.match(stripped):
+                continue
+
+        pos = 0
+        seg_start = 0
+        n = len(line)
+        while pos < n:
+            if state is None:
+                m = _TOKEN_RE.search(line, pos)
+                end = m.start() if m else n
+                if not has_code and line[pos:end].strip():
+                    has_code, start_line = True, lineno
+                if m is None:
+                    break
+                tok = m.group()
+                pos = m.end()
+                if tok == "--":
+                    break
+                if tok == "/*":
+                    state = "*/"
+                    continue
+                if not has_code:
+                    has_code, start_line = True, lineno
+                if tok == "'" or tok == '"':
+                    state = tok
+                elif tok[0] == "$":
+                    # $$ ... $$ / $tag$ ... $tag$ body
+                    state = tok
+                elif tok != ";":
+                    # q'X ... X' literal (optionally N-prefixed)
+                    if pos < n:
+                        delim = line[pos]
+                        state = _Q_CLOSE.get(delim, delim) + "'"
+                        pos += 1
+                else:
+                    if plsql is None:
+                        plsql = detect_plsql and is_plsql("".join(buf) + line[seg_start:m.start()])
+                    if not plsql:
+                        buf.append(line[seg_start:m.start()])
+                        done = flush()
+                        if done:
+                            yield done
+                        seg_start = pos
+            elif state == "'":
+                i = line.find("'", pos)
+                if i < 0:
+                    pos = n
+                elif line.startswith("''", i):
+                    pos = i + 2  # escaped quote
+                else:
+                    state, pos = None, i + 1
+            else:
+                i = line.find(state, pos)
+                if i < 0:
+                    pos = n
+                else:
+                    pos, state = i + len(state), None
+        buf.append(line[seg_start:])
+
+    done = flush()
+    if done:
+        yield done
+
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else None
+    dialect = sys.argv[2] if len(sys.argv) > 2 else None
+    if not path:
+        print("usage: python sql_statements.py <script.sql> [dialect]", file=sys.stderr)
+        sys.exit(1)
+    with open(path, "r", encoding="utf-8") as f:
+        for statement_no, line, text in iter_statements(f, dialect):
+            head = " ".join(text.split())[:80]
+            print(f"{statement_no:>6}  line {line:>7}  {head}")
+
+
+if __name__ == "__main__":
+    main()
@@ -195,6 +195,9 @@ def extract_lineage_with_table(sql):
     return lineage_info
 
 def visualize_lineage(lineage_info):
+    # One node per column: fine for one query. For a whole warehouse use
+    # lineage_graphviz.py (per-target-table graphs, table clusters with
+    # collapsible column detail, node budget, parallel rendering, index page)
     dot = Digraph(comment='Column Lineage')
 
     for line in lineage_info:
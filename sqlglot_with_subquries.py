@@ -870,108 +870,121 @@ ORDER BY subquery.total_amount DESC;
 parsed = sqlglot.parse_one(sql)
 
 def extract_elements(parsed_query):
+    """
+    Collect columns, transformations, table aliases, dependencies, joins and
+    filters in a single pass: every node is visited exactly once, so the work
+    is linear in the size of the tree however deeply subqueries are nested.
+
+    Each column is attributed to the scope that owns it: "root" for the
+    outermost query, otherwise the alias of the enclosing subquery or CTE
+    (or subquery_<n> for an unaliased one). transformations and dependencies
+    are keyed by (scope, name), and column_scopes parallels columns.
+    """
     columns = []
+    column_scopes = []
     transformations = {}
     table_aliases = {}
     dependencies = {}
     joins = []
     filters = []
+    unnamed = 0
 
-    stack = [parsed_query]
+    # (node, owning scope, enclosing projection alias)
+    stack = [(parsed_query, "root", None)]
 
     while stack:
-        current = stack.pop()
-        
-        # Extract columns and aliases
-        for expr in current.find_all((sqlglot.expressions.Column, sqlglot.expressions.Alias)):
-            if isinstance(expr, sqlglot.expressions.Column):
-                columns.append(expr)
-            elif isinstance(expr, sqlglot.expressions.Alias):
-                columns.append(expr)
-                transformations[str(expr.alias)] = expr.this.sql()
+        current, scope, alias = stack.pop()
 
-        # Extract tables and their aliases
-        for table in current.find_all(sqlglot.expressions.Table):
-            if table.alias:
-                table_aliases[str(table.alias)] = str(table.this)
+        # A subquery / CTE opens a new scope
+        if isinstance(current, (sqlglot.expressions.Subquery, sqlglot.expressions.CTE)):
+            if current.alias:
+                scope = current.alias
             else:
-                table_aliases[str(table.this)] = str(table.this)
-        
-        # Process subqueries iteratively
-        for subquery in current.find_all(sqlglot.expressions.Subquery):
-            stack.append(subquery)
-            sub_columns, sub_transformations, sub_table_aliases, sub_dependencies, sub_joins, sub_filters = extract_elements(subquery)
-            columns.extend(sub_columns)
-            transformations.update(sub_transformations)
-            table_aliases.update(sub_table_aliases)
-            dependencies.update(sub_dependencies)
-            joins.extend(sub_joins)
-            filters.extend(sub_filters)
-        
-        # Extract joins
-        for join in current.find_all(sqlglot.expressions.Join):
-            join_type = join.args.get("kind")
-            left_table = join.args.get("this")
-            right_table = join.args.get("expression")
-            on_condition = join.args.get("on")
+                unnamed += 1
+                scope = f"subquery_{unnamed}"
+            alias = None
+
+        # Columns and their dependencies (only identifiers below a column)
+        elif isinstance(current, sqlglot.expressions.Column):
+            columns.append(current)
+            column_scopes.append(scope)
+            table = current.table
+            key = f"{table}.{current.name}" if table else current.name
+            dependencies.setdefault((scope, current.name), []).append(key)
+            if alias:
+                dependencies.setdefault((scope, alias), []).append(key)
+            continue
+
+        # Aliased expressions and their transformation
+        elif isinstance(current, sqlglot.expressions.Alias):
+            columns.append(current)
+            column_scopes.append(scope)
+            alias = str(current.alias)
+            transformations[(scope, alias)] = current.this.sql()
+
+        # Tables and their aliases
+        elif isinstance(current, sqlglot.expressions.Table):
+            if current.alias:
+                table_aliases[str(current.alias)] = str(current.this)
+            else:
+                table_aliases[str(current.this)] = str(current.this)
+            continue
+
+        # Joins
+        elif isinstance(current, sqlglot.expressions.Join):
+            join_type = current.args.get("kind")
+            left_table = current.args.get("this")
+            right_table = current.args.get("expression")
+            on_condition = current.args.get("on")
             joins.append({
+                "Scope": scope,
                 "Join_Type": join_type.upper() if join_type else None,
                 "Left_Table": left_table.sql() if left_table else None,
                 "Right_Table": right_table.sql() if right_table else None,
                 "On_Condition": on_condition.sql() if on_condition else None
             })
-        
-        # Extract filters
-        for where in current.find_all(sqlglot.expressions.Where):
-            filters.append(where)
-        
-        # Extract dependencies
-        def populate_dependencies(expression, alias=None):
-            if isinstance(expression, sqlglot.expressions.Column):
-                table = expression.table
-                column = expression.name
-                key = f"{table}.{column}" if table else column
-                if alias:
-                    dependencies.setdefault(alias, []).append(key)
-                else:
-                    dependencies.setdefault(column, []).append(key)
-            elif isinstance(expression, sqlglot.expressions.Alias):
-                populate_dependencies(expression.this, alias=str(expression.alias))
-            elif isinstance(expression, sqlglot.expressions.Func):
-                for arg in expression.args.values():
-                    populate_dependencies(arg, alias)
-            elif isinstance(expression, sqlglot.expressions.Window):
-                for arg in expression.args.values():
-                    populate_dependencies(arg, alias)
-        
-        for expr in current.find_all((sqlglot.expressions.Column, sqlglot.expressions.Alias, sqlglot.expressions.Func, sqlglot.expressions.Window)):
-            populate_dependencies(expr)
-    
-    return columns, transformations, table_aliases, dependencies, joins, filters
+
+        # Filters
+        elif isinstance(current, sqlglot.expressions.Where):
+            filters.append(current)
+
+        for child in reversed(list(current.iter_expressions())):
+            stack.append((child, scope, alias))
+
+    # A column referenced several times is still one dependency
+    dependencies = {k: list(dict.fromkeys(v)) for k, v in dependencies.items()}
+
+    return columns, column_scopes, transformations, table_aliases, dependencies, joins, filters
 
 # Extract information
-columns, transformations, table_aliases, dependencies, joins, filters = extract_elements(parsed)
+columns, column_scopes, transformations, table_aliases, dependencies, joins, filters = extract_elements(parsed)
 
-# Prepare DataFrame data
+# Prepare DataFrame data (one row per scope, column and dependency)
 data = []
+seen = set()
 
-for col in columns:
+for col, scope in zip(columns, column_scopes):
     if isinstance(col, sqlglot.expressions.Column):
         col_name = col.name
         table_alias = col.table
     elif isinstance(col, sqlglot.expressions.Alias):
         col_name = col.alias
         table_alias = col.this.table if hasattr(col.this, 'table') else None
-    
+
+    if (scope, col_name) in seen:
+        continue
+    seen.add((scope, col_name))
+
     table_name = table_aliases.get(table_alias, table_alias)
-    transformation = transformations.get(col_name, None)
+    transformation = transformations.get((scope, col_name), None)
     
     # Fetch dependencies for the alias or column
-    dependency_list = dependencies.get(col_name, [])
+    dependency_list = dependencies.get((scope, col_name), [])
     
     for dependency in dependency_list:
         source_table, source_column = dependency.split('.') if '.' in dependency else (None, dependency)
         data.append({
+            "Scope": scope,
             "Column": col_name,
             "Column_Transformation": transformation,
             "Source_Table": source_table,
@@ -983,6 +996,7 @@ join_data = []
 
 for join in joins:
     join_data.append({
+        "Scope": join["Scope"],
         "Join_Type": join["Join_Type"],
         "Left_Table": join["Left_Table"],
         "Right_Table": join["Right_Table"],
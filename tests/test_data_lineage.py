@@ -0,0 +1,61 @@
+import json
+import os
+import re
+import shutil
+import subprocess
+
+import pytest
+
+from data_lineage import build_lineage_graph, extract_select_lineage, parse_sql, to_viewer_json
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def viewer_json(sql, name="script"):
+    G = build_lineage_graph(extract_select_lineage(parse_sql(sql), name))
+    return to_viewer_json(G)
+
+
+def test_table_identifiers_are_not_columns():
+    data = viewer_json("SELECT col1, col2 FROM table1 JOIN table2")
+    columns = {c for node in data["nodes"] for c in node["columns"]}
+    assert columns == {"col1", "col2"}
+    assert "table1" not in columns and "table2" not in columns
+
+
+def test_links_join_real_columns_of_distinct_nodes():
+    data = viewer_json("SELECT a.col1, b.col2 AS c FROM s.table1 a JOIN table2 b ON a.id = b.id")
+    nodes = {node["id"]: node for node in data["nodes"]}
+    assert {node["title"] for node in nodes.values()} == {"s.table1", "table2", "script_query_1"}
+    pairs = set()
+    for link in data["links"]:
+        source, target = link["source"], link["target"]
+        assert source["node"] != target["node"]
+        assert source["column"] in nodes[source["node"]]["columns"]
+        assert target["column"] in nodes[target["node"]]["columns"]
+        pairs.add((nodes[source["node"]]["title"], source["column"], target["column"]))
+    assert pairs == {("s.table1", "col1", "col1"), ("table2", "col2", "c")}
+
+
+def test_unqualified_columns_of_a_join_have_no_source():
+    assert extract_select_lineage(parse_sql("SELECT col1 FROM t1 JOIN t2"), "s") == \
+        [(None, None, "s_query_1", "col1")]
+
+
+@pytest.mark.skipif(shutil.which("node") is None, reason="needs node")
+def test_export_loads_in_viewer_level_calculation():
+    data = viewer_json("SELECT a.x, b.y FROM t a JOIN u b ON a.id = b.id; SELECT x FROM t")
+    with open(os.path.join(ROOT, "script2.js"), encoding="utf-8") as f:
+        source = f.read()
+    function = re.search(r"^function calculateNodeLevels\(links\) \{.*?^\}", source, re.S | re.M).group(0)
+    # A self-link must not hang the viewer either
+    cyclic = data["links"] + [{"source": {"node": 1, "column": "x"}, "target": {"node": 1, "column": "x"}}]
+    script = (f"{function}\nconst data = {json.dumps(data)};\n"
+              f"console.log(JSON.stringify(calculateNodeLevels(data.links)));\n"
+              f"calculateNodeLevels({json.dumps(cyclic)});\n")
+    result = subprocess.run(["node", "-e", script], capture_output=True, text=True, timeout=30)
+    assert result.returncode == 0, result.stderr
+    levels = json.loads(result.stdout)
+    titles = {node["id"]: node["title"] for node in data["nodes"]}
+    assert {titles[int(i)]: level for i, level in levels.items()} == \
+        {"t": 0, "u": 0, "script_query_1": 1, "script_query_2": 1}
@@ -0,0 +1,31 @@
+import pytest
+
+from lineage_cache import LineageCache, normalize_sql
+
+key = LineageCache.make_key
+
+
+def test_reindenting_keeps_the_key():
+    assert key("SELECT a,\n    b\n FROM t", None, "8") == key("SELECT a,\n\tb\r\n  FROM   t  ", None, "8")
+
+
+@pytest.mark.parametrize("a, b", [
+    ("SELECT 'a  b' FROM t", "SELECT 'a b' FROM t"),
+    ('SELECT "a  b" FROM t', 'SELECT "a b" FROM t'),
+    ("SELECT a -- note\n, b FROM t", "SELECT a -- note , b FROM t"),
+    # an apostrophe in a comment must not swallow the next line break
+    ("SELECT a -- don't\nFROM t WHERE x = 'y'", "SELECT a -- don't FROM t WHERE x = 'y'"),
+    ("SELECT a /* it's */ FROM t WHERE x = 'p  q'", "SELECT a /* it's */ FROM t WHERE x = 'p q'"),
+])
+def test_significant_text_changes_the_key(a, b):
+    assert key(a, None, "8") != key(b, None, "8")
+
+
+def test_settings_change_the_key():
+    sql = "INSERT INTO t SELECT a FROM s"
+    keys = {key(sql, None, "8"), key(sql, "oracle", "8"), key(sql, None, "7"), key(sql, None, "8", "t")}
+    assert len(keys) == 4
+
+
+def test_comment_text_kept_verbatim():
+    assert normalize_sql("SELECT 1 /* a\n   b */  FROM t") == "SELECT 1 /* a\n   b */ FROM t"
@@ -0,0 +1,34 @@
+from lineage_diff import DirectoryTree, LineageDiff
+
+
+def diff(tmp_path, base_sql, head_sql, **kwargs):
+    for side, sql in (("base", base_sql), ("head", head_sql)):
+        (tmp_path / side).mkdir()
+        (tmp_path / side / "f.sql").write_text(sql)
+    differ = LineageDiff(DirectoryTree(str(tmp_path / "base")), DirectoryTree(str(tmp_path / "head")), **kwargs)
+    return differ, differ.run()
+
+
+def test_default_dialect_extracts(tmp_path):
+    differ, (files, added, removed, changed) = diff(
+        tmp_path, "INSERT INTO t (x) SELECT a FROM s;\n", "INSERT INTO t (x) SELECT b FROM s;\n")
+    assert differ.errors == []
+    assert files["status"].tolist() == ["modified"]
+    assert added["source_column"].tolist() == ["b"]
+    assert removed["source_column"].tolist() == ["a"]
+    assert changed.empty
+
+
+def test_formatting_only_change_keeps_lineage(tmp_path):
+    _, (files, added, removed, changed) = diff(
+        tmp_path, "INSERT INTO t (x) SELECT a FROM s;\n", "-- reformatted\nINSERT INTO t (x)\n  SELECT a\n  FROM s;\n")
+    assert files["status"].tolist() == ["lineage unchanged"]
+    assert added.empty and removed.empty
+
+
+def test_failed_statement_marks_file_as_error(tmp_path):
+    differ, (files, added, removed, _) = diff(
+        tmp_path, "INSERT INTO t (x) SELECT a FROM s;\n", "INSERT INTO t (x) SELECT a FROM s;\nSELECT FROM (;\n")
+    assert files["status"].tolist() == ["error"]
+    assert added.empty and removed.empty
+    assert [e["side"] for e in differ.errors] == ["head"]
@@ -0,0 +1,31 @@
+import pandas as pd
+
+from lineage_pipeline import ScriptPipeline
+from sql_lineage import SQLLineageExtractor
+
+
+def lineage(scripts):
+    extractor = SQLLineageExtractor(dialect="postgres")
+    frames = []
+    for path, sql in scripts.items():
+        df = extractor.extract(sql, default_target=path.rsplit(".", 1)[0])[0]
+        frames.append(df.assign(source_file=path))
+    return pd.concat(frames, ignore_index=True)
+
+
+def test_default_target_is_not_a_write():
+    pipeline = ScriptPipeline.from_frame(lineage({
+        "a.sql": "INSERT INTO t2 (x) SELECT x FROM t1",
+        "b.sql": "SELECT y FROM t2",
+        "c.sql": "SELECT z FROM b",
+    }))
+    assert pipeline.writes["b.sql"] == set()
+    assert pipeline.edges == {"a.sql": {"b.sql": {"t2"}}, "b.sql": {}, "c.sql": {}}
+
+
+def test_insert_into_the_file_name_is_a_write():
+    pipeline = ScriptPipeline.from_frame(lineage({
+        "orders.sql": "INSERT INTO orders (x) SELECT x FROM t1",
+        "d.sql": "INSERT INTO o2 (x) SELECT x FROM orders",
+    }))
+    assert pipeline.edges["orders.sql"] == {"d.sql": {"orders"}}
@@ -0,0 +1,26 @@
+import openpyxl
+import pandas as pd
+
+from lineage_writers import open_writer
+
+
+def test_xlsx_sheets_are_created_on_first_write(tmp_path):
+    path = str(tmp_path / "out.xlsx")
+    with open_writer("xlsx", path) as writer:
+        writer.write("Errors", pd.DataFrame({"error": ["boom"]}))
+    assert openpyxl.load_workbook(path).sheetnames == ["Errors"]
+
+
+def test_xlsx_known_sheets_without_rows_get_their_header(tmp_path):
+    path = str(tmp_path / "out.xlsx")
+    with open_writer("xlsx", path, {"Lineage": ["a", "b"], "Errors": ["error"]}) as writer:
+        writer.write("Lineage", pd.DataFrame({"a": [1], "b": [2]}))
+    workbook = openpyxl.load_workbook(path)
+    assert list(workbook["Lineage"].values) == [("a", "b"), (1, 2)]
+    assert list(workbook["Errors"].values) == [("error",)]
+
+
+def test_csv_known_sheets_without_rows_get_their_header(tmp_path):
+    with open_writer("csv.gz", str(tmp_path), {"Errors": ["error"]}):
+        pass
+    assert list(pd.read_csv(tmp_path / "errors.csv.gz").columns) == ["error"]
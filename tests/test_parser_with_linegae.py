@@ -0,0 +1,24 @@
+import sqlglot
+
+from parser_with_linegae import create_lineage, extract_sql_details
+
+
+def graph(sql, default_target="dflt"):
+    return create_lineage(extract_sql_details(sqlglot.parse_one(sql, read="postgres")), default_target)
+
+
+def lineage_edges(g):
+    names = {node["id"]: node["name"] for node in g["nodes"]}
+    return {(names[e["from"]], names[e["to"]]) for e in g["edges"] if e["type"] == "lineage"}
+
+
+def test_tables_are_interned_by_qualified_name():
+    g = graph("INSERT INTO tgt SELECT a.id FROM s1.orders a JOIN s2.orders b ON a.id = b.id")
+    assert {"s1.orders", "s2.orders"} <= {node["name"] for node in g["nodes"]}
+    assert lineage_edges(g) == {("s1.orders", "tgt"), ("s2.orders", "tgt")}
+
+
+def test_cte_references_are_not_tables():
+    g = graph("INSERT INTO tgt WITH x AS (SELECT id FROM src) SELECT x.id FROM x")
+    assert "x" not in {node["name"] for node in g["nodes"]}
+    assert lineage_edges(g) == {("src", "tgt")}
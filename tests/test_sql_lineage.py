@@ -0,0 +1,43 @@
+import pytest
+
+from sql_lineage import SQLLineageExtractor
+
+
+def edges(sql, dialect="postgres"):
+    lineage_df = SQLLineageExtractor(dialect=dialect).extract(sql, "dflt")[0]
+    return sorted(zip(lineage_df["source_table"], lineage_df["source_column"],
+                      lineage_df["target_table"], lineage_df["target_column"]))
+
+
+@pytest.mark.parametrize("sql, expected", [
+    ("WITH t AS (SELECT x FROM t) SELECT t.x AS x FROM t",
+     [("t", "x", "dflt", "x")]),
+    ("INSERT INTO tgt (x) WITH a AS (SELECT x FROM src), b AS (SELECT x FROM a) SELECT x FROM b",
+     [("src", "x", "tgt", "x")]),
+    # b is defined before a, so the a it reads is the base table
+    ("INSERT INTO tgt (x) WITH b AS (SELECT x FROM a), a AS (SELECT x FROM src) SELECT x FROM b",
+     [("a", "x", "tgt", "x")]),
+    ("INSERT INTO tgt (n) WITH RECURSIVE r AS (SELECT n FROM seed UNION ALL SELECT n + 1 FROM r) SELECT n FROM r",
+     [("seed", "n", "tgt", "n")]),
+])
+def test_cte_resolution(sql, expected):
+    assert edges(sql) == expected
+
+
+def test_catalog_lookups_use_the_owner():
+    import pandas as pd
+    from schema_catalog import SchemaCatalog
+
+    catalog = SchemaCatalog.from_frame(pd.DataFrame({
+        "OWNER": ["S1", "S2", "S2"], "TABLE_NAME": ["ORDERS", "ORDERS", "ITEMS"],
+        "COLUMN_NAME": ["A", "B", "C"], "COLUMN_ID": [1, 1, 1]}))
+    extractor = SQLLineageExtractor(dialect="oracle", catalog=catalog)
+
+    def rows(sql):
+        df = extractor.extract(sql, "dflt")[0]
+        return sorted(zip(df["source_table"], df["source_column"], df["target_column"]))
+
+    assert rows("INSERT INTO t (x) SELECT * FROM s1.orders") == [("s1.orders", "A", "A")]
+    assert rows("INSERT INTO t (x) SELECT * FROM s2.orders") == [("s2.orders", "B", "B")]
+    assert rows("INSERT INTO t (x, y) SELECT b, c FROM s2.orders o JOIN s2.items i ON o.id = i.id") == \
+        [("s2.items", "c", "c"), ("s2.orders", "b", "b")]
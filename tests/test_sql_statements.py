@@ -0,0 +1,30 @@
+import pytest
+
+from sql_statements import iter_statements
+
+
+def split(script, dialect=None):
+    return [text for _, _, text in iter_statements(script.splitlines(keepends=True), dialect)]
+
+
+@pytest.mark.parametrize("script, dialect, expected", [
+    ("DECLARE @x INT;\nSELECT @x;\n", "tsql", ["DECLARE @x INT", "SELECT @x"]),
+    ("CREATE FUNCTION f() RETURNS int AS $$ SELECT 1; $$ LANGUAGE sql;\nSELECT 2;\n", "postgres",
+     ["CREATE FUNCTION f() RETURNS int AS $$ SELECT 1; $$ LANGUAGE sql", "SELECT 2"]),
+    ("DO $body$\nBEGIN\n  PERFORM 1;\nEND\n$body$;\nSELECT 2;\n", "postgres",
+     ["DO $body$\nBEGIN\n  PERFORM 1;\nEND\n$body$", "SELECT 2"]),
+    ("SELECT freq'x' FROM t; SELECT 2;\n", None, ["SELECT freq'x' FROM t", "SELECT 2"]),
+    ("SELECT q'[a;b]' FROM dual;\nSELECT sql_id FROM V$SQL;\n", "oracle",
+     ["SELECT q'[a;b]' FROM dual", "SELECT sql_id FROM V$SQL"]),
+    ("BEGIN\n  UPDATE t SET a = 1;\n  COMMIT;\nEND;\n/\nSELECT 1 FROM dual;\n", "oracle",
+     ["BEGIN\n  UPDATE t SET a = 1;\n  COMMIT;\nEND;", "SELECT 1 FROM dual"]),
+    ("BEGIN\n  UPDATE t SET a = 1;\nEND;\n", None, ["BEGIN\n  UPDATE t SET a = 1", "END"]),
+    ("BEGIN;\nUPDATE t SET a = 1;\nCOMMIT;\n", "oracle", ["BEGIN", "UPDATE t SET a = 1", "COMMIT"]),
+])
+def test_split(script, dialect, expected):
+    assert split(script, dialect) == expected
+
+
+def test_line_numbers_and_directives():
+    script = "SET ECHO ON\n-- heading\nSELECT 1\n  FROM dual;\nPROMPT done\n"
+    assert list(iter_statements(script.splitlines(True), "oracle")) == [(1, 3, "-- heading\nSELECT 1\n  FROM dual")]
@@ -0,0 +1,31 @@
+import pickle
+
+import pytest
+from sqlglot import exp, parse_one
+
+from sql_lineage import TRANSFORM_TYPES
+from transform_tree import TransformTreeBuilder
+
+
+def steps(sql, dialect="oracle"):
+    projection = parse_one(sql, read=dialect).expressions[0]
+    nodes = [node for node in projection.walk() if isinstance(node, TRANSFORM_TYPES)]
+    return TransformTreeBuilder(dialect, TRANSFORM_TYPES).build(nodes)
+
+
+def test_steps_render_like_node_sql():
+    tree = steps("SELECT NVL(TRIM(UPPER(SUBSTR(a.x, 1, 3))), CAST(b.y AS VARCHAR2(10))) FROM a, b")
+    expected = ["NVL(TRIM(UPPER(SUBSTR(a.x, 1, 3))), CAST(b.y AS VARCHAR2(10)))",
+                "TRIM(UPPER(SUBSTR(a.x, 1, 3)))", "CAST(b.y AS VARCHAR2(10))",
+                "UPPER(SUBSTR(a.x, 1, 3))", "SUBSTR(a.x, 1, 3)"]
+    assert sorted(tree) == sorted(expected)
+    assert [tree[i] for i in range(len(tree))] == list(tree) == tree.render()
+    assert tree[-1] == tree.render()[-1]
+    assert tree[1:3] == tree.render()[1:3]
+    with pytest.raises(IndexError):
+        tree[len(tree)]
+
+
+def test_pickles_without_rendered_text():
+    tree = steps("SELECT UPPER(TRIM(x)) FROM t")
+    assert pickle.loads(pickle.dumps(tree)) == ["UPPER(TRIM(x))", "TRIM(x)"]
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+transform_tree.py
+
+Compact transformation steps for SQLLineageExtractor.
+
+The transformation_steps of a projection list every function / CAST /
+CASE / IF node in it as SQL text, outermost first. Rendering each node
+with node.sql() re-renders everything nested inside it, so for
+NVL(TRIM(UPPER(SUBSTR(...)))) the work and the strings grow
+quadratically with the nesting depth.
+
+A TransformTree stores the steps as an ordered list of operator nodes
+instead. Every node is rendered once, with the operator nodes nested in it
+swapped for placeholders, and kept as a template: interned text segments
+plus references to its child nodes. The SQL of a step is only assembled
+(in one linear pass over the templates) when the steps are read: when
+iterating, indexing, comparing or converting with tolist(), which is what
+the output writers do.
+
+A TransformTree behaves like the list of SQL strings it stands for, and
+pickles (e.g. into the lineage cache) without the rendered text.
+
+Dependencies:
+    pip install sqlglot
+"""
+
+import re
+import sys
+from collections.abc import Sequence
+
+from sqlglot import exp
+
+# Stand-in text for a child node while its parent is rendered
+_PLACEHOLDER = "\x00{}\x00"
+_PLACEHOLDER_RE = re.compile("\x00(\\d+)\x00")
+
+
+class TransformTree(Sequence):
+    __slots__ = ("ops", "parts")
+
+    def __init__(self, ops, parts):
+        """
+        :param ops:   operator name of every node, in step order
+        :param parts: per node, a tuple of text segments (str) and child
+                      node indexes (int); children always come after
+                      their parent
+        """
+        self.ops = tuple(ops)
+        self.parts = tuple(parts)
+
+    def render(self):
+        """
+        SQL text of every step, in order.
+        """
+        rendered = [None] * len(self.parts)
+        for i in range(len(self.parts) - 1, -1, -1):
+            rendered[i] = "".join(p if isinstance(p, str) else rendered[p] for p in self.parts[i])
+        return rendered
+
+    tolist = render
+
+    def children(self, index: int):
+        """
+        Indexes of the operator nodes directly nested in step index.
+        """
+        return [p for p in self.parts[index] if isinstance(p, int)]
+
+    def __len__(self):
+        return len(self.parts)
+
+    def render_step(self, index: int) -> str:
+        """
+        SQL text of one step: only it and the steps nested in it are
+        rendered (children have higher indexes than their parent).
+        """
+        subtree = []
+        pending = [index]
+        while pending:
+            i = pending.pop()
+            subtree.append(i)
+            pending.extend(p for p in self.parts[i] if isinstance(p, int))
+        rendered = {}
+        for i in sorted(subtree, reverse=True):
+            rendered[i] = "".join(p if isinstance(p, str) else rendered[p] for p in self.parts[i])
+        return rendered[index]
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self.render()[index]
+        if index < 0:
+            index += len(self.parts)
+        if not 0 <= index < len(self.parts):
+            raise IndexError("TransformTree index out of range")
+        return self.render_step(index)
+
+    def __iter__(self):
+        return iter(self.render())
+
+    def __eq__(self, other):
+        if isinstance(other, TransformTree):
+            return self.parts == other.parts
+        if isinstance(other, Sequence) and not isinstance(other, str):
+            return self.render() == list(other)
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return repr(self.render())
+
+    __str__ = __repr__
+
+    def __getstate__(self):
+        return self.ops, self.parts
+
+    def __setstate__(self, state):
+        self.ops, self.parts = state
+
+
+def _is_inline(node: exp.Expression) -> bool:
+    # A CASE renders its WHEN branches (If nodes) itself, not via if_sql
+    return isinstance(node, exp.If) and isinstance(node.parent, exp.Case)
+
+
+class TransformTreeBuilder:
+    def __init__(self, dialect: str, types):
+        """
+        :param dialect: SQL dialect to render in
+        :param types:   node classes that are transformation steps
+        """
+        self.dialect = dialect
+        self.types = types
+        self._templates = {}  # id(node) -> (op, parts with child nodes)
+
+    def reset(self):
+        """
+        Forget the templates (they reference nodes of one statement).
+        """
+        self._templates = {}
+
+    def build(self, nodes) -> TransformTree:
+        """
+        TransformTree over transformation nodes in pre-order (or
+        breadth-first) order, i.e. every node before the ones nested in it.
+        """
+        index = {id(node): i for i, node in enumerate(nodes)}
+        ops, parts = [], []
+        for node in nodes:
+            op, template = self._template(node)
+            ops.append(op)
+            resolved = []
+            for part in template:
+                if isinstance(part, str):
+                    resolved.append(part)
+                elif id(part) in index:
+                    resolved.append(index[id(part)])
+                else:
+                    # Not a step of this tree; keep its text
+                    resolved.append(sys.intern(part.sql(dialect=self.dialect)))
+            parts.append(tuple(resolved))
+        return TransformTree(ops, parts)
+
+    def _children(self, node: exp.Expression):
+        """
+        The outermost transformation nodes below node (looking through the
+        WHEN branches of a CASE).
+        """
+        children = []
+        stack = list(reversed(list(node.iter_expressions())))
+        while stack:
+            child = stack.pop()
+            if isinstance(child, self.types) and not _is_inline(child):
+                children.append(child)
+                continue
+            stack.extend(reversed(list(child.iter_expressions())))
+        return children
+
+    def _template(self, node: exp.Expression):
+        template = self._templates.get(id(node))
+        if template is not None:
+            return template
+
+        children = self._children(node)
+        placeholders = [exp.Var(this=_PLACEHOLDER.format(k)) for k in range(len(children))]
+        # Dialect transforms rewrite the tree they render (e.g. DECODE into
+        # CASE), so render a copy, never the statement's tree. The children
+        # are swapped out only while the copy is taken, which keeps it small
+        for child, placeholder in zip(children, placeholders):
+            child.replace(placeholder)
+        try:
+            stub = node.copy()
+        finally:
+            for child, placeholder in zip(children, placeholders):
+                placeholder.replace(child)
+        text = stub.sql(dialect=self.dialect, copy=False)
+
+        pieces = _PLACEHOLDER_RE.split(text)
+        if any("\x00" in piece for piece in pieces[::2]):
+            # A transform mangled a placeholder: keep the node's full text
+            pieces = [node.sql(dialect=self.dialect)]
+        parts = []
+        for i, piece in enumerate(pieces):
+            if i % 2:
+                parts.append(children[int(piece)])
+            elif piece:
+                parts.append(sys.intern(piece))
+        op = node.name.upper() if isinstance(node, exp.Anonymous) else type(node).__name__
+        template = self._templates[id(node)] = (sys.intern(op), tuple(parts))
+        return template